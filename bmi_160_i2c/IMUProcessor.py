@@ -1,24 +1,63 @@
+import os
 import time
 import json
+import queue
+import threading
 import numpy as np
 import matplotlib.pyplot as plt
-from bmi160 import BMI160
+from adaptive_rate import AdaptiveRateController
+from bmi160 import BMI160, DEFAULT_I2C_BUS_ID, MOTION_DATA_KEYS, POWER_ON_ODR
+from bmi160_sim import SimulatedDriver, load_motion, parametric_motion
+from aggregation import WindowAggregator
+from async_publisher import AsyncMqttPublisher
+from batch_publisher import TIMESTAMP_KEY, BatchPublisher
+from fusion import MadgwickFilter, decimate, gravity_z, quaternion_to_euler
+from influx_sink import InfluxLineSink
+from metrics import DEFAULT_METRICS_PORT, MetricsServer, PipelineMetrics
+from recorder import SessionRecorder, recording_path
+from ring_buffer import SampleRingBuffer
+from spool import MessageSpool, StoreAndForwardPublisher
+from trigger import EventTrigger
+from wire_format import (FLAG_DELTA, FLAG_ZLIB, LAYOUT_ACCELEROMETER,
+                         LAYOUT_GYROSCOPE)
 import paho.mqtt.client as mqtt
 
 # MQTT settings
 MQTT_BROKER_IP = "localhost"  # IP address of MQTT broker
 MQTT_PORT = 1883  # Port for MQTT communication
 MQTT_KEEPALIVE_INTERVAL = 60  # MQTT keep-alive interval (in seconds)
+MQTT_RECONNECT_MIN_DELAY = 1  # Initial delay (in seconds) between reconnect attempts
+MQTT_RECONNECT_MAX_DELAY = 30  # Maximum delay (in seconds) between reconnect attempts
+MQTT_BACKEND = "thread"  # "thread": paho network thread, "asyncio": non-blocking publisher (async_publisher.py)
+MQTT_INFLIGHT_WINDOW = 256  # Messages in flight at once with the asyncio backend
+MQTT_MAX_QUEUED = 100000  # Messages queued for the window with the asyncio backend, oldest are dropped
+MQTT_DEFAULT_QOS = 0  # QoS of topics without an entry in MQTT_TOPIC_QOS (asyncio backend)
+# QoS per topic filter with the asyncio backend, first match wins
+MQTT_TOPIC_QOS = {
+    "IMU/burst": 1,
+    "IMU/+/burst": 1,
+    "IMU/+/summary": 1,
+    "IMU/+/+/summary": 1,
+}
 GYROSCOPE_TOPIC = "IMU/gyroscope"  # MQTT topic for gyroscope data
 ACCELEROMETER_TOPIC = "IMU/accelerometer"  # MQTT topic for accelerometer data
 SPEED_TOPIC = "IMU/speed"  # MQTT topic for speed data
+METRICS_TOPIC = "IMU/metrics"  # MQTT topic for pipeline metrics, see METRICS_PUSH_INTERVAL
 ORIENTATION_TOPIC = "IMU/orientation"  # MQTT topic for orientation data
+BURST_TOPIC = "IMU/burst"  # MQTT topic for full-rate bursts around motion events
+CONTROL_TOPIC = "IMU/control"  # MQTT topic for commands to the IMU, see _on_control()
 
 # BMI160 configuration
 DEFAULT_BMI160_ADDRESS = 0x69
 SENSITIVITY = 16384.0  # LSB/g for ±2g range (BMI160 default setting)
 NORMALIZATION_FACTOR = 5000  # Adjust based on the range of your gyroscope values
 
+# Sensor driver, "i2c" for the BMI160 on the I2C bus, "sim" for the simulated sensor (bmi160_sim.py)
+SENSOR_DRIVER = os.getenv("BMI160_DRIVER", "i2c")
+SIM_MOTION_FILE = os.getenv("BMI160_SIM_MOTION")  # Recorded trace (.csv or .npy) for the simulator, parametric motion if unset
+SIM_TRANSACTION_LATENCY = 0.0  # Simulated duration (in seconds) of one I2C transaction
+SIM_BYTE_LATENCY = 0.0  # Simulated transfer time (in seconds) per byte, about 22.5e-6 at 400 kHz
+
 # Constants
 NOISE_THRESHOLD = 0.05  # Minimum acceleration (in g) to consider, filters out noise
 DECAY_FACTOR = 0.5  # Factor to reduce velocity when stationary
@@ -32,25 +71,312 @@ MAX_ORIENTATION_ANGLE = 90  # Maximum orientation angle (in degrees) for pitch o
 # Sleep time between reading motion data
 SLEEP_TIME = 0.1
 
+# Batch processing
+MAX_VELOCITY_PASSES = 8  # Vectorized passes before falling back to a per-sample loop
+
+# Batched publishing, one JSON array of timestamped samples per topic and window
+BATCH_PUBLISH = False  # Publish on <topic>/batch instead of one message per reading
+BATCH_WINDOW_SIZE = 100  # Number of samples per batched message
+BATCH_WINDOW_SECONDS = 1.0  # Maximum time (in seconds) a sample is held back
+# Wire format of batched raw data, "json" or "binary" (published on <topic>/bin)
+WIRE_FORMATS = {
+    "gyroscope": "json",
+    "accelerometer": "json",
+}
+BINARY_FLAGS = FLAG_DELTA | FLAG_ZLIB  # Delta-encode and compress binary windows
+
+# FIFO burst-read mode
+USE_FIFO = False  # Drain the BMI160 FIFO in bulk instead of polling single samples
+FIFO_ODR = 100  # Output data rate (in Hz) of the sensor in FIFO mode
+FIFO_POLL_INTERVAL = 0.05  # Time between FIFO drains, the FIFO holds 85 frames
+
+# Store-and-forward, messages are spooled to disk while the broker is unreachable
+SPOOL_ENABLED = False  # Spool and replay messages instead of losing them
+SPOOL_PATH = "imu_spool.bin"  # Memory-mapped spool file
+SPOOL_SIZE = 64 * 1024 * 1024  # Bytes reserved for spooled messages, oldest are evicted
+SPOOL_REPLAY_BATCH = 500  # Spooled messages replayed per publish after reconnecting
+
+# Orientation estimation
+ORIENTATION_MODE = "accel"  # "accel": pitch/roll from the accelerometer only, "fusion": Madgwick filter
+FUSION_BETA = 0.1  # Accelerometer correction weight of the Madgwick filter
+ORIENTATION_OUTPUT_RATE = 10.0  # Orientation messages per second in fusion mode, 0 for every sample
+FUSION_FIELDS = ('roll', 'pitch', 'yaw', 'qw', 'qx', 'qy', 'qz')  # Added to orientation data
+
+# Edge aggregation, windowed statistics instead of every raw reading
+AGGREGATION_ENABLED = False  # Publish min/max/mean/RMS per window on <topic>/summary
+AGGREGATION_WINDOW_SECONDS = 1.0  # Length of a summary window (in seconds)
+RAW_ON_DEMAND_SECONDS = 60  # Raw data duration (in seconds) for {"raw": true}, {"raw": N} sets N seconds
+GYROSCOPE_FIELDS = ('gx', 'gy', 'gz')
+ACCELEROMETER_FIELDS = ('ax', 'ay', 'az')
+SPEED_FIELDS = ('speed_ms', 'speed_kmph')
+ORIENTATION_FIELDS = ('forward', 'backward', 'left', 'right', 'upside_down')
+
+# Event trigger, full-rate bursts around motion anomalies (combine with aggregation)
+TRIGGER_ENABLED = False  # Publish bursts of raw samples on BURST_TOPIC when a threshold is crossed
+TRIGGER_MAGNITUDE = 5.0  # Acceleration beyond gravity (in m/s²) that triggers a burst
+TRIGGER_ANGULAR_RATE = 200.0  # Angular rate (in °/s) that triggers a burst
+PRE_TRIGGER_SAMPLES = 200  # Samples published before the trigger
+POST_TRIGGER_SAMPLES = 200  # Samples published after the last trigger
+
+# Direct InfluxDB output, bypassing Mosquitto and Telegraf
+INFLUX_SINK_ENABLED = False  # Write data to InfluxDB directly instead of publishing it over MQTT
+INFLUXDB_URL = os.getenv("INFLUXDB_URL", "http://localhost:8086")
+INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN", "TOKEN")
+INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "ORG")
+INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "BUCKET")
+INFLUX_BATCH_SIZE = 5000  # Points per write request
+INFLUX_FLUSH_INTERVAL = 1.0  # Maximum time (in seconds) a point waits for its batch
+
+# Pipeline metrics, stage timers and counters (metrics.py)
+METRICS_ENABLED = False  # Time every pipeline stage, costs a few microseconds per sample
+METRICS_PORT = DEFAULT_METRICS_PORT  # Port of the HTTP /metrics endpoint, 0 disables it
+METRICS_PUSH_INTERVAL = 10.0  # Interval (in seconds) of metrics messages on METRICS_TOPIC, 0 disables them
+
+# Adaptive rate, reduced acquisition and publish rates while the device is stationary (adaptive_rate.py)
+ADAPTIVE_RATE = False  # Switch to the idle rate while stationary and back to full rate on motion
+IDLE_AFTER_SECONDS = 5.0  # Time (in seconds) without motion before switching to the idle rate
+IDLE_SLEEP_TIME = 1.0  # Time between readings or FIFO drains while idle, bounds the wake-up latency
+IDLE_ODR = 25  # Low-power output data rate (in Hz) of the sensor while idle
+IDLE_ANGULAR_RATE = 10.0  # Angular rate (in °/s) that counts as motion, besides STATIONARY_RESET_THRESHOLD
+
+# Session recording, raw samples for offline re-processing (recorder.py, reprocess.py)
+RECORD_ENABLED = False  # Record every acquired sample, 20 bytes per sample
+RECORD_DIRECTORY = "recordings"  # One imu[_<device_id>]_<start time>.imr file per run
+RECORD_CHUNK_SAMPLES = 4096  # Samples per chunk of a recording, the unit of its time index
+
+# Threaded mode, acquisition decoupled from processing and publishing
+THREADED_MODE = False  # Run acquisition, processing and publishing in separate threads
+RING_BUFFER_CAPACITY = 4096  # Samples buffered between acquisition and processing
+PUBLISH_QUEUE_SIZE = 64  # Processed blocks buffered between processing and publishing
+PROCESSING_TIMEOUT = 0.5  # Maximum wait (in seconds) of the processing thread for data
+
+
+def create_mqtt_client(mqtt_broker, mqtt_port):
+    """
+    Creates an MQTT client with its network loop running, and the store-and-forward
+    publisher wrapping it if spooling is enabled. With MQTT_BACKEND "asyncio" the
+    client is an AsyncMqttPublisher, which queues messages itself and never spools.
+
+    Returns:
+    tuple: (mqtt_client, spool_publisher), spool_publisher is None without spooling.
+    """
+    if MQTT_BACKEND == "asyncio":
+        if SPOOL_ENABLED:
+            print("Spooling is not available with the asyncio MQTT backend, "
+                  "messages are queued in memory instead.")
+        subscriptions = []
+        if AGGREGATION_ENABLED:
+            subscriptions = [CONTROL_TOPIC, device_topic(CONTROL_TOPIC, "+")]
+        publisher = AsyncMqttPublisher(mqtt_broker,
+                                       mqtt_port,
+                                       MQTT_TOPIC_QOS,
+                                       MQTT_DEFAULT_QOS,
+                                       MQTT_INFLIGHT_WINDOW,
+                                       MQTT_MAX_QUEUED,
+                                       subscriptions,
+                                       MQTT_KEEPALIVE_INTERVAL,
+                                       MQTT_RECONNECT_MIN_DELAY,
+                                       MQTT_RECONNECT_MAX_DELAY)
+        return publisher.start(), None
+    if MQTT_BACKEND != "thread":
+        raise ValueError(f"Unknown MQTT backend {MQTT_BACKEND!r}")
+
+    mqtt_client = mqtt.Client()
+    mqtt_client.reconnect_delay_set(MQTT_RECONNECT_MIN_DELAY,
+                                    MQTT_RECONNECT_MAX_DELAY)
+    spool_publisher = None
+    if SPOOL_ENABLED:
+        spool_publisher = StoreAndForwardPublisher(
+            mqtt_client, MessageSpool(SPOOL_PATH, SPOOL_SIZE),
+            SPOOL_REPLAY_BATCH)
+        # Start spooling right away if the broker is not reachable yet
+        mqtt_client.connect_async(mqtt_broker, mqtt_port,
+                                  MQTT_KEEPALIVE_INTERVAL)
+    else:
+        mqtt_client.connect(mqtt_broker, mqtt_port, MQTT_KEEPALIVE_INTERVAL)
+    if AGGREGATION_ENABLED:
+        subscribe_on_connect(mqtt_client,
+                             [CONTROL_TOPIC,
+                              device_topic(CONTROL_TOPIC, "+")])
+    # Network loop for keepalives, acknowledgements and reconnects
+    mqtt_client.loop_start()
+    return mqtt_client, spool_publisher
+
+
+def create_influx_sink():
+    """
+    Creates the direct InfluxDB sink if it is enabled.
+
+    Returns:
+    InfluxLineSink: The sink, None if INFLUX_SINK_ENABLED is False.
+    """
+    if not INFLUX_SINK_ENABLED:
+        return None
+    return InfluxLineSink(INFLUXDB_URL, INFLUXDB_TOKEN, INFLUXDB_ORG,
+                          INFLUXDB_BUCKET, INFLUX_BATCH_SIZE,
+                          INFLUX_FLUSH_INTERVAL)
+
+
+def create_sensor_driver(use_fifo=USE_FIFO):
+    """
+    Creates the driver selected by SENSOR_DRIVER. The parametric motion of the
+    simulator is generated at the output data rate the sensor will run at.
+
+    Returns:
+    SimulatedDriver: The simulated sensor, or None for the BMI160_i2c driver.
+    """
+    if SENSOR_DRIVER == "i2c":
+        return None
+    if SENSOR_DRIVER != "sim":
+        raise ValueError(f"Unknown sensor driver {SENSOR_DRIVER!r}")
+    motion_rate = None
+    if SIM_MOTION_FILE:
+        motion = load_motion(SIM_MOTION_FILE)
+    else:
+        # Played in real time, also at the idle rate of ADAPTIVE_RATE
+        motion_rate = FIFO_ODR if use_fifo else POWER_ON_ODR
+        motion = parametric_motion(odr=motion_rate)
+    return SimulatedDriver(motion,
+                           transaction_latency=SIM_TRANSACTION_LATENCY,
+                           byte_latency=SIM_BYTE_LATENCY,
+                           motion_rate=motion_rate)
+
+
+def close_mqtt_client(mqtt_client, spool_publisher):
+    """
+    Disconnects a client created by create_mqtt_client() and closes its spool.
+    An AsyncMqttPublisher first publishes what is still queued.
+    """
+    if isinstance(mqtt_client, AsyncMqttPublisher):
+        mqtt_client.stop()
+        return
+    if spool_publisher is not None:
+        spool_publisher.spool.close()
+    mqtt_client.disconnect()
+    mqtt_client.loop_stop()
+
+
+def subscribe_on_connect(mqtt_client, topics):
+    """
+    Subscribes to topics on every (re)connect, keeping the existing on_connect callback.
+    """
+    on_connect = mqtt_client.on_connect
+
+    def subscribe(client, userdata, flags, rc):
+        if on_connect is not None:
+            on_connect(client, userdata, flags, rc)
+        if rc == 0:
+            client.subscribe([(topic, 0) for topic in topics])
+
+    mqtt_client.on_connect = subscribe
+
+
+def device_topic(topic, device_id):
+    """
+    Inserts a device ID after the root of a topic, e.g. IMU/imu0/gyroscope.
+    """
+    root, name = topic.split("/", 1)
+    return f"{root}/{device_id}/{name}"
+
 
 class IMUSensorManager:
     """
     Class for managing and reading data from the BMI160 sensor,
     processing motion data, and publishing it over MQTT.
+
+    With a device ID, topics are published as IMU/<device_id>/... and every payload
+    carries a 'device' field. An MQTT client (and its spool publisher) can be shared
+    between several managers, otherwise the manager connects its own client. The
+    same holds for the InfluxDB sink used when INFLUX_SINK_ENABLED is set.
+    The sensor driver is selected by SENSOR_DRIVER unless one is passed.
     """
 
-    def __init__(self, i2c_address, mqtt_broker, mqtt_port):
+    def __init__(self,
+                 i2c_address,
+                 mqtt_broker,
+                 mqtt_port,
+                 use_fifo=USE_FIFO,
+                 bus_id=DEFAULT_I2C_BUS_ID,
+                 device_id=None,
+                 mqtt_client=None,
+                 spool_publisher=None,
+                 influx_sink=None,
+                 driver=None):
         # Initialize BMI160 sensor and MQTT client
-        self.sensor = BMI160(i2c_address)
-        self.mqtt_client = mqtt.Client()
-        self.mqtt_client.connect(mqtt_broker, mqtt_port,
-                                 MQTT_KEEPALIVE_INTERVAL)
+        if driver is None:
+            driver = create_sensor_driver(use_fifo)
+        self.sensor = BMI160(i2c_address, bus_id, driver)
+        self.use_fifo = use_fifo
+        if self.use_fifo:
+            self.sensor.enable_fifo(FIFO_ODR)
+        self.owns_mqtt_client = mqtt_client is None
+        if self.owns_mqtt_client:
+            mqtt_client, spool_publisher = create_mqtt_client(
+                mqtt_broker, mqtt_port)
+        self.mqtt_client = mqtt_client
+        self.spool_publisher = spool_publisher
+        self.async_mqtt = isinstance(mqtt_client, AsyncMqttPublisher)
+        self.owns_influx_sink = influx_sink is None
+        if self.owns_influx_sink:
+            influx_sink = create_influx_sink()
+        self.influx_sink = influx_sink
 
         # MQTT Topics or sending different data
+        self.device_id = device_id
         self.gyroscope_topic = GYROSCOPE_TOPIC
         self.accelerometer_topic = ACCELEROMETER_TOPIC
         self.speed_topic = SPEED_TOPIC
         self.orientation_topic = ORIENTATION_TOPIC
+        self.burst_topic = BURST_TOPIC
+        self.metrics_topic = METRICS_TOPIC
+        self.control_topic = CONTROL_TOPIC
+        if device_id is not None:
+            self.gyroscope_topic = device_topic(GYROSCOPE_TOPIC, device_id)
+            self.accelerometer_topic = device_topic(ACCELEROMETER_TOPIC,
+                                                    device_id)
+            self.speed_topic = device_topic(SPEED_TOPIC, device_id)
+            self.orientation_topic = device_topic(ORIENTATION_TOPIC,
+                                                  device_id)
+            self.burst_topic = device_topic(BURST_TOPIC, device_id)
+            self.metrics_topic = device_topic(METRICS_TOPIC, device_id)
+            self.control_topic = device_topic(CONTROL_TOPIC, device_id)
+
+        # Optional aggregation of samples into one message per topic and window
+        self.batch_publisher = None
+        if BATCH_PUBLISH:
+            binary_topics = {}
+            if WIRE_FORMATS["gyroscope"] == "binary":
+                binary_topics[self.gyroscope_topic] = LAYOUT_GYROSCOPE
+            if WIRE_FORMATS["accelerometer"] == "binary":
+                binary_topics[self.accelerometer_topic] = LAYOUT_ACCELEROMETER
+            self.batch_publisher = BatchPublisher(self.spool_publisher
+                                                  or self.mqtt_client,
+                                                  BATCH_WINDOW_SIZE,
+                                                  BATCH_WINDOW_SECONDS,
+                                                  binary_topics, BINARY_FLAGS)
+
+        # Optional windowed statistics, raw data is only published on demand
+        extra_fields = {}
+        if device_id is not None:
+            extra_fields['device'] = device_id
+        self.aggregator = None
+        self.raw_until = 0.0  # Unix time until which raw data is published
+        if AGGREGATION_ENABLED:
+            self.aggregator = WindowAggregator(self.publish_records,
+                                               AGGREGATION_WINDOW_SECONDS,
+                                               extra_fields)
+            self.mqtt_client.message_callback_add(self.control_topic,
+                                                  self._on_control)
+
+        # Optional full-rate bursts around motion events
+        self.trigger = None
+        if TRIGGER_ENABLED:
+            self.trigger = EventTrigger(self.publish_records, self.burst_topic,
+                                        PRE_TRIGGER_SAMPLES,
+                                        POST_TRIGGER_SAMPLES,
+                                        TRIGGER_MAGNITUDE,
+                                        TRIGGER_ANGULAR_RATE,
+                                        extra_fields=extra_fields)
 
         # Speed calculation constants
         self.sensitivity = SENSITIVITY
@@ -58,23 +384,658 @@ class IMUSensorManager:
         self.decay_factor = DECAY_FACTOR
         self.stationary_reset_threshold = STATIONARY_RESET_THRESHOLD
 
+        # Orientation estimation, see process_batch()
+        self.fusion_filter = None
+        if ORIENTATION_MODE == "fusion":
+            self.fusion_filter = MadgwickFilter(FUSION_BETA)
+        self.next_orientation_output = None
+
+        # Optional idle rate while stationary, applied by acquire()
+        self.odr = FIFO_ODR if self.use_fifo else POWER_ON_ODR
+        self.rate_controller = None
+        if ADAPTIVE_RATE:
+            self.rate_controller = AdaptiveRateController(
+                self.odr, IDLE_ODR,
+                FIFO_POLL_INTERVAL if self.use_fifo else SLEEP_TIME,
+                IDLE_SLEEP_TIME, IDLE_AFTER_SECONDS,
+                self.stationary_reset_threshold, IDLE_ANGULAR_RATE)
+
         # Initial velocity and time tracking
         self.velocity = np.array([0.0, 0.0, 0.0])
         self.last_time = time.time()
         self.stationary_count = 0
+        if self.use_fifo:
+            # Sensor time is set from the first FIFO drain
+            self.last_time = None
+
+        # Optional recording of every acquired sample, see acquire()
+        self.recorder = None
+        if RECORD_ENABLED:
+            os.makedirs(RECORD_DIRECTORY, exist_ok=True)
+            self.recorder = SessionRecorder(
+                recording_path(RECORD_DIRECTORY, device_id), {
+                    'device': device_id,
+                    'use_fifo': self.use_fifo,
+                    'odr': self.odr,
+                    'sensitivity': self.sensitivity,
+                    'noise_threshold': self.noise_threshold,
+                    'decay_factor': self.decay_factor,
+                    'stationary_reset_threshold': self.stationary_reset_threshold,
+                    'orientation_mode': ORIENTATION_MODE,
+                    'start_time': time.time(),
+                }, RECORD_CHUNK_SAMPLES)
+
+        # Threaded mode state, see start()
+        self.ring_buffer = SampleRingBuffer(RING_BUFFER_CAPACITY)
+        self.publish_queue = queue.Queue(maxsize=PUBLISH_QUEUE_SIZE)
+        self.stop_flag = threading.Event()
+        self.acquisition_done = threading.Event()
+        self.threads = []
+
+        # Counters
+        self.samples_acquired = 0
+        self.samples_published = 0
+        self.loop_overruns = 0  # Acquisition deadlines missed
+        self.publish_drops = 0  # Samples dropped because the publish queue was full
+
+        # Optional stage timers, exported by MetricsServer and pushed on metrics_topic
+        self.metrics = None
+        self.next_metrics_push = None
+        if METRICS_ENABLED:
+            self.metrics = PipelineMetrics(extra_fields, self.get_stats)
+            if self.batch_publisher is not None:
+                self.batch_publisher.metrics = self.metrics  # Times the windows
+            if METRICS_PUSH_INTERVAL:
+                self.next_metrics_push = time.monotonic() + METRICS_PUSH_INTERVAL
 
     def read_and_publish(self):
         """
         Reads motion data from the BMI160 sensor and publishes it over MQTT.
         """
+        if (self.use_fifo or self.fusion_filter is not None
+                or self.aggregator is not None or self.trigger is not None
+                or self.rate_controller is not None):
+            # Fusion, aggregation, triggers and the adaptive rate need sample
+            # times, the block path provides them
+            self.read_and_publish_block()
+            return
+
+        cycle_start = start = time.perf_counter_ns()
         motion_data = self.sensor.read_motion_data()  # Read motion data
+        if self.metrics is not None:
+            self.metrics.observe("read", start)
         if motion_data:
-            # Pass data to methods for processing and publishing
+            now = time.time()
+            if self.recorder is not None:
+                # Recorded like a single reading of acquire()
+                times = np.array([now])
+                self.recorder.append(
+                    np.array([[motion_data[key] for key in MOTION_DATA_KEYS]],
+                             dtype=np.int16), times, times)
+            # Pass data to methods for processing and publishing. The stage
+            # timers only cover the computation, publish() times encoding
+            # and publishing.
             self.gyroscope_accelerometer(motion_data)
-            self.detect_speed(motion_data)
-            self.detect_orientation(motion_data)
+            start = time.perf_counter_ns()
+            speed_data = self.calculate_speed(motion_data, now)
+            if self.metrics is not None:
+                self.metrics.observe("speed", start)
+            self.publish(self.speed_topic, speed_data)
+            start = time.perf_counter_ns()
+            direction_data = self.calculate_orientation(motion_data)
+            if self.metrics is not None:
+                self.metrics.observe("orientation", start)
+            self.publish(self.orientation_topic, direction_data)
+        if self.metrics is not None:
+            self.metrics.observe("cycle", cycle_start)
+            self.push_metrics()
+
+    def read_and_publish_block(self):
+        """
+        Reads the next block of samples with acquire() (the whole FIFO in FIFO
+        mode) and processes and publishes every sample in it, using the sample
+        times for speed integration, orientation fusion, aggregation and triggers.
+        """
+        start = time.perf_counter_ns()
+        block = self.acquire()  # Read all buffered samples
+        if block is None or not len(block[0]):
+            return
+
+        samples, timestamps, wall_times = block
+        results = self.process_block(samples, timestamps)
+        self.publish_batch(samples, results, wall_times)
+        if self.metrics is not None:
+            self.metrics.observe("cycle", start)
+
+    def acquire(self):
+        """
+        Reads the next block of samples from the sensor: everything buffered in
+        the FIFO in FIFO mode, otherwise a single reading.
+
+        Returns:
+        tuple: (samples, timestamps, wall_times) where samples is an (N, 6) int16
+               array, timestamps the sample times used for processing and
+               wall_times the unix times of the samples.
+        If an error occurs, returns None.
+
+        A rate change of the adaptive rate controller is applied first. In FIFO
+        mode the block is then the rest of the FIFO at the previous rate.
+        With recording enabled, the block is appended to the recording.
+        """
+        block = self._read_block()
+        if self.recorder is not None and block is not None:
+            self.recorder.append(*block)
+        return block
+
+    def _read_block(self):
+        start = time.perf_counter_ns()
+        if (self.rate_controller is not None
+                and self.rate_controller.odr != self.odr):
+            drained = self._set_odr(self.rate_controller.odr)
+            if drained is not None and len(drained[0]):
+                return self._fifo_block(*drained)
+
+        if not self.use_fifo:
+            motion_data = self.sensor.read_motion_data()
+            if self.metrics is not None:
+                self.metrics.observe("read", start)
+            if not motion_data:
+                return None
+            now = np.array([time.time()])
+            samples = np.array([[motion_data[key] for key in MOTION_DATA_KEYS]],
+                               dtype=np.int16)
+            self.samples_acquired += 1
+            return samples, now, now.copy()
+
+        fifo_data = self.sensor.read_fifo_data()
+        if self.metrics is not None:
+            self.metrics.observe("read", start)
+        if fifo_data is None:
+            return None
+        return self._fifo_block(*fifo_data)
+
+    def _fifo_block(self, samples, timestamps):
+        # Map sensor time to wall-clock time, the last sample was taken at the drain
+        wall_times = timestamps.copy()
+        if len(timestamps):
+            wall_times += time.time() - timestamps[-1]
+        self.samples_acquired += len(samples)
+        return samples, timestamps, wall_times
+
+    def _set_odr(self, odr):
+        """
+        Sets the sensor output data rate, see BMI160.set_odr(). On failure the
+        previous rate is kept and the change is retried on the next acquire().
+
+        Returns:
+        tuple: (samples, timestamps) drained from the FIFO, None on failure.
+        """
+        try:
+            drained = self.sensor.set_odr(odr)
+        except (IOError, ValueError) as e:
+            print(f"Error changing the output data rate to {odr} Hz: {e}")
+            return None
+        self.odr = odr
+        return drained
+
+    @property
+    def poll_interval(self):
+        """
+        Time between readings or FIFO drains, longer while the adaptive rate
+        controller is idle. A pending rate change is applied after the short
+        interval, so the FIFO does not overflow before the switch to idle.
+        """
+        if (self.rate_controller is not None and self.rate_controller.idle
+                and self.odr == self.rate_controller.idle_odr):
+            return self.rate_controller.idle_interval
+        return FIFO_POLL_INTERVAL if self.use_fifo else SLEEP_TIME
+
+    def process_block(self, samples, timestamps):
+        """
+        Processes an acquired block with process_batch(), starting the speed
+        integration at the first block in FIFO mode.
+        """
+        if self.last_time is None:
+            self.last_time = timestamps[0] - 1.0 / self.sensor.fifo_odr
+        start = time.perf_counter_ns()
+        results = self.process_batch(samples, timestamps)
+        if self.rate_controller is not None:
+            self.rate_controller.update(samples, timestamps, results['i_vel'])
+        if self.metrics is not None:
+            self.metrics.observe("process", start)
+        return results
+
+    def start(self):
+        """
+        Starts acquisition, processing and publishing in separate threads.
+
+        The acquisition thread reads the sensor on a fixed schedule into a ring
+        buffer, so slow processing or a blocked broker connection does not stretch
+        the sample interval. Lost samples are counted instead, see get_stats().
+        """
+        self.stop_flag.clear()
+        self.acquisition_done.clear()
+        self.threads = [
+            threading.Thread(target=self._acquisition_worker, daemon=True),
+            threading.Thread(target=self._processing_worker, daemon=True),
+            threading.Thread(target=self._publishing_worker, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stops the worker threads after processing and publishing everything
+        acquired so far, and publishes pending batch windows.
+        """
+        self.stop_flag.set()
+        if self.threads:
+            acquisition, processing, publishing = self.threads
+            acquisition.join()
+            self.acquisition_done.set()
+            processing.join()
+            self.publish_queue.put(None)  # Wake up and stop the publisher
+            publishing.join()
+            self.threads = []
+
+        if self.batch_publisher is not None:
+            self.batch_publisher.flush()  # Publish pending windows
+        if self.aggregator is not None:
+            self.aggregator.flush()  # Publish open summary windows
+        if self.trigger is not None:
+            self.trigger.flush()  # Publish a burst being captured
+
+        # A shared client is closed by its owner
+        if self.owns_mqtt_client:
+            close_mqtt_client(self.mqtt_client, self.spool_publisher)
+        if self.owns_influx_sink and self.influx_sink is not None:
+            self.influx_sink.close()
+        if self.recorder is not None:
+            self.recorder.close()
 
-    def gyroscope_accelerometer(self, motion_data):
+    def get_stats(self):
+        """
+        Returns the sample counters and buffer levels of the pipeline.
+        """
+        return {
+            'samples_acquired': self.samples_acquired,
+            'samples_published': self.samples_published,
+            'ring_buffer_fill': len(self.ring_buffer),
+            'ring_buffer_overruns': self.ring_buffer.overruns,
+            'fifo_overflows': self.sensor.fifo_overflows,
+            'loop_overruns': self.loop_overruns,
+            'publish_queue_depth': self.publish_queue.qsize(),
+            'publish_drops': self.publish_drops,
+            'spooled': self.spool_publisher.spooled if self.spool_publisher else 0,
+            'replayed': self.spool_publisher.replayed if self.spool_publisher else 0,
+            'summary_windows': self.aggregator.windows_published if self.aggregator else 0,
+            'bursts': self.trigger.bursts if self.trigger else 0,
+            'influx_points_written': self.influx_sink.points_written if self.influx_sink else 0,
+            'influx_dropped_points': self.influx_sink.dropped_points if self.influx_sink else 0,
+            'odr': self.odr,
+            'rate_changes': (self.rate_controller.idle_entries +
+                             self.rate_controller.wakeups) if self.rate_controller else 0,
+            'mqtt_queued': self.mqtt_client.queued if self.async_mqtt else 0,
+            'mqtt_dropped': self.mqtt_client.dropped if self.async_mqtt else 0,
+            'samples_recorded': self.recorder.samples if self.recorder else 0,
+        }
+
+    def _acquisition_worker(self):
+        next_read = time.monotonic()
+        while not self.stop_flag.is_set():
+            block = self.acquire()
+            if block is not None:
+                self.ring_buffer.write(*block)
+
+            # Keep a fixed schedule instead of sleeping a fixed time after each read
+            next_read += self.poll_interval
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                self.stop_flag.wait(delay)
+            else:
+                self.loop_overruns += 1
+                next_read = time.monotonic()
+
+    def _processing_worker(self):
+        while not self.acquisition_done.is_set() or len(self.ring_buffer):
+            samples, timestamps, wall_times = self.ring_buffer.read(
+                timeout=PROCESSING_TIMEOUT)
+            if not len(samples):
+                continue
+
+            results = self.process_block(samples, timestamps)
+            try:
+                self.publish_queue.put_nowait((samples, results, wall_times))
+            except queue.Full:
+                self.publish_drops += len(samples)
+
+    def _publishing_worker(self):
+        while True:
+            block = self.publish_queue.get()
+            if block is None:
+                break
+            self.publish_batch(*block)
+
+    def process_batch(self, samples, timestamps):
+        """
+        Computes speed and orientation for a block of samples in vectorized form.
+        The results and the final velocity/stationary state are identical to calling
+        detect_speed() and detect_orientation() on every sample in turn.
+
+        In fusion mode pitch and roll come from the Madgwick filter instead of the
+        accelerometer alone, see _fuse_orientation().
+
+        Parameters:
+        samples (np.ndarray): (N, 6) array with columns gx, gy, gz, ax, ay, az.
+        timestamps (np.ndarray): (N,) array of sample times in seconds.
+
+        Returns:
+        dict: Arrays of length N with keys 'speed_ms', 'speed_kmph', 'forward',
+              'backward', 'left', 'right', 'upside_down', 'i_vel' (acceleration
+              beyond gravity) and 'orientation_due' (samples whose orientation
+              is published). Fusion mode adds 'roll',
+              'pitch', 'yaw', 'qw', 'qx', 'qy' and 'qz'.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        # int64 keeps squares and negation of int16 counts exact
+        accel_raw = np.asarray(samples)[:, 3:6].astype(np.int64)
+        results = {}
+
+        # Normalize accelerometer data and remove noise
+        accel = accel_raw / self.sensitivity * GRAVITY_CONSTANT
+        accel = np.where(np.abs(accel) < self.noise_threshold, 0, accel)
+
+        # Time between samples, continuing from the last processed sample
+        dt = np.diff(timestamps, prepend=self.last_time)
+        delta_velocity = accel * dt[:, None]
+
+        # Count consecutive stationary samples, continuing the running count
+        i_vel = self._row_norm(accel) - GRAVITY_CONSTANT
+        results['i_vel'] = i_vel
+        stationary = i_vel < self.stationary_reset_threshold
+        index = np.arange(len(stationary))
+        last_reset = np.maximum.accumulate(np.where(stationary, -1, index))
+        stationary_count = np.where(last_reset < 0,
+                                    index + 1 + self.stationary_count,
+                                    index - last_reset)
+        decay = np.where(stationary_count > STATIONARY_ITERATIONS_THRESHOLD,
+                         self.decay_factor, 1.0)[:, None]
+
+        velocity = self._integrate_velocity(delta_velocity, decay)
+        self.velocity = velocity[-1].copy()
+        self.last_time = timestamps[-1]
+        self.stationary_count = int(stationary_count[-1])
+
+        # Calculate speed in m/s and convert to km/h
+        speed = np.maximum(0, self._row_norm(velocity) - 1)
+        results['speed_ms'] = np.round(speed, 2)
+        results['speed_kmph'] = np.round(speed * MS_TO_KMPH, 2)
+
+        if self.fusion_filter is None:
+            # Calculate pitch and roll using accelerometer data
+            accel_x, accel_y, accel_z = accel_raw.T
+            pitch = np.degrees(
+                np.arctan2(-accel_x, np.sqrt(accel_y**2 + accel_z**2)))
+            roll = np.degrees(np.arctan2(accel_y, accel_z))
+            upside_down = np.where(accel_z < UPSIDE_DOWN_THRESHOLD,
+                                   MAX_ORIENTATION_ANGLE, 0)
+            # With aggregation, orientation is published once per window
+            output_rate = 0
+            if self.aggregator is not None:
+                output_rate = 1.0 / AGGREGATION_WINDOW_SECONDS
+            results['orientation_due'], self.next_orientation_output = decimate(
+                timestamps, self.next_orientation_output, output_rate)
+        else:
+            pitch, roll, upside_down = self._fuse_orientation(
+                samples, timestamps, results)
+
+        # Orientation is only reported while the device is not upside down
+        upright = upside_down == 0
+        pitch_angle = np.round(np.minimum(np.abs(pitch), MAX_ORIENTATION_ANGLE), 2)
+        roll_angle = np.round(np.minimum(np.abs(roll), MAX_ORIENTATION_ANGLE), 2)
+        results['forward'] = np.where(upright & (pitch > 1), pitch_angle, 0.0)
+        results['backward'] = np.where(upright & (pitch < -1), pitch_angle, 0.0)
+        results['right'] = np.where(upright & (roll > 1), roll_angle, 0.0)
+        results['left'] = np.where(upright & (roll < -1), roll_angle, 0.0)
+        results['upside_down'] = upside_down
+
+        return results
+
+    def _fuse_orientation(self, samples, timestamps, results):
+        """
+        Runs the Madgwick filter over a block and adds the fused orientation
+        (roll, pitch, yaw in degrees and the quaternion) to the results. Only
+        every sample due at ORIENTATION_OUTPUT_RATE is published.
+
+        Returns:
+        tuple: (pitch, roll, upside_down) arrays for the direction fields.
+        """
+        quaternions = self.fusion_filter.update(samples, timestamps)
+        roll, pitch, yaw = quaternion_to_euler(quaternions)
+        results['orientation_due'], self.next_orientation_output = decimate(
+            timestamps, self.next_orientation_output, ORIENTATION_OUTPUT_RATE)
+
+        results['roll'] = np.round(roll, 2)
+        results['pitch'] = np.round(pitch, 2)
+        results['yaw'] = np.round(yaw, 2)
+        for i, key in enumerate(('qw', 'qx', 'qy', 'qz')):
+            results[key] = np.round(quaternions[:, i], 5)
+
+        # Upside down when gravity points out of the top of the sensor
+        upside_down = np.where(gravity_z(quaternions) < 0,
+                               MAX_ORIENTATION_ANGLE, 0)
+        return pitch, roll, upside_down
+
+    def _integrate_velocity(self, delta_velocity, decay):
+        """
+        Applies the per-sample velocity update v = (v + (dv - v)) * decay to a block.
+
+        The update only depends on the previous velocity through floating point
+        rounding, so it is solved as a fixed point: each vectorized pass fixes at
+        least the next sample, and in practice a few passes reproduce the
+        sequential result exactly.
+        """
+        velocity = delta_velocity * decay
+        for _ in range(MAX_VELOCITY_PASSES):
+            previous = np.vstack((self.velocity, velocity[:-1]))
+            updated = (previous + (delta_velocity - previous)) * decay
+            if np.array_equal(updated, velocity):
+                return velocity
+            velocity = updated
+
+        # Fall back to the sequential update
+        current = self.velocity.copy()
+        for i in range(len(velocity)):
+            current += delta_velocity[i] - current
+            current *= decay[i]
+            velocity[i] = current
+        return velocity
+
+    @staticmethod
+    def _row_norm(vectors):
+        """
+        Euclidean norm of every row, rounded the same way as np.linalg.norm
+        of a single vector.
+        """
+        return np.sqrt(np.matmul(vectors[:, None, :], vectors[:, :, None]))[:, 0, 0]
+
+    def publish_batch(self, samples, results, timestamps):
+        """
+        Publishes raw data, speed and orientation of every sample in a processed
+        block to MQTT, in the same format as the per-sample path. Orientation is
+        only published for the samples marked 'orientation_due'.
+        Timestamps are the wall-clock times of the samples in seconds.
+
+        With aggregation enabled, raw data and speed are reduced to windowed
+        statistics and only published per sample while requested on the
+        control topic.
+        """
+        if self.aggregator is not None:
+            self.aggregator.add(self.gyroscope_topic, GYROSCOPE_FIELDS,
+                                samples[:, 0:3], timestamps)
+            self.aggregator.add(self.accelerometer_topic, ACCELEROMETER_FIELDS,
+                                samples[:, 3:6], timestamps)
+            self.aggregator.add(
+                self.speed_topic, SPEED_FIELDS,
+                np.column_stack([results[key] for key in SPEED_FIELDS]),
+                timestamps)
+        if self.trigger is not None:
+            self.trigger.add(samples, timestamps, results['i_vel'])
+        publish_raw = self.aggregator is None or time.time() < self.raw_until
+        if self.influx_sink is not None:
+            start = time.perf_counter_ns()
+            self._write_block(samples, results, timestamps, publish_raw)
+            if self.metrics is not None:
+                self.metrics.observe("publish", start)
+                self.push_metrics()
+            self.samples_published += len(samples)
+            return
+
+        results = {key: value.tolist() for key, value in results.items()}
+        for i, (sample, timestamp) in enumerate(
+                zip(samples.tolist(), timestamps.tolist())):
+            if publish_raw:
+                motion_data = dict(zip(MOTION_DATA_KEYS, sample))
+                self.gyroscope_accelerometer(motion_data, timestamp)
+
+                speed_data = {
+                    'speed_ms': results['speed_ms'][i],
+                    'speed_kmph': results['speed_kmph'][i]
+                }
+                self.publish(self.speed_topic, speed_data, timestamp)
+
+            if not results['orientation_due'][i]:
+                continue
+            direction_data = {
+                "forward": results['forward'][i],
+                "backward": results['backward'][i],
+                "left": results['left'][i],
+                "right": results['right'][i],
+                "upside_down": results['upside_down'][i]
+            }
+            for key in FUSION_FIELDS:
+                if key in results:
+                    direction_data[key] = results[key][i]
+            self.publish(self.orientation_topic, direction_data, timestamp)
+        self.samples_published += len(samples)
+        if self.metrics is not None:
+            self.push_metrics()
+
+    def _write_block(self, samples, results, timestamps, publish_raw):
+        """
+        Writes a processed block to the InfluxDB sink, one line protocol
+        template per topic instead of one message per sample.
+        """
+        tags = {'device': self.device_id} if self.device_id is not None else None
+        if publish_raw:
+            self.influx_sink.add_block(self.gyroscope_topic, GYROSCOPE_FIELDS,
+                                       samples[:, 0:3], timestamps, tags)
+            self.influx_sink.add_block(self.accelerometer_topic,
+                                       ACCELEROMETER_FIELDS, samples[:, 3:6],
+                                       timestamps, tags)
+            self.influx_sink.add_block(
+                self.speed_topic, SPEED_FIELDS,
+                np.column_stack([results[key] for key in SPEED_FIELDS]),
+                timestamps, tags)
+
+        due = results['orientation_due']
+        fields = ORIENTATION_FIELDS + tuple(key for key in FUSION_FIELDS
+                                            if key in results)
+        self.influx_sink.add_block(
+            self.orientation_topic, fields,
+            np.column_stack([results[key][due] for key in fields]),
+            timestamps[due], tags)
+
+    def publish(self, topic, data, timestamp=None):
+        """
+        Publishes one reading to MQTT, either directly as a JSON object or through
+        the batch publisher when batched publishing is enabled, or writes it to
+        InfluxDB when the direct sink is enabled.
+        The reading time defaults to the current wall-clock time.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if self.device_id is not None:
+            data = dict(data, device=self.device_id)
+
+        if self.influx_sink is not None:
+            self.influx_sink.add(topic, data, timestamp)
+            return
+        if self.batch_publisher is not None:
+            self.batch_publisher.add(topic, data, timestamp)
+        else:
+            start = time.perf_counter_ns()
+            payload = json.dumps(data)
+            if self.metrics is not None:
+                self.metrics.observe("encode", start)
+            self.publish_payload(topic, payload, timestamp)
+
+    def publish_records(self, topic, records, timestamp):
+        """
+        Publishes a list of timestamped records (summaries, bursts, metrics) as
+        one JSON array, or writes them to InfluxDB when the direct sink is
+        enabled, without encoding them.
+        """
+        if self.influx_sink is not None:
+            self.influx_sink.add_records(topic, records)
+            return
+        start = time.perf_counter_ns()
+        payload = json.dumps(records)
+        if self.metrics is not None:
+            self.metrics.observe("encode", start)
+        self.publish_payload(topic, payload, timestamp)
+
+    def publish_payload(self, topic, payload, timestamp):
+        """
+        Publishes an encoded message, through the spool publisher if spooling is
+        enabled.
+        """
+        start = time.perf_counter_ns()
+        if self.spool_publisher is not None:
+            self.spool_publisher.publish(topic, payload, timestamp)
+        else:
+            self.mqtt_client.publish(topic, payload=payload)
+        if self.metrics is not None:
+            self.metrics.observe("publish", start)
+
+    def push_metrics(self):
+        """
+        Publishes the stage timings and counters on the metrics topic every
+        METRICS_PUSH_INTERVAL seconds, as a JSON array with one timestamped
+        record, like summaries. Written to InfluxDB directly with the sink,
+        see publish_records().
+        """
+        if (self.next_metrics_push is None
+                or time.monotonic() < self.next_metrics_push):
+            return
+        self.next_metrics_push += METRICS_PUSH_INTERVAL
+        record = {TIMESTAMP_KEY: int(time.time() * 1e6)}
+        record.update(self.metrics.summary())
+        if self.device_id is not None:
+            record['device'] = self.device_id
+        self.publish_records(self.metrics_topic, [record], time.time())
+
+    def _on_control(self, client, userdata, message):
+        """
+        Handles commands on the control topic (MQTT network thread). {"raw": 30}
+        publishes raw data for 30 seconds besides the summaries, {"raw": true}
+        for RAW_ON_DEMAND_SECONDS and {"raw": 0} stops it.
+        """
+        try:
+            raw = json.loads(message.payload)["raw"]
+            seconds = RAW_ON_DEMAND_SECONDS if raw is True else float(raw)
+        except (ValueError, KeyError, TypeError):
+            print(f"Ignoring invalid command on {message.topic}: {message.payload!r}")
+            return
+        self.request_raw(seconds)
+
+    def request_raw(self, seconds):
+        """
+        Publishes raw data besides the summaries for the next seconds.
+        """
+        self.raw_until = time.time() + seconds
+
+    def gyroscope_accelerometer(self, motion_data, timestamp=None):
         """
         Publishes gyroscope and accelerometer data to MQTT.
         """
@@ -93,14 +1054,22 @@ class IMUSensorManager:
             }
 
             # Publish data to respective MQTT topics
-            self.mqtt_client.publish(self.gyroscope_topic,
-                                     payload=json.dumps(gyroscope_data))
-            self.mqtt_client.publish(self.accelerometer_topic,
-                                     payload=json.dumps(accelerometer_data))
+            self.publish(self.gyroscope_topic, gyroscope_data, timestamp)
+            self.publish(self.accelerometer_topic, accelerometer_data,
+                         timestamp)
 
-    def detect_speed(self, motion_data):
+    def detect_speed(self, motion_data, current_time=None):
         """
         Detects speed based on accelerometer data and publishes it.
+        The sample time defaults to the current wall-clock time.
+        """
+        self.publish(self.speed_topic,
+                     self.calculate_speed(motion_data, current_time))
+
+    def calculate_speed(self, motion_data, current_time=None):
+        """
+        Updates the velocity with one reading and returns the speed as
+        {'speed_ms': ..., 'speed_kmph': ...}, see detect_speed().
         """
         # Get accelerometer data and normalize it
         accel = np.array([
@@ -110,7 +1079,8 @@ class IMUSensorManager:
         accel = np.where(np.abs(accel) < self.noise_threshold, 0, accel)
 
         # Calculate velocity change based on time
-        current_time = time.time()
+        if current_time is None:
+            current_time = time.time()
         dt = current_time - self.last_time
         self.last_time = current_time
 
@@ -133,18 +1103,23 @@ class IMUSensorManager:
         speed = max(0, np.linalg.norm(self.velocity) - 1)
         speed_kmph = speed * MS_TO_KMPH
 
-        # Publish speed data to MQTT
-        speed_data = {
+        return {
             'speed_ms': round(speed, 2),
             'speed_kmph': round(speed_kmph, 2)
         }
-        self.mqtt_client.publish(self.speed_topic,
-                                 payload=json.dumps(speed_data))
 
     def detect_orientation(self, motion_data):
         """
         Detects device orientation (pitch, roll, and upside down) and publishes it.
         """
+        self.publish(self.orientation_topic,
+                     self.calculate_orientation(motion_data))
+
+    def calculate_orientation(self, motion_data):
+        """
+        Returns the orientation of one reading as the direction intensities,
+        see detect_orientation().
+        """
         # Get accelerometer data for orientation calculations
         accel_x, accel_y, accel_z = motion_data['ax'], motion_data[
             'ay'], motion_data['az']
@@ -182,9 +1157,7 @@ class IMUSensorManager:
                 direction_data["left"] = float(
                     round(min(abs(roll), MAX_ORIENTATION_ANGLE), 2))
 
-        # Publish orientation data to MQTT
-        self.mqtt_client.publish(self.orientation_topic,
-                                 payload=json.dumps(direction_data))
+        return direction_data
 
     def live_plot_directions(self):
         """
@@ -245,12 +1218,26 @@ if __name__ == "__main__":
     # Create IMUSensorManager object and start reading motion data
     imu_manager = IMUSensorManager(DEFAULT_BMI160_ADDRESS, MQTT_BROKER_IP,
                                    MQTT_PORT)
+    metrics_server = None
+    if imu_manager.metrics is not None and METRICS_PORT:
+        metrics_server = MetricsServer([imu_manager.metrics],
+                                       METRICS_PORT).start()
 
     print("Starting IMU Sensor...")
 
     try:
+        if THREADED_MODE:
+            imu_manager.start()  # Read, process and publish in worker threads
+            while True:
+                time.sleep(1)
+
         while True:
             imu_manager.read_and_publish()  # Read and publish motion data
-            time.sleep(SLEEP_TIME)  # Wait for the next reading
+            # Wait for the next reading
+            time.sleep(imu_manager.poll_interval)
     except KeyboardInterrupt:
+        imu_manager.stop()  # Publish everything read so far
+        if metrics_server is not None:
+            metrics_server.stop()
         print("IMU Sensor stopped.")  # Stop on keyboard interrupt
+        print(f"Pipeline stats: {imu_manager.get_stats()}")
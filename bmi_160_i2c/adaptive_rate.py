@@ -0,0 +1,95 @@
+import numpy as np
+from fusion import GYRO_SENSITIVITY
+
+# Adaptive rate defaults
+DEFAULT_IDLE_AFTER = 5.0  # Seconds without motion before switching to the idle rate
+DEFAULT_MOTION_THRESHOLD = 0.7  # Acceleration beyond gravity (in m/s²) that counts as motion
+DEFAULT_ANGULAR_RATE_THRESHOLD = 10.0  # Angular rate (in °/s) that counts as motion
+
+
+class AdaptiveRateController:
+    """
+    Chooses between a full (active) and a reduced (idle) acquisition rate from
+    the motion state of the device.
+
+    A sample is motion when its acceleration beyond gravity (i_vel) reaches
+    motion_threshold, i.e. when it resets stationary_count of IMUSensorManager,
+    or when its angular rate exceeds angular_rate_threshold, so a device that
+    turns in place is not mistaken for a resting one. After idle_after seconds
+    of sample time without motion the controller goes idle; the first block
+    with motion switches it back to active at once. As a block is read at
+    least every idle_interval seconds, the full rate is restored within about
+    idle_interval plus active_interval after motion starts.
+
+    The controller only decides; the manager applies the rate when it next
+    acquires, and reads at idle_interval once the idle rate is set.
+
+    Parameters:
+    active_odr (int): Sensor output data rate (in Hz) while moving.
+    idle_odr (int): Sensor output data rate (in Hz) while stationary.
+    active_interval (float): Seconds between readings or FIFO drains while moving.
+    idle_interval (float): Seconds between readings or FIFO drains while stationary.
+    idle_after (float): Seconds without motion before going idle.
+    motion_threshold (float): i_vel (m/s²) at which a sample counts as motion.
+    angular_rate_threshold (float): Angular rate (°/s) at which a sample counts as motion.
+    """
+
+    def __init__(self,
+                 active_odr: int,
+                 idle_odr: int,
+                 active_interval: float,
+                 idle_interval: float,
+                 idle_after: float = DEFAULT_IDLE_AFTER,
+                 motion_threshold: float = DEFAULT_MOTION_THRESHOLD,
+                 angular_rate_threshold: float = DEFAULT_ANGULAR_RATE_THRESHOLD):
+        self.active_odr = active_odr
+        self.idle_odr = idle_odr
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.idle_after = idle_after
+        self.motion_threshold = motion_threshold
+        # Compared with squared raw gyroscope values, no square root per sample
+        self._angular_rate_limit = (angular_rate_threshold * GYRO_SENSITIVITY)**2
+
+        self.idle = False
+        self.last_motion = None  # Sample time of the last motion
+        self.idle_entries = 0
+        self.wakeups = 0
+
+    @property
+    def odr(self):
+        return self.idle_odr if self.idle else self.active_odr
+
+    def update(self, samples, timestamps, i_vel):
+        """
+        Updates the motion state with a processed block.
+
+        Parameters:
+        samples (np.ndarray): (N, 6) array with columns gx, gy, gz, ax, ay, az.
+        timestamps (np.ndarray): (N,) array of sample times in seconds.
+        i_vel (np.ndarray): (N,) acceleration beyond gravity in m/s², see process_batch().
+
+        Returns:
+        bool: True if the state changed.
+        """
+        if not len(timestamps):
+            return False
+        gyro = np.asarray(samples[:, 0:3], dtype=np.float64)
+        motion = ((np.asarray(i_vel) >= self.motion_threshold)
+                  | (np.einsum("ij,ij->i", gyro, gyro) > self._angular_rate_limit))
+
+        moving = np.flatnonzero(motion)
+        if len(moving):
+            self.last_motion = timestamps[moving[-1]]
+        elif self.last_motion is None:
+            self.last_motion = timestamps[0]
+
+        if self.idle and len(moving):
+            self.idle = False
+            self.wakeups += 1
+            return True
+        if not self.idle and timestamps[-1] - self.last_motion >= self.idle_after:
+            self.idle = True
+            self.idle_entries += 1
+            return True
+        return False
@@ -0,0 +1,116 @@
+import numpy as np
+from batch_publisher import TIMESTAMP_KEY
+
+# Aggregation defaults
+DEFAULT_WINDOW_SECONDS = 1.0  # Length of a summary window in seconds
+SUMMARY_TOPIC_SUFFIX = "/summary"  # Appended to the per-sample topic, e.g. IMU/gyroscope/summary
+COUNT_KEY = "count"  # Key of the number of samples in a window
+
+
+class WindowAggregator:
+    """
+    Reduces samples to min/max/mean/RMS per field over fixed time windows.
+
+    Windows are aligned to multiples of window_seconds of the sample time. A
+    window is published once a sample of a later window arrives, as one record
+    (dict) per window with the window start as 'timestamp' (unix time in
+    microseconds), the sample 'count' and <field>_min, <field>_max, <field>_mean
+    and <field>_rms. All windows completed by one add() call are published
+    together as a list of records on <topic>/summary, sent as a JSON array.
+
+    Parameters:
+    publish (callable): Called as publish(topic, records, timestamp) to send a message.
+    window_seconds (float): Length of a window in seconds.
+    extra_fields (dict): Constant fields added to every window, e.g. the device ID.
+    """
+
+    def __init__(self,
+                 publish,
+                 window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 extra_fields: dict = None):
+        self.publish = publish
+        self.window_seconds = window_seconds
+        self.extra_fields = extra_fields or {}
+        self.windows_published = 0
+
+        # Samples of the open window, per topic: (fields, values, timestamps)
+        self._pending = {}
+
+    def summary_topic(self, topic):
+        """
+        Returns the topic the summaries of a per-sample topic are published on.
+        """
+        return topic + SUMMARY_TOPIC_SUFFIX
+
+    def add(self, topic, fields, values, timestamps):
+        """
+        Adds a block of samples and publishes the windows it completes.
+
+        Parameters:
+        topic (str): Per-sample MQTT topic the data belongs to.
+        fields (tuple): Names of the columns of values.
+        values (np.ndarray): (N, len(fields)) array of samples.
+        timestamps (np.ndarray): (N,) array of unix times in seconds.
+        """
+        if not len(values):
+            return
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if topic in self._pending:
+            _, pending_values, pending_timestamps = self._pending[topic]
+            values = np.concatenate((pending_values, values))
+            timestamps = np.concatenate((pending_timestamps, timestamps))
+
+        # The last window stays open until a sample of a later window arrives
+        windows = np.floor(timestamps / self.window_seconds)
+        changes = np.flatnonzero(windows[1:] != windows[:-1]) + 1
+        open_start = changes[-1] if len(changes) else 0
+        self._pending[topic] = (fields, values[open_start:],
+                                timestamps[open_start:])
+        if open_start:
+            self._publish_windows(topic, fields, values[:open_start],
+                                  windows[:open_start])
+
+    def flush(self, topic=None):
+        """
+        Publishes the open window of a topic, or of all topics if topic is None.
+        """
+        topics = list(self._pending) if topic is None else [topic]
+        for topic in topics:
+            fields, values, timestamps = self._pending.pop(topic, (None, [], []))
+            if len(values):
+                self._publish_windows(
+                    topic, fields, values,
+                    np.floor(timestamps / self.window_seconds))
+
+    def _publish_windows(self, topic, fields, values, windows):
+        # One reduceat segment per run of samples in the same window
+        starts = np.concatenate(
+            ([0], np.flatnonzero(windows[1:] != windows[:-1]) + 1))
+        counts = np.diff(np.append(starts, len(values)))
+        minimum = np.minimum.reduceat(values, starts, axis=0)
+        maximum = np.maximum.reduceat(values, starts, axis=0)
+        mean = np.add.reduceat(values, starts, axis=0) / counts[:, None]
+        rms = np.sqrt(
+            np.add.reduceat(values * values, starts, axis=0) / counts[:, None])
+        window_times = (windows[starts] * self.window_seconds * 1e6).round()
+
+        statistics = {
+            "min": minimum.tolist(),
+            "max": maximum.tolist(),
+            "mean": np.round(mean, 4).tolist(),
+            "rms": np.round(rms, 4).tolist(),
+        }
+        summaries = []
+        for i, (window_time, count) in enumerate(
+                zip(window_times.astype(np.int64).tolist(), counts.tolist())):
+            summary = {TIMESTAMP_KEY: window_time, COUNT_KEY: count}
+            for name, rows in statistics.items():
+                for field, value in zip(fields, rows[i]):
+                    summary[f"{field}_{name}"] = value
+            summary.update(self.extra_fields)
+            summaries.append(summary)
+
+        self.publish(self.summary_topic(topic), summaries,
+                     window_times[-1] / 1e6)
+        self.windows_published += len(summaries)
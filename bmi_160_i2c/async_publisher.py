@@ -0,0 +1,341 @@
+import asyncio
+import threading
+import collections
+import paho.mqtt.client as mqtt
+
+# Publisher defaults
+DEFAULT_INFLIGHT_WINDOW = 256  # Messages handed to paho and not yet written (QoS 0) or acknowledged (QoS 1/2)
+DEFAULT_MAX_QUEUED = 100000  # Messages waiting for the window, the oldest are dropped beyond this
+DEFAULT_KEEPALIVE = 60  # MQTT keep-alive interval (in seconds)
+DEFAULT_RECONNECT_MIN_DELAY = 1  # Initial delay (in seconds) between reconnect attempts
+DEFAULT_RECONNECT_MAX_DELAY = 30  # Maximum delay (in seconds) between reconnect attempts
+DEFAULT_STOP_TIMEOUT = 5.0  # Time (in seconds) stop() waits for queued messages
+MISC_INTERVAL = 1.0  # Seconds between keep-alive and retry checks of paho (loop_misc())
+PUBLISH_SLICE = 500  # Messages handed to paho per event loop iteration, so reads are not starved
+
+# rc of mqtt.Client.publish(), and the (topic, payload, qos, retain) message
+# dropped to make room for a new one
+PublishResult = collections.namedtuple("PublishResult", "rc dropped",
+                                       defaults=(None, ))
+QUEUED = PublishResult(mqtt.MQTT_ERR_SUCCESS)
+
+
+class AsyncMqttPublisher:
+    """
+    MQTT publisher driven by an asyncio event loop in a background thread.
+
+    publish() never blocks: it appends the message to a queue and returns. The
+    event loop hands queued messages to paho while fewer than inflight_window
+    messages are in flight; a QoS 0 message leaves the window once it is
+    written to the socket, a QoS 1 or 2 message once the broker acknowledged
+    it. With a slow broker messages wait in the queue instead of piling up in
+    paho, and beyond max_queued messages the oldest are dropped and counted.
+
+    The socket of the paho client is watched by the event loop (add_reader()
+    and add_writer()), and loop_misc() runs every MISC_INTERVAL seconds for
+    keep-alives and retries, so no paho network thread is needed. After a lost
+    connection the publisher reconnects with exponential backoff. Messages
+    stay queued meanwhile; QoS 0 messages that were handed to paho but not
+    written are queued again, QoS 1 and 2 messages are resent by paho.
+
+    publish() has the signature of mqtt.Client.publish(), so the publisher can
+    replace a client in IMUSensorManager and BatchPublisher. The QoS of a
+    message is that of the first matching filter in topic_qos unless given.
+
+    Parameters:
+    host (str): Address of the MQTT broker.
+    port (int): Port of the MQTT broker.
+    topic_qos (dict): Topic filter (with + and # wildcards) to QoS.
+    default_qos (int): QoS of topics that match no filter.
+    inflight_window (int): Maximum number of messages in flight.
+    max_queued (int): Maximum number of messages waiting for the window.
+    subscriptions (list): Topics subscribed to on every connect.
+    keepalive (int): MQTT keep-alive interval in seconds.
+    reconnect_min_delay (float): Initial delay between reconnect attempts.
+    reconnect_max_delay (float): Maximum delay between reconnect attempts.
+    """
+
+    def __init__(self,
+                 host,
+                 port=1883,
+                 topic_qos=None,
+                 default_qos: int = 0,
+                 inflight_window: int = DEFAULT_INFLIGHT_WINDOW,
+                 max_queued: int = DEFAULT_MAX_QUEUED,
+                 subscriptions=None,
+                 keepalive: int = DEFAULT_KEEPALIVE,
+                 reconnect_min_delay: float = DEFAULT_RECONNECT_MIN_DELAY,
+                 reconnect_max_delay: float = DEFAULT_RECONNECT_MAX_DELAY):
+        self.host = host
+        self.port = port
+        self.topic_qos = dict(topic_qos or {})
+        self.default_qos = default_qos
+        self.inflight_window = inflight_window
+        self.max_queued = max_queued
+        self.subscriptions = list(subscriptions or [])
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self._qos_cache = {}
+
+        self.client = mqtt.Client()
+        self.client.max_inflight_messages_set(inflight_window)
+        self.client.connect_async(host, port, keepalive)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        # Messages (topic, payload, qos, retain) waiting for the window, and
+        # the messages in flight by paho message ID
+        self._queue = collections.deque()
+        self._inflight = {}
+        self.connected = False
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+        self._loop_thread_id = None
+        self._wakeup_pending = False
+        self._pump_scheduled = False
+        self._connecting = False
+        self._stopping = False
+        self._disconnected = None  # asyncio.Event, set when a connect is due
+        self._stopped = None  # asyncio.Event, set by stop()
+
+        # Counters
+        self.published = 0  # Messages handed to paho
+        self.completed = 0  # Messages written (QoS 0) or acknowledged (QoS 1/2)
+        self.dropped = 0  # Messages dropped because the queue was full
+        self.connects = 0
+
+    @property
+    def queued(self):
+        return len(self._queue)
+
+    @property
+    def inflight(self):
+        return len(self._inflight)
+
+    @property
+    def reconnects(self):
+        return max(0, self.connects - 1)
+
+    def start(self):
+        """
+        Starts the event loop thread, which connects to the broker.
+        """
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = DEFAULT_STOP_TIMEOUT):
+        """
+        Waits up to timeout seconds for queued and in-flight messages, then
+        disconnects and stops the event loop thread.
+        """
+        if self._thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(timeout),
+                                                  self._loop)
+        future.result()
+        self._thread.join()
+        self._thread = None
+        self._loop.close()
+
+    def publish(self, topic, payload=None, qos=None, retain=False):
+        """
+        Queues a message and returns at once, from any thread.
+
+        Returns:
+        PublishResult: rc is MQTT_ERR_SUCCESS if the message was queued, or
+                       MQTT_ERR_QUEUE_SIZE if the queue was full and the
+                       oldest message, given as dropped, was dropped to
+                       make room. The new message is queued in both cases.
+        """
+        if qos is None:
+            qos = self.qos_for(topic)
+        self._queue.append((topic, payload, qos, retain))
+        result = QUEUED
+        if len(self._queue) > self.max_queued:
+            self.dropped += 1
+            result = PublishResult(mqtt.MQTT_ERR_QUEUE_SIZE,
+                                   self._queue.popleft())
+
+        # One wake-up of the event loop per batch of messages
+        if not self._wakeup_pending and self._thread is not None:
+            self._wakeup_pending = True
+            self._loop.call_soon_threadsafe(self._wakeup)
+        return result
+
+    def qos_for(self, topic):
+        """
+        Returns the QoS of a topic: that of the first matching filter of
+        topic_qos, or default_qos.
+        """
+        qos = self._qos_cache.get(topic)
+        if qos is None:
+            qos = next((value for pattern, value in self.topic_qos.items()
+                        if mqtt.topic_matches_sub(pattern, topic)),
+                       self.default_qos)
+            self._qos_cache[topic] = qos
+        return qos
+
+    def message_callback_add(self, topic, callback):
+        """
+        Adds a callback for messages on a subscribed topic, see subscriptions.
+        Callbacks run in the event loop thread.
+        """
+        self.client.message_callback_add(topic, callback)
+
+    def _run(self):
+        self._loop_thread_id = threading.get_ident()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._main())
+
+    async def _main(self):
+        self._disconnected = asyncio.Event()
+        self._disconnected.set()
+        self._stopped = asyncio.Event()
+        tasks = [
+            asyncio.ensure_future(self._connection_task()),
+            asyncio.ensure_future(self._misc_task()),
+        ]
+        await self._stopped.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._loop.shutdown_default_executor()
+
+    async def _shutdown(self, timeout):
+        deadline = self._loop.time() + timeout
+        while (self._queue or self._inflight) and self.connected:
+            if self._loop.time() >= deadline:
+                break
+            await asyncio.sleep(0.01)
+        self._stopping = True
+        if self.connected:
+            # on_disconnect follows once the DISCONNECT packet is written
+            self.client.disconnect()
+            while self.connected and self._loop.time() < deadline + 1.0:
+                await asyncio.sleep(0.01)
+        self._stopped.set()
+
+    async def _connection_task(self):
+        # (Re)connects whenever the connection is lost, with exponential backoff
+        delay = self.reconnect_min_delay
+        while True:
+            await self._disconnected.wait()
+            self._disconnected.clear()
+            self._connecting = True
+            try:
+                await self._loop.run_in_executor(None, self.client.reconnect)
+                delay = self.reconnect_min_delay
+            except OSError as e:
+                print(f"Failed to connect to MQTT broker {self.host}:{self.port}"
+                      f" ({e}), retrying in {delay} s.")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+                self._disconnected.set()
+            finally:
+                self._connecting = False
+
+    async def _misc_task(self):
+        while True:
+            await asyncio.sleep(MISC_INTERVAL)
+            if not self._connecting:
+                self.client.loop_misc()
+
+    def _call_in_loop(self, callback, *args):
+        # paho calls back from the executor while connecting, the queue and
+        # the in-flight messages are only touched in the event loop thread
+        if threading.get_ident() == self._loop_thread_id:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _wakeup(self):
+        self._wakeup_pending = False
+        self._pump()
+
+    def _schedule_pump(self):
+        if not self._pump_scheduled:
+            self._pump_scheduled = True
+            self._loop.call_soon(self._pump)
+
+    def _pump(self):
+        # Hands queued messages to paho while the window has room
+        self._pump_scheduled = False
+        if not self.connected:
+            return
+        room = min(self.inflight_window - len(self._inflight), PUBLISH_SLICE)
+        while room > 0 and self._queue:
+            message = self._queue.popleft()
+            topic, payload, qos, retain = message
+            info = self.client.publish(topic, payload, qos, retain)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                # Connection lost, keep the message for the next connection
+                self._queue.appendleft(message)
+                return
+            self._inflight[info.mid] = message
+            self.published += 1
+            room -= 1
+        if self._queue and len(self._inflight) < self.inflight_window:
+            self._schedule_pump()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self._call_in_loop(self._connected, rc)
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._call_in_loop(self._lost, rc)
+
+    def _on_publish(self, client, userdata, mid):
+        self._call_in_loop(self._completed, mid)
+
+    def _connected(self, rc):
+        if rc != 0:
+            print(f"MQTT broker refused the connection ({rc}).")
+            return
+        self.connected = True
+        self.connects += 1
+        print("Connected to MQTT broker.")
+        if self.subscriptions:
+            self.client.subscribe([(topic, 0) for topic in self.subscriptions])
+        self._schedule_pump()
+
+    def _lost(self, rc):
+        was_connected = self.connected
+        self.connected = False
+        # paho discards unwritten QoS 0 messages, queue them again in order
+        lost = [(mid, message) for mid, message in self._inflight.items()
+                if message[2] == 0]
+        for mid, message in reversed(lost):
+            del self._inflight[mid]
+            self._queue.appendleft(message)
+        if self._stopping:
+            return
+        if was_connected:
+            print(f"Disconnected from MQTT broker ({rc}), reconnecting.")
+        self._disconnected.set()
+
+    def _completed(self, mid):
+        if self._inflight.pop(mid, None) is not None:
+            self.completed += 1
+            self._schedule_pump()
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call_in_loop(self._loop.add_reader, sock, self._on_readable)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_reader, sock)
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.add_writer, sock, self.client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+    def _on_readable(self):
+        self.client.loop_read()
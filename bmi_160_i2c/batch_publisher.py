@@ -0,0 +1,111 @@
+import time
+import json
+from wire_format import LAYOUT_FIELDS, encode
+
+# Batching defaults
+DEFAULT_WINDOW_SIZE = 100  # Number of samples per published message
+DEFAULT_WINDOW_SECONDS = 1.0  # Maximum age (in seconds) of a window before it is published
+BATCH_TOPIC_SUFFIX = "/batch"  # Appended to the per-sample topic, e.g. IMU/gyroscope/batch
+BINARY_TOPIC_SUFFIX = "/bin"  # Appended to the per-sample topic for binary windows
+TIMESTAMP_KEY = "timestamp"  # Key of the sample timestamp (unix time in microseconds)
+
+
+class BatchPublisher:
+    """
+    Aggregates samples per MQTT topic and publishes each window as a single
+    JSON array of timestamped samples, or as one binary wire_format message,
+    instead of one message per sample.
+
+    A window is published when it holds window_size samples or when its oldest
+    sample is older than window_seconds, whichever comes first.
+
+    Parameters:
+    mqtt_client (mqtt.Client): Connected MQTT client used for publishing.
+    window_size (int): Number of samples per message. 0 disables the count limit.
+    window_seconds (float): Maximum age of a window in seconds. 0 disables the time limit.
+    binary_topics (dict): Topics published in the binary wire format instead of JSON,
+                          mapped to their wire_format layout id.
+    binary_flags (int): wire_format flags used for binary windows.
+    metrics (PipelineMetrics): Optional stage timers, windows are timed as
+                               'encode' and 'publish' (metrics.py).
+    """
+
+    def __init__(self,
+                 mqtt_client,
+                 window_size: int = DEFAULT_WINDOW_SIZE,
+                 window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 binary_topics: dict = None,
+                 binary_flags: int = 0,
+                 metrics=None):
+        self.mqtt_client = mqtt_client
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.binary_topics = binary_topics or {}
+        self.binary_flags = binary_flags
+        self.metrics = metrics
+
+        # Pending samples and the time the window was opened, per topic
+        self._windows = {}
+        self._window_start = {}
+
+    def batch_topic(self, topic):
+        """
+        Returns the topic a batch of samples from the given per-sample topic is published on.
+        """
+        if topic in self.binary_topics:
+            return topic + BINARY_TOPIC_SUFFIX
+        return topic + BATCH_TOPIC_SUFFIX
+
+    def add(self, topic, data, timestamp):
+        """
+        Adds one sample to the window of a topic and publishes the window if it is full.
+
+        Parameters:
+        topic (str): Per-sample MQTT topic the data belongs to.
+        data (dict): Sample fields, e.g. {'gx': 1, 'gy': 2, 'gz': 3}.
+        timestamp (float): Unix time of the sample in seconds.
+        """
+        window = self._windows.get(topic)
+        if window is None:
+            window = self._windows[topic] = []
+            self._window_start[topic] = time.monotonic()
+
+        layout = self.binary_topics.get(topic)
+        if layout is None:
+            sample = {TIMESTAMP_KEY: int(timestamp * 1e6)}
+            sample.update(data)
+        else:
+            sample = (int(timestamp * 1e6),
+                      tuple(data[field] for field in LAYOUT_FIELDS[layout]))
+        window.append(sample)
+
+        if self.window_size and len(window) >= self.window_size:
+            self.flush(topic)
+        elif self.window_seconds and time.monotonic(
+        ) - self._window_start[topic] >= self.window_seconds:
+            self.flush(topic)
+
+    def flush(self, topic=None):
+        """
+        Publishes the pending window of a topic, or of all topics if none is given.
+        """
+        topics = [topic] if topic is not None else list(self._windows)
+        for name in topics:
+            window = self._windows.pop(name, None)
+            self._window_start.pop(name, None)
+            if not window:
+                continue
+
+            start = time.perf_counter_ns()
+            layout = self.binary_topics.get(name)
+            if layout is None:
+                payload = json.dumps(window)
+            else:
+                timestamps, rows = zip(*window)
+                payload = encode(timestamps, rows, layout, self.binary_flags)
+            if self.metrics is not None:
+                self.metrics.observe("encode", start)
+                start = time.perf_counter_ns()
+            self.mqtt_client.publish(self.batch_topic(name), payload=payload)
+            if self.metrics is not None:
+                self.metrics.observe("publish", start)
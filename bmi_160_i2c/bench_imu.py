@@ -0,0 +1,154 @@
+import sys
+import time
+import IMUProcessor
+from IMUProcessor import (DEFAULT_BMI160_ADDRESS, FIFO_ODR,
+                          FIFO_POLL_INTERVAL, IMUSensorManager)
+from bmi160_sim import (SimulatedDriver, SteppedClock, parametric_motion,
+                        with_rests)
+
+# Benchmark settings (can be overridden by command-line arguments)
+SIMULATED_SECONDS = 60  # Sensor time processed per measurement
+POLL_ODR = 100  # Output data rate (in Hz) of the simulated sensor in polling mode
+MOVING_SECONDS = 10  # Motion per cycle of the trace of the adaptive rate comparison
+REST_SECONDS = 20  # Rest per cycle of the trace of the adaptive rate comparison
+
+
+class CountingClient:
+    """
+    MQTT client that only counts messages, so the benchmark measures the
+    processing and encoding cost without a broker.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.messages += 1
+        self.bytes += len(payload)
+
+    def message_callback_add(self, topic, callback):
+        pass
+
+
+def create_manager(use_fifo, clock, driver=None):
+    odr = FIFO_ODR if use_fifo else POLL_ODR
+    if driver is None:
+        driver = SimulatedDriver(parametric_motion(odr=odr), clock=clock)
+    return IMUSensorManager(DEFAULT_BMI160_ADDRESS,
+                            None,
+                            None,
+                            use_fifo=use_fifo,
+                            mqtt_client=CountingClient(),
+                            influx_sink=None,
+                            driver=driver)
+
+
+def bench_polling(seconds):
+    # Per-sample path: one getMotion6() and three publishes per reading
+    clock = SteppedClock()
+    manager = create_manager(False, clock)
+    samples = int(seconds * POLL_ODR)
+    start = time.process_time()
+    for _ in range(samples):
+        clock.advance(1.0 / POLL_ODR)
+        manager.read_and_publish()
+    return samples, time.process_time() - start, manager.mqtt_client
+
+
+def bench_fifo(seconds):
+    # Block path: one FIFO drain per FIFO_POLL_INTERVAL
+    clock = SteppedClock()
+    manager = create_manager(True, clock)
+    drains = int(seconds / FIFO_POLL_INTERVAL)
+    start = time.process_time()
+    for _ in range(drains):
+        clock.advance(FIFO_POLL_INTERVAL)
+        manager.read_and_publish_block()
+    return manager.samples_acquired, time.process_time(
+    ) - start, manager.mqtt_client
+
+
+def bench_process_batch(seconds):
+    # Vectorized processing only, without publishing
+    clock = SteppedClock()
+    manager = create_manager(True, clock)
+    clock.advance(FIFO_POLL_INTERVAL)
+    samples, timestamps, _ = manager.acquire()
+    blocks = int(seconds / FIFO_POLL_INTERVAL)
+    manager.process_block(samples, timestamps)
+    start = time.process_time()
+    for _ in range(blocks):
+        timestamps = timestamps + FIFO_POLL_INTERVAL
+        manager.process_batch(samples, timestamps)
+    return blocks * len(samples), time.process_time() - start, None
+
+
+def bench_adaptive(seconds, adaptive):
+    # FIFO mode, its sample times follow the stepped clock. Motion with rests,
+    # played in real time at any output data rate
+    clock = SteppedClock()
+    motion = with_rests(parametric_motion(seconds, FIFO_ODR), FIFO_ODR,
+                        MOVING_SECONDS, REST_SECONDS)
+    driver = SimulatedDriver(motion, clock=clock, motion_rate=FIFO_ODR)
+    IMUProcessor.ADAPTIVE_RATE = adaptive
+    try:
+        manager = create_manager(True, clock, driver)
+    finally:
+        IMUProcessor.ADAPTIVE_RATE = False
+
+    # Wake-up latency: from the start of a moving period to the full rate
+    latencies = []
+    idle = False
+    start = time.process_time()
+    while clock.now < seconds:
+        clock.advance(manager.poll_interval)
+        manager.read_and_publish_block()
+        if manager.odr != FIFO_ODR:
+            idle = True
+        elif idle:
+            idle = False
+            period = MOVING_SECONDS + REST_SECONDS
+            latencies.append(clock.now - clock.now // period * period)
+    return (manager.samples_acquired, time.process_time() - start,
+            manager.mqtt_client, latencies)
+
+
+def compare_adaptive(seconds):
+    print(f"\nAdaptive rate, {MOVING_SECONDS} s moving and {REST_SECONDS} s "
+          f"resting, idle after {IMUProcessor.IDLE_AFTER_SECONDS:.0f} s")
+    print(f"{'FIFO block rate':<22}{'samples':>9}{'messages':>10}"
+          f"{'CPU ms/s':>10}{'max wake-up s':>15}")
+    for adaptive in (False, True):
+        samples, cpu_time, client, latencies = bench_adaptive(seconds, adaptive)
+        wakeup = f"{max(latencies):.2f}" if latencies else "-"
+        print(f"{'adaptive' if adaptive else 'fixed':<22}{samples:>9}"
+              f"{client.messages:>10}{cpu_time / seconds * 1e3:>10.2f}"
+              f"{wakeup:>15}")
+
+
+BENCHMARKS = [
+    ("polling, per sample", bench_polling),
+    ("FIFO block", bench_fifo),
+    ("process_batch only", bench_process_batch),
+]
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) >= 2 else SIMULATED_SECONDS
+
+    print(f"{seconds:.0f} s of simulated sensor data, orientation mode "
+          f"{IMUProcessor.ORIENTATION_MODE!r}")
+    print(f"{'path':<22}{'samples':>9}{'CPU us/sample':>15}{'messages':>10}"
+          f"{'bytes/sample':>14}")
+    for name, benchmark in BENCHMARKS:
+        samples, cpu_time, client = benchmark(seconds)
+        messages = client.messages if client else 0
+        size = client.bytes / samples if client else 0
+        print(f"{name:<22}{samples:>9}{cpu_time / samples * 1e6:>15.1f}"
+              f"{messages:>10}{size:>14.1f}")
+    compare_adaptive(seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import sys
+import time
+import json
+import random
+from wire_format import FLAG_DELTA, FLAG_ZLIB, LAYOUT_GYROSCOPE, encode
+
+# Benchmark settings (can be overridden by command-line arguments)
+BATCH_SIZE = 100  # Samples per batch
+ITERATIONS = 200  # Batches encoded per measurement
+SAMPLE_PERIOD_US = 2500  # 400 Hz ODR
+
+
+def make_batch(batch_size):
+    """
+    Generates a gyroscope-like random walk with microsecond timestamps.
+    """
+    timestamps = [
+        1721373999000000 + i * SAMPLE_PERIOD_US for i in range(batch_size)
+    ]
+    rows = []
+    gx = gy = gz = 0
+    for _ in range(batch_size):
+        gx = max(-32768, min(32767, gx + random.randint(-200, 200)))
+        gy = max(-32768, min(32767, gy + random.randint(-200, 200)))
+        gz = max(-32768, min(32767, gz + random.randint(-200, 200)))
+        rows.append((gx, gy, gz))
+    return timestamps, rows
+
+
+def encode_json_per_sample(timestamps, rows):
+    # Current path: one JSON message per reading
+    return [
+        json.dumps({
+            'gx': row[0],
+            'gy': row[1],
+            'gz': row[2]
+        }).encode() for row in rows
+    ]
+
+
+def encode_json_batch(timestamps, rows):
+    # Batched JSON path (BATCH_PUBLISH)
+    return [
+        json.dumps([{
+            'timestamp': timestamp,
+            'gx': row[0],
+            'gy': row[1],
+            'gz': row[2]
+        } for timestamp, row in zip(timestamps, rows)]).encode()
+    ]
+
+
+def make_binary_encoder(flags):
+
+    def encode_binary(timestamps, rows):
+        return [encode(timestamps, rows, LAYOUT_GYROSCOPE, flags)]
+
+    return encode_binary
+
+
+ENCODERS = [
+    ("json per sample", encode_json_per_sample),
+    ("json batch", encode_json_batch),
+    ("binary", make_binary_encoder(0)),
+    ("binary delta", make_binary_encoder(FLAG_DELTA)),
+    ("binary delta+zlib", make_binary_encoder(FLAG_DELTA | FLAG_ZLIB)),
+]
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) >= 2 else BATCH_SIZE
+    timestamps, rows = make_batch(batch_size)
+
+    print(f"{batch_size} gyroscope samples per batch, {ITERATIONS} batches")
+    print(f"{'encoding':<20}{'bytes/sample':>14}{'encode us/sample':>18}")
+    for name, encoder in ENCODERS:
+        size = sum(len(message) for message in encoder(timestamps, rows))
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            encoder(timestamps, rows)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<20}{size / batch_size:>14.1f}"
+              f"{elapsed / (ITERATIONS * batch_size) * 1e6:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,38 @@
-from BMI160_i2c import Driver
+import numpy as np
 
 DEFAULT_I2C_BUS_ID = 1  # Default I2C bus
 DEFAULT_BMI160_ADDRESS = 0x69  # Default I2C address
+MOTION_DATA_KEYS = ('gx', 'gy', 'gz', 'ax', 'ay', 'az')  # Order of getMotion6() values
+
+# FIFO configuration
+FIFO_CAPACITY = 1024  # Size of the on-chip FIFO in bytes
+FIFO_FRAME_SIZE = 12  # Headerless gyro + accel frame: 6 little-endian int16 values
+FIFO_CONFIG_GYRO_ACCEL = 0xC0  # FIFO_CONFIG_1: gyr_en | acc_en, headerless mode
+SENSORTIME_0 = 0x18  # First of three sensor time registers
+STATUS_BLOCK_SIZE = 12  # SENSORTIME_0 (0x18) up to and including FIFO_LENGTH_1 (0x23)
+I2C_BLOCK_SIZE = 32  # Longest SMBus block read, smbus2 rejects longer ones
+FIFO_READ_SIZE = I2C_BLOCK_SIZE // FIFO_FRAME_SIZE * FIFO_FRAME_SIZE  # Whole frames per FIFO read
+SENSORTIME_RESOLUTION = 39.0625e-6  # Seconds per sensor time tick
+SENSORTIME_WRAP = 1 << 24  # Sensor time is a 24-bit counter
+
+# Registers and commands used directly, as defined by BMI160_i2c
+FIFO_DATA = 0x24  # FIFO read-out register
+FIFO_CONFIG_1 = 0x47  # FIFO configuration register
+CMD = 0x7E  # Command register
+FIFO_FLUSH = 0xB0  # Command that clears the FIFO
+
+# Output data rate (Hz) to ODR register value, shared by gyroscope and accelerometer
+ODR_SETTINGS = {
+    25: 6,
+    50: 7,
+    100: 8,
+    200: 9,
+    400: 10,
+    800: 11,
+    1600: 12,
+}
+DEFAULT_FIFO_ODR = 100  # Default output data rate (in Hz) in FIFO mode
+POWER_ON_ODR = 100  # Output data rate (in Hz) of both sensors after power-on
 
 
 class BMI160:
@@ -11,6 +42,8 @@ class BMI160:
     Parameters:
     i2c_address (int): The I2C address of the sensor. Defaults to 0x69.
     bus_id (int): The I2C bus ID. Defaults to 1.
+    driver: Driver to use instead of BMI160_i2c.Driver, e.g. a SimulatedDriver
+            from bmi160_sim. BMI160_i2c is only imported without one.
 
     Raises:
     IOError: If the sensor connection fails due to I2C communication issues.
@@ -19,11 +52,23 @@ class BMI160:
 
     def __init__(self,
                  i2c_address: int = DEFAULT_BMI160_ADDRESS,
-                 bus_id: int = DEFAULT_I2C_BUS_ID):
+                 bus_id: int = DEFAULT_I2C_BUS_ID,
+                 driver=None):
         self.i2c_address = i2c_address
         self.bus_id = bus_id
         self.sensor = None
 
+        # FIFO state, see enable_fifo()
+        self.fifo_odr = None
+        self.fifo_overflows = 0
+        self._last_sensortime = None
+        self._sensortime_offset = 0
+
+        if driver is not None:
+            self.sensor = driver
+            return
+
+        from BMI160_i2c import Driver
         try:
             # Try to initialize the sensor with the given address and bus
             self.sensor = Driver(self.i2c_address, bus=self.bus_id)
@@ -71,3 +116,127 @@ class BMI160:
             # Handle any exceptions during reading
             print(f"Error reading motion data: {e}")
             return None
+
+    def enable_fifo(self, odr: int = DEFAULT_FIFO_ODR):
+        """
+        Configures the on-chip FIFO for batched acquisition of gyroscope and
+        accelerometer data and sets both sensors to the requested output data rate.
+
+        Parameters:
+        odr (int): Output data rate in Hz, one of the keys of ODR_SETTINGS.
+
+        Raises:
+        ValueError: If the output data rate is not supported.
+        IOError: If the FIFO could not be configured.
+        """
+        if odr not in ODR_SETTINGS:
+            raise ValueError(
+                f"Unsupported ODR {odr} Hz, expected one of {sorted(ODR_SETTINGS)}")
+
+        try:
+            self.sensor.set_gyro_rate(ODR_SETTINGS[odr])
+            self.sensor.set_accel_rate(ODR_SETTINGS[odr])
+            # Headerless frames keep the gyro/accel order of getMotion6()
+            self.sensor._reg_write(FIFO_CONFIG_1, FIFO_CONFIG_GYRO_ACCEL)
+            self.sensor._reg_write(CMD, FIFO_FLUSH)
+        except OSError as e:
+            print(f"Failed to configure the BMI160 FIFO: {e}")
+            raise IOError(f"I2C communication error: {e}")
+
+        self.fifo_odr = odr
+        self.fifo_overflows = 0
+        self._last_sensortime = None
+        self._sensortime_offset = 0
+
+    def set_odr(self, odr: int):
+        """
+        Changes the output data rate of gyroscope and accelerometer, e.g. to a
+        low-power rate while the device rests. In FIFO mode the frames sampled
+        at the previous rate are drained first, so their timestamps stay right.
+
+        Parameters:
+        odr (int): Output data rate in Hz, one of the keys of ODR_SETTINGS.
+
+        Returns:
+        tuple: (samples, timestamps) drained from the FIFO as returned by
+               read_fifo_data(), empty arrays outside FIFO mode.
+
+        Raises:
+        ValueError: If the output data rate is not supported.
+        IOError: If the rate could not be set.
+        """
+        if odr not in ODR_SETTINGS:
+            raise ValueError(
+                f"Unsupported ODR {odr} Hz, expected one of {sorted(ODR_SETTINGS)}")
+
+        drained = (np.empty((0, 6), dtype=np.int16), np.empty(0))
+        if self.fifo_odr is not None:
+            drained = self.read_fifo_data()
+            if drained is None:
+                raise IOError("FIFO could not be drained before the rate change")
+
+        try:
+            self.sensor.set_gyro_rate(ODR_SETTINGS[odr])
+            self.sensor.set_accel_rate(ODR_SETTINGS[odr])
+        except OSError as e:
+            print(f"Failed to set the BMI160 output data rate: {e}")
+            raise IOError(f"I2C communication error: {e}")
+
+        if self.fifo_odr is not None:
+            self.fifo_odr = odr
+        return drained
+
+    def read_fifo_data(self):
+        """
+        Drains all complete frames from the FIFO with burst reads.
+        The FIFO must have been configured with enable_fifo() beforehand.
+
+        The sensor time and FIFO fill level are fetched together in one transaction.
+        The frames follow in reads of FIFO_READ_SIZE bytes, as SMBus block reads
+        are limited to I2C_BLOCK_SIZE bytes.
+        Samples are stamped backwards from the sensor time of the drain at the
+        configured ODR.
+
+        Returns:
+        tuple: (samples, timestamps) where samples is an (N, 6) int16 array with
+               columns gx, gy, gz, ax, ay, az and timestamps is an (N,) float64
+               array of sensor time in seconds. Both are empty if no frame is ready.
+        If an error occurs, returns None.
+        """
+        try:
+            # The driver's getFIFOCount()/getFIFOBytes() are unimplemented,
+            # so read the registers directly
+            status = bytes(
+                self.sensor._regs_read(SENSORTIME_0, STATUS_BLOCK_SIZE))
+            sensortime = int.from_bytes(status[0:3], 'little')
+            fifo_length = int.from_bytes(status[10:12], 'little') & 0x07FF
+
+            if fifo_length + FIFO_FRAME_SIZE > FIFO_CAPACITY:
+                # FIFO is full, older frames have been overwritten
+                self.fifo_overflows += 1
+
+            frames = fifo_length // FIFO_FRAME_SIZE
+            if frames:
+                length = frames * FIFO_FRAME_SIZE
+                raw = b"".join(
+                    bytes(self.sensor._regs_read(
+                        FIFO_DATA, min(FIFO_READ_SIZE, length - offset)))
+                    for offset in range(0, length, FIFO_READ_SIZE))
+                samples = np.frombuffer(raw, dtype='<i2').reshape(frames, 6)
+            else:
+                samples = np.empty((0, 6), dtype=np.int16)
+        except Exception as e:
+            # Handle any exceptions during reading
+            print(f"Error reading FIFO data: {e}")
+            return None
+
+        # Unwrap the 24-bit sensor time counter
+        if self._last_sensortime is not None and sensortime < self._last_sensortime:
+            self._sensortime_offset += SENSORTIME_WRAP
+        self._last_sensortime = sensortime
+        drain_time = (sensortime +
+                      self._sensortime_offset) * SENSORTIME_RESOLUTION
+
+        timestamps = drain_time - np.arange(len(samples) - 1, -1,
+                                            -1) / self.fifo_odr
+        return samples.astype(np.int16), timestamps
@@ -0,0 +1,240 @@
+import time
+import numpy as np
+from bmi160 import (CMD, FIFO_CAPACITY, FIFO_CONFIG_1, FIFO_CONFIG_GYRO_ACCEL,
+                    FIFO_DATA, FIFO_FLUSH, FIFO_FRAME_SIZE, I2C_BLOCK_SIZE,
+                    MOTION_DATA_KEYS, ODR_SETTINGS, SENSORTIME_0,
+                    SENSORTIME_RESOLUTION, SENSORTIME_WRAP, STATUS_BLOCK_SIZE)
+from recorder import RECORDING_SUFFIX, Recording
+
+# Simulator defaults
+DEFAULT_ODR = 100  # Output data rate (in Hz) until set_gyro_rate() is called
+DEFAULT_MOTION_SECONDS = 60.0  # Length of the generated parametric trace, it is repeated
+GYRO_LSB_PER_DPS = 131.2  # ±250 °/s range, the driver default
+ACCEL_LSB_PER_G = 16384.0  # ±2 g range, the driver default
+ODR_RATES = {value: odr for odr, value in ODR_SETTINGS.items()}
+
+
+class SteppedClock:
+    """
+    Clock that only moves when advance() is called, for deterministic runs:
+    the simulated sensor then produces exactly the samples of the elapsed time.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def parametric_motion(seconds: float = DEFAULT_MOTION_SECONDS,
+                      odr: int = DEFAULT_ODR,
+                      seed: int = 0):
+    """
+    Generates a motion trace: a device swaying about its vertical axis while
+    being carried, with sensor noise and an impact every 5 seconds.
+
+    Returns:
+    np.ndarray: (N, 6) int16 array with columns gx, gy, gz, ax, ay, az.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * odr)) / odr
+
+    # Yaw rate of ±90 °/s at 0.5 Hz, pitch swinging ±20° at 0.2 Hz
+    pitch = np.radians(20) * np.sin(2 * np.pi * 0.2 * t)
+    pitch_rate = np.degrees(np.radians(20) * 2 * np.pi * 0.2 *
+                            np.cos(2 * np.pi * 0.2 * t))
+    yaw_rate = 90 * np.sin(2 * np.pi * 0.5 * t)
+    gyro = np.column_stack(
+        (np.zeros_like(t), pitch_rate, yaw_rate)) * GYRO_LSB_PER_DPS
+
+    # Gravity in the tilted frame plus steps at 2 Hz along x
+    steps = 0.2 * np.maximum(np.sin(2 * np.pi * 2 * t), 0)
+    accel = np.column_stack(
+        (-np.sin(pitch) + steps, np.zeros_like(t), np.cos(pitch)))
+    impacts = (t % 5.0) < 0.02
+    accel[impacts] += (3.0, 1.0, -2.0)
+    accel *= ACCEL_LSB_PER_G
+
+    samples = np.hstack((gyro + rng.normal(0, 20, gyro.shape),
+                         accel + rng.normal(0, 80, accel.shape)))
+    return np.clip(np.round(samples), -32768, 32767).astype(np.int16)
+
+
+def with_rests(motion,
+               odr: int = DEFAULT_ODR,
+               moving_seconds: float = 20.0,
+               rest_seconds: float = 40.0,
+               seed: int = 0):
+    """
+    Alternates a motion trace with periods in which the device lies flat and
+    still: moving_seconds of the trace, then rest_seconds of rest, and so on.
+
+    Returns:
+    np.ndarray: (N, 6) int16 array of the same length as motion.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(len(motion)) / odr
+    resting = (t % (moving_seconds + rest_seconds)) >= moving_seconds
+    rest = np.hstack((rng.normal(0, 20, (len(motion), 3)),
+                      rng.normal((0, 0, ACCEL_LSB_PER_G), 80,
+                                 (len(motion), 3))))
+    samples = np.where(resting[:, None], np.round(rest), motion)
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def load_motion(path):
+    """
+    Loads a recorded motion trace: an .npy file with an (N, 6) array, a
+    recording of recorder.py (.imr), or a CSV file with a header that contains
+    the columns gx, gy, gz, ax, ay and az.
+
+    Returns:
+    np.ndarray: (N, 6) int16 array with columns gx, gy, gz, ax, ay, az.
+    """
+    if path.endswith(".npy"):
+        samples = np.load(path)
+    elif path.endswith(RECORDING_SUFFIX):
+        recording = Recording(path)
+        samples = recording.read()[0]
+        recording.close()
+    else:
+        with open(path) as f:
+            header = [name.strip() for name in f.readline().split(",")]
+        columns = [header.index(key) for key in MOTION_DATA_KEYS]
+        samples = np.loadtxt(path,
+                             delimiter=",",
+                             skiprows=1,
+                             usecols=columns,
+                             ndmin=2)
+    return np.asarray(samples).reshape(-1, 6).astype(np.int16)
+
+
+class SimulatedDriver:
+    """
+    Stands in for BMI160_i2c.Driver without an I2C bus. It implements the calls
+    bmi160.BMI160 makes: getMotion6(), set_gyro_rate(), set_accel_rate(),
+    _reg_write() and _regs_read() of the sensor time, FIFO length and FIFO data
+    registers.
+
+    Samples come from a motion trace that is repeated, at the configured output
+    data rate of the clock: sample k belongs to k / odr seconds after the start.
+    By default sample k is row k of the trace. With motion_rate, the trace is
+    a recording at that rate and sample k is the row of its sample time, so the
+    motion keeps its real-time course when the output data rate changes.
+    The FIFO fills at that rate, holds at most FIFO_CAPACITY bytes and drops its
+    oldest frames when full, like the chip. With a SteppedClock a run produces
+    the same samples every time.
+
+    Every register access sleeps transaction_latency plus byte_latency per byte
+    transferred, to model the bus (at 400 kHz a byte takes about 22.5 µs).
+
+    Parameters:
+    motion (np.ndarray): (N, 6) trace, see parametric_motion() and load_motion().
+    clock (callable): Returns the current time in seconds.
+    transaction_latency (float): Simulated duration of one transaction in seconds.
+    byte_latency (float): Simulated transfer time of one byte in seconds.
+    motion_rate (float): Rows per second of the trace, None for one row per sample.
+    """
+
+    def __init__(self,
+                 motion=None,
+                 clock=time.monotonic,
+                 transaction_latency: float = 0.0,
+                 byte_latency: float = 0.0,
+                 motion_rate: float = None):
+        self.motion = parametric_motion() if motion is None else motion
+        self.motion_rate = motion_rate
+        self.clock = clock
+        self.transaction_latency = transaction_latency
+        self.byte_latency = byte_latency
+        self.odr = DEFAULT_ODR
+        self.fifo_config = 0
+        self.transactions = 0
+        self.bytes_transferred = 0
+
+        # Sample index 0 is produced at start_time, see _produced()
+        self.power_on_time = clock()  # Origin of the sensor time
+        self.start_time = self.power_on_time
+        self._index_offset = 0
+        self._fifo_start = 0  # Index of the oldest sample in the FIFO
+
+    def getMotion6(self):
+        self._transaction(12)
+        index = max(self._produced() - 1, 0)
+        return tuple(int(value) for value in self.motion[self._rows(index)])
+
+    def set_gyro_rate(self, rate):
+        self._transaction(1)
+        self._set_odr(ODR_RATES[rate])
+
+    def set_accel_rate(self, rate):
+        self._transaction(1)
+        self._set_odr(ODR_RATES[rate])
+
+    def _reg_write(self, reg, value):
+        self._transaction(1)
+        if reg == FIFO_CONFIG_1:
+            self.fifo_config = value
+        elif reg == CMD and value == FIFO_FLUSH:
+            self._fifo_start = self._produced()
+
+    def _regs_read(self, reg, length):
+        # Same limit as read_i2c_block_data() of smbus2
+        if length > I2C_BLOCK_SIZE:
+            raise ValueError("Desired block length over 32 bytes")
+        self._transaction(length)
+        if reg == SENSORTIME_0 and length == STATUS_BLOCK_SIZE:
+            ticks = int((self.clock() - self.power_on_time) /
+                        SENSORTIME_RESOLUTION) % SENSORTIME_WRAP
+            fifo_length = self._fifo_frames() * FIFO_FRAME_SIZE
+            return (ticks.to_bytes(3, 'little') + bytes(7) +
+                    fifo_length.to_bytes(2, 'little'))
+        if reg == FIFO_DATA:
+            frames = min(length // FIFO_FRAME_SIZE, self._fifo_frames())
+            index = np.arange(self._fifo_start, self._fifo_start + frames)
+            self._fifo_start += frames
+            return self.motion[self._rows(index)].astype('<i2').tobytes()
+        return bytes(length)
+
+    def _produced(self):
+        # Number of samples produced since the start
+        elapsed = self.clock() - self.start_time
+        return self._index_offset + int(elapsed * self.odr + 1e-9)
+
+    def _rows(self, index):
+        # Trace rows of sample indices
+        if self.motion_rate is None:
+            return index % len(self.motion)
+        # Sample times of the current rate, frames of an earlier rate are
+        # drained before a rate change
+        seconds = (self.start_time - self.power_on_time +
+                   (index - self._index_offset) / self.odr)
+        rows = np.floor(np.asarray(seconds) * self.motion_rate + 1e-9)
+        return rows.astype(np.int64) % len(self.motion)
+
+    def _fifo_frames(self):
+        if self.fifo_config & FIFO_CONFIG_GYRO_ACCEL != FIFO_CONFIG_GYRO_ACCEL:
+            return 0
+        produced = self._produced()
+        capacity = FIFO_CAPACITY // FIFO_FRAME_SIZE
+        if produced - self._fifo_start > capacity:
+            # Full, the oldest frames are overwritten
+            self._fifo_start = produced - capacity
+        return produced - self._fifo_start
+
+    def _set_odr(self, odr):
+        # Keep the sample index continuous across rate changes
+        self._index_offset = self._produced()
+        self.start_time = self.clock()
+        self.odr = odr
+
+    def _transaction(self, length):
+        self.transactions += 1
+        self.bytes_transferred += length
+        delay = self.transaction_latency + length * self.byte_latency
+        if delay:
+            time.sleep(delay)
@@ -0,0 +1,4 @@
+# pytest configuration, the tests are in tests/
+
+# Scripts for the hardware and a live broker, not tests
+collect_ignore = ["test.py", "test_mqtt_sub.py"]
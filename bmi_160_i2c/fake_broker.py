@@ -0,0 +1,206 @@
+import sys
+import time
+import struct
+import threading
+import socketserver
+
+# Broker defaults
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 1883
+
+# MQTT 3.1.1 control packet types
+CONNECT = 1
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+UNSUBSCRIBE = 10
+PINGREQ = 12
+DISCONNECT = 14
+
+
+def topic_matches(topic_filter, topic):
+    """
+    Returns True if a topic matches a subscription filter with + and # wildcards.
+    """
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or (level != "+" and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def encode_remaining_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+class _Session(socketserver.BaseRequestHandler):
+    # One client connection, runs in its own thread
+
+    def setup(self):
+        self.subscriptions = set()
+        self.send_lock = threading.Lock()
+        self.buffer = self.request.makefile("rb")
+
+    def send(self, packet):
+        with self.send_lock:
+            self.request.sendall(packet)
+
+    def handle(self):
+        broker = self.server.broker
+        broker._add_session(self)
+        try:
+            while True:
+                header = self.buffer.read(1)
+                if not header:
+                    return
+                packet_type, flags = header[0] >> 4, header[0] & 0x0F
+                body = self.buffer.read(self._read_remaining_length())
+                if not self._handle_packet(broker, packet_type, flags, body):
+                    return
+        except OSError:
+            return
+        finally:
+            broker._remove_session(self)
+
+    def _read_remaining_length(self):
+        length, multiplier = 0, 1
+        while True:
+            byte = self.buffer.read(1)[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                return length
+
+    def _handle_packet(self, broker, packet_type, flags, body):
+        if packet_type == CONNECT:
+            self.send(b"\x20\x02\x00\x00")  # CONNACK, accepted
+        elif packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic_length = struct.unpack_from("!H", body)[0]
+            topic = body[2:2 + topic_length].decode()
+            position = 2 + topic_length
+            if qos:
+                packet_id = body[position:position + 2]
+                position += 2
+                self.send(bytes([PUBACK << 4, 2]) + packet_id)
+            broker._route(topic, body[position:])
+        elif packet_type == SUBSCRIBE:
+            packet_id, position, granted = body[:2], 2, bytearray()
+            while position < len(body):
+                length = struct.unpack_from("!H", body, position)[0]
+                self.subscriptions.add(body[position + 2:position + 2 +
+                                            length].decode())
+                position += 2 + length + 1
+                granted.append(0)  # Everything is forwarded with QoS 0
+            self.send(b"\x90" + encode_remaining_length(2 + len(granted)) +
+                      packet_id + bytes(granted))
+        elif packet_type == UNSUBSCRIBE:
+            packet_id, position = body[:2], 2
+            while position < len(body):
+                length = struct.unpack_from("!H", body, position)[0]
+                self.subscriptions.discard(body[position + 2:position + 2 +
+                                                length].decode())
+                position += 2 + length
+            self.send(b"\xb0\x02" + packet_id)
+        elif packet_type == PINGREQ:
+            self.send(b"\xd0\x00")
+        elif packet_type == DISCONNECT:
+            return False
+        return True
+
+
+class FakeBroker:
+    """
+    Minimal in-process MQTT 3.1.1 broker for load tests without Mosquitto.
+
+    Supports CONNECT, PUBLISH with QoS 0 and 1, SUBSCRIBE and UNSUBSCRIBE with
+    + and # wildcards, PINGREQ and DISCONNECT. Messages are forwarded to
+    subscribers with QoS 0. There is no authentication, persistence or
+    retained message support.
+
+    Parameters:
+    host (str): Address to listen on.
+    port (int): Port to listen on, 0 picks a free port (see `port`).
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.messages_received = 0
+        self.messages_forwarded = 0
+        self._sessions = set()
+        self._lock = threading.Lock()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), _Session)
+        self._server.daemon_threads = True
+        self._server.broker = self
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def start(self):
+        """
+        Starts accepting connections in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the broker and closes all connections.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.request.close()
+
+    def _add_session(self, session):
+        with self._lock:
+            self._sessions.add(session)
+
+    def _remove_session(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _route(self, topic, payload):
+        encoded_topic = topic.encode()
+        variable = struct.pack("!H", len(encoded_topic)) + encoded_topic
+        packet = (bytes([PUBLISH << 4]) +
+                  encode_remaining_length(len(variable) + len(payload)) +
+                  variable + payload)
+        with self._lock:
+            self.messages_received += 1
+            receivers = [
+                session for session in self._sessions if any(
+                    topic_matches(topic_filter, topic)
+                    for topic_filter in session.subscriptions)
+            ]
+        for session in receivers:
+            try:
+                session.send(packet)
+                self.messages_forwarded += 1
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) >= 2 else DEFAULT_PORT
+    broker = FakeBroker(DEFAULT_HOST, port).start()
+    print(f"Fake MQTT broker listening on {broker.host}:{broker.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        broker.stop()
+        print(f"Received {broker.messages_received} messages, "
+              f"forwarded {broker.messages_forwarded}.")
@@ -0,0 +1,188 @@
+import math
+import numpy as np
+
+# Gyroscope scaling of the BMI160_i2c driver default range (±250 °/s)
+GYRO_SENSITIVITY = 131.2  # LSB/(°/s)
+
+# Filter defaults
+DEFAULT_BETA = 0.1  # Gradient step weight, larger trusts the accelerometer more
+DEFAULT_OUTPUT_RATE = 10.0  # Orientation outputs per second
+DEFAULT_SAMPLE_PERIOD = 0.01  # Seconds assumed before the first sample of a stream
+MAX_SAMPLE_GAP = 1.0  # Longer gaps (in seconds) are not integrated
+
+
+class MadgwickFilter:
+    """
+    Quaternion orientation filter fusing gyroscope and accelerometer readings
+    (Madgwick, "An efficient orientation filter for inertial and
+    inertial/magnetic sensor arrays", 2010).
+
+    The gyroscope rate is integrated and a gradient descent step weighted by beta
+    pulls the estimate towards the gravity direction measured by the
+    accelerometer. Without a magnetometer the yaw is relative to the start and
+    drifts slowly.
+
+    Scaling and normalization of a block are vectorized with NumPy. The recursion
+    itself is inherently sequential, so it runs as a scalar loop over the block
+    and writes into preallocated output buffers.
+
+    Parameters:
+    beta (float): Weight of the accelerometer correction.
+    gyro_sensitivity (float): Gyroscope counts per °/s.
+    """
+
+    def __init__(self,
+                 beta: float = DEFAULT_BETA,
+                 gyro_sensitivity: float = GYRO_SENSITIVITY):
+        self.beta = beta
+        self.gyro_scale = math.radians(1.0) / gyro_sensitivity
+        self.quaternion = np.array([1.0, 0.0, 0.0, 0.0])  # w, x, y, z
+        self.last_time = None
+        self._output = np.empty((0, 4))
+
+    def update(self, samples, timestamps):
+        """
+        Runs the filter over a block of samples.
+
+        Parameters:
+        samples (np.ndarray): (N, 6) array with columns gx, gy, gz, ax, ay, az.
+        timestamps (np.ndarray): (N,) array of sample times in seconds.
+
+        Returns:
+        np.ndarray: (N, 4) array with the quaternion (w, x, y, z) after every
+                    sample. It is a view of a buffer reused by the next call.
+        """
+        count = len(samples)
+        if len(self._output) < count:
+            self._output = np.empty((count, 4))
+        output = self._output[:count]
+        if count == 0:
+            return output
+
+        samples = np.asarray(samples, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        gyro = samples[:, 0:3] * self.gyro_scale
+
+        # Only the direction of the acceleration is used
+        accel = samples[:, 3:6]
+        accel_norm = np.sqrt(np.einsum("ij,ij->i", accel, accel))
+        valid = accel_norm > 0
+        accel = accel / np.where(valid, accel_norm, 1.0)[:, None]
+
+        previous = self.last_time
+        if previous is None:
+            previous = timestamps[0] - DEFAULT_SAMPLE_PERIOD
+            if valid[0]:
+                self.quaternion = self._initial_quaternion(*accel[0])
+        dt = np.diff(timestamps, prepend=previous)
+        dt = np.where((dt > 0) & (dt < MAX_SAMPLE_GAP), dt, 0.0)
+        self.last_time = timestamps[-1]
+
+        q0, q1, q2, q3 = self.quaternion.tolist()
+        beta = self.beta
+        for i, (gx, gy, gz, ax, ay, az, step, has_accel) in enumerate(
+                zip(*gyro.T.tolist(), *accel.T.tolist(), dt.tolist(),
+                    valid.tolist())):
+            # Rate of change of the quaternion from the gyroscope
+            dq0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+            dq1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+            dq2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+            dq3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+            if has_accel:
+                # Gradient of the error between measured and estimated gravity
+                f0 = 2.0 * (q1 * q3 - q0 * q2) - ax
+                f1 = 2.0 * (q0 * q1 + q2 * q3) - ay
+                f2 = 1.0 - 2.0 * (q1 * q1 + q2 * q2) - az
+                s0 = -2.0 * q2 * f0 + 2.0 * q1 * f1
+                s1 = 2.0 * q3 * f0 + 2.0 * q0 * f1 - 4.0 * q1 * f2
+                s2 = -2.0 * q0 * f0 + 2.0 * q3 * f1 - 4.0 * q2 * f2
+                s3 = 2.0 * q1 * f0 + 2.0 * q2 * f1
+                norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+                if norm > 0:
+                    scale = beta / norm
+                    dq0 -= scale * s0
+                    dq1 -= scale * s1
+                    dq2 -= scale * s2
+                    dq3 -= scale * s3
+
+            q0 += dq0 * step
+            q1 += dq1 * step
+            q2 += dq2 * step
+            q3 += dq3 * step
+            norm = 1.0 / math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+            q0 *= norm
+            q1 *= norm
+            q2 *= norm
+            q3 *= norm
+            output[i] = (q0, q1, q2, q3)
+
+        self.quaternion = output[-1].copy()
+        return output
+
+    @staticmethod
+    def _initial_quaternion(ax, ay, az):
+        # Start level with the measured gravity instead of converging from identity
+        half_roll = math.atan2(ay, az) / 2
+        half_pitch = math.atan2(-ax, math.sqrt(ay * ay + az * az)) / 2
+        cr, sr = math.cos(half_roll), math.sin(half_roll)
+        cp, sp = math.cos(half_pitch), math.sin(half_pitch)
+        return np.array([cr * cp, sr * cp, cr * sp, -sr * sp])
+
+
+def quaternion_to_euler(quaternions):
+    """
+    Converts (N, 4) quaternions (w, x, y, z) to roll, pitch and yaw in degrees.
+
+    Roll and pitch follow the sign convention of the accelerometer-only
+    estimate: roll = atan2(ay, az) and pitch = atan2(-ax, sqrt(ay² + az²)).
+    """
+    w, x, y, z = np.asarray(quaternions).T
+    roll = np.degrees(
+        np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y)))
+    pitch = np.degrees(np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0)))
+    yaw = np.degrees(
+        np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z)))
+    return roll, pitch, yaw
+
+
+def gravity_z(quaternions):
+    """
+    Returns the z component of gravity in the sensor frame (1 when lying flat,
+    -1 when upside down) for (N, 4) quaternions.
+    """
+    w, x, y, z = np.asarray(quaternions).T
+    return w * w - x * x - y * y + z * z
+
+
+def decimate(timestamps, next_output, output_rate=DEFAULT_OUTPUT_RATE):
+    """
+    Selects the samples at which an output is due at output_rate.
+
+    Parameters:
+    timestamps (np.ndarray): (N,) array of sample times in seconds.
+    next_output (float): Time of the next due output, None to output the first sample.
+    output_rate (float): Outputs per second, 0 outputs every sample.
+
+    Returns:
+    tuple: (mask, next_output) with a boolean mask of the selected samples and
+           the time of the next output after the block.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    mask = np.zeros(len(timestamps), dtype=bool)
+    if output_rate <= 0:
+        mask[:] = True
+        return mask, next_output
+    if not len(timestamps):
+        return mask, next_output
+
+    period = 1.0 / output_rate
+    if next_output is None:
+        next_output = timestamps[0]
+    # Output slot of every sample, an output is due at the first sample of a new slot
+    slots = np.floor((timestamps - next_output) / period)
+    previous = np.concatenate(([-1.0], slots[:-1]))
+    mask = (slots >= 0) & (slots > np.maximum.accumulate(previous))
+    if mask.any():
+        next_output += (slots[mask][-1] + 1) * period
+    return mask, next_output
@@ -0,0 +1,343 @@
+import gzip
+import math
+import numbers
+import time
+import queue
+import threading
+import http.client
+import numpy as np
+from urllib.parse import urlencode, urlsplit
+from batch_publisher import TIMESTAMP_KEY
+
+# Sink defaults
+DEFAULT_BATCH_SIZE = 5000  # Points per write request
+DEFAULT_FLUSH_INTERVAL = 1.0  # Maximum time (in seconds) a point waits for its batch
+DEFAULT_MAX_PENDING_BATCHES = 16  # Batches queued for the sender before writers block
+DEFAULT_BLOCK_TIMEOUT = 1.0  # Maximum time (in seconds) a writer blocks on a full queue
+DEFAULT_TIMEOUT = 10.0  # HTTP timeout (in seconds)
+DEFAULT_CLOSE_TIMEOUT = 5.0  # Maximum time (in seconds) close() waits for pending batches
+GZIP_LEVEL = 1  # Fast compression, line protocol compresses well anyway
+RETRY_MIN_DELAY = 0.5  # Initial delay (in seconds) before retrying a failed write
+RETRY_MAX_DELAY = 30.0  # Maximum delay (in seconds) between retries
+MEASUREMENT = "mqtt_consumer"  # Measurement the dashboards query, as written by Telegraf
+TAG_KEYS = ("device", )  # Data keys written as tags instead of fields, as Telegraf's tag_keys
+
+
+def escape_key(value):
+    """
+    Escapes a measurement name, tag key, tag value or field key for line protocol.
+    """
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace(
+        "=", "\\=").replace(" ", "\\ ")
+
+
+def format_field(value):
+    """
+    Formats a field value for line protocol. Numbers are written as floats,
+    like Telegraf's JSON parser does, so series written by both share a type.
+    Returns None for NaN and infinity, which line protocol cannot express.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        return repr(value) if math.isfinite(value) else None
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class InfluxLineSink:
+    """
+    Writes points to the InfluxDB v2 write API directly, without MQTT and Telegraf.
+
+    Points are formatted as line protocol strings right away, without point
+    objects, and collected into batches of batch_size points. A batch is also
+    sent when its oldest point is older than flush_interval. A sender thread
+    gzips every batch and POSTs it over one persistent HTTP connection, retrying
+    with exponential backoff on connection errors, 429 and 5xx responses.
+
+    Batches wait for the sender in a queue of max_pending_batches. When it is
+    full, writers block for up to block_timeout and the batch is then dropped
+    and counted in `dropped_points`, so a slow or unreachable database cannot
+    grow memory without bound.
+
+    InfluxDB rejects a whole batch for one NaN or infinite value, so such
+    values are left out of their point and counted in `skipped_values`; a
+    point without any finite value is not written.
+
+    Points use the layout of the Telegraf MQTT consumer: measurement
+    'mqtt_consumer', the MQTT topic as 'topic' tag and 'device' as tag.
+
+    Parameters:
+    url (str): InfluxDB URL, e.g. http://localhost:8086.
+    token (str): InfluxDB API token.
+    org (str): InfluxDB organization.
+    bucket (str): InfluxDB bucket.
+    batch_size (int): Points per write request.
+    flush_interval (float): Maximum age of a batch in seconds.
+    max_pending_batches (int): Batches queued for the sender.
+    block_timeout (float): Maximum time a writer waits for queue space in seconds.
+    """
+
+    def __init__(self,
+                 url,
+                 token,
+                 org,
+                 bucket,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending_batches: int = DEFAULT_MAX_PENDING_BATCHES,
+                 block_timeout: float = DEFAULT_BLOCK_TIMEOUT):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path.rstrip("/") + "/api/v2/write?" + urlencode({
+            "org": org,
+            "bucket": bucket,
+            "precision": "ns"
+        })
+        self.headers = {
+            "Authorization": f"Token {token}",
+            "Content-Type": "text/plain; charset=utf-8",
+            "Content-Encoding": "gzip",
+        }
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+
+        self._lines = []
+        self._batch_start = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending_batches)
+        self._connection = None
+        self._stop_flag = threading.Event()
+
+        # Counters
+        self.points_written = 0
+        self.batches_written = 0
+        self.bytes_sent = 0
+        self.retries = 0
+        self.dropped_points = 0
+        self.skipped_values = 0
+
+        self._thread = threading.Thread(target=self._sender, daemon=True)
+        self._thread.start()
+
+    def add(self, topic, data, timestamp):
+        """
+        Adds one reading.
+
+        Parameters:
+        topic (str): MQTT topic the data belongs to, written as 'topic' tag.
+        data (dict): Field values, keys in TAG_KEYS are written as tags.
+        timestamp (float): Unix time of the reading in seconds.
+        """
+        prefix, fields = self._prefix(topic, data)
+        field_set = self._field_set(fields)
+        if field_set:
+            self._append(
+                [f"{prefix} {field_set} {int(round(timestamp * 1e9))}"])
+
+    def add_records(self, topic, records):
+        """
+        Adds readings that carry their own 'timestamp' in microseconds, like
+        batched, summary and burst messages.
+        """
+        for record in records:
+            record = dict(record)
+            timestamp = record.pop(TIMESTAMP_KEY) / 1e6
+            self.add(topic, record, timestamp)
+
+    def add_block(self, topic, fields, values, timestamps, tags=None):
+        """
+        Adds a block of readings with the same fields.
+
+        Parameters:
+        topic (str): MQTT topic the data belongs to, written as 'topic' tag.
+        fields (tuple): Field names of the columns of values.
+        values (np.ndarray): (N, len(fields)) array of readings.
+        timestamps (np.ndarray): (N,) array of unix times in seconds.
+        tags (dict): Extra tags of all readings, e.g. the device ID.
+        """
+        prefix, _ = self._prefix(topic, tags or {})
+        # One format string per block, filled by a single % per reading
+        template = prefix.replace("%", "%%") + " " + ",".join(
+            f"{escape_key(field)}=%r" for field in fields) + " %d"
+        times = (timestamps * 1e9).round().astype("int64").tolist()
+        if values.dtype.kind != "f" or np.isfinite(values).all():
+            lines = [
+                template % (*row, time_ns)
+                for row, time_ns in zip(values.tolist(), times)
+            ]
+        else:
+            # Readings with NaN or infinity are formatted one field at a time
+            finite = np.isfinite(values).all(axis=1).tolist()
+            lines = []
+            for row, time_ns, ok in zip(values.tolist(), times, finite):
+                if ok:
+                    lines.append(template % (*row, time_ns))
+                    continue
+                field_set = self._field_set(dict(zip(fields, row)))
+                if field_set:
+                    lines.append(f"{prefix} {field_set} {time_ns}")
+        self._append(lines)
+
+    def flush(self):
+        """
+        Queues the current batch for sending, even if it is not full.
+        """
+        with self._lock:
+            lines = self._take_batch()
+        if lines:
+            self._enqueue(lines)
+
+    def close(self, timeout=DEFAULT_CLOSE_TIMEOUT):
+        """
+        Sends all pending points, waiting at most timeout seconds, and stops
+        the sender thread. Points that could not be sent are counted as dropped.
+        """
+        self.flush()
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop_flag.set()
+        self._thread.join()
+        while True:
+            try:
+                self.dropped_points += len(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if self._connection is not None:
+            self._connection.close()
+
+    def get_stats(self):
+        """
+        Returns the counters of the sink.
+        """
+        return {
+            'points_written': self.points_written,
+            'batches_written': self.batches_written,
+            'bytes_sent': self.bytes_sent,
+            'retries': self.retries,
+            'dropped_points': self.dropped_points,
+            'skipped_values': self.skipped_values,
+            'pending_batches': self._queue.qsize(),
+        }
+
+    def _prefix(self, topic, data):
+        # Measurement and tags of a point, and the remaining fields
+        tags = {"topic": topic}
+        fields = {}
+        for key, value in data.items():
+            if key in TAG_KEYS:
+                tags[key] = value
+            elif key != TIMESTAMP_KEY:
+                fields[key] = value
+        prefix = MEASUREMENT + "".join(
+            f",{escape_key(key)}={escape_key(value)}"
+            for key, value in sorted(tags.items()))
+        return prefix, fields
+
+    def _field_set(self, fields):
+        # Field set of a point, without the values that cannot be written
+        pairs = []
+        for key, value in fields.items():
+            formatted = format_field(value)
+            if formatted is None:
+                self.skipped_values += 1
+            else:
+                pairs.append(f"{escape_key(key)}={formatted}")
+        return ",".join(pairs)
+
+    def _append(self, lines):
+        with self._lock:
+            if self._batch_start is None:
+                self._batch_start = time.monotonic()
+            self._lines.extend(lines)
+            batches = []
+            while len(self._lines) >= self.batch_size:
+                batches.append(self._lines[:self.batch_size])
+                del self._lines[:self.batch_size]
+            if not self._lines:
+                self._batch_start = None
+        for batch in batches:
+            self._enqueue(batch)
+
+    def _take_batch(self):
+        lines = self._lines
+        self._lines = []
+        self._batch_start = None
+        return lines
+
+    def _enqueue(self, lines):
+        try:
+            self._queue.put(lines, timeout=self.block_timeout)
+        except queue.Full:
+            self.dropped_points += len(lines)
+
+    def _sender(self):
+        while not self._stop_flag.is_set():
+            try:
+                lines = self._queue.get(timeout=self.flush_interval / 2)
+            except queue.Empty:
+                # Send a partial batch once it is old enough
+                with self._lock:
+                    due = (self._batch_start is not None and time.monotonic() -
+                           self._batch_start >= self.flush_interval)
+                    lines = self._take_batch() if due else None
+                if lines:
+                    self._write(lines)
+                continue
+            self._write(lines)
+            self._queue.task_done()
+
+    def _write(self, lines):
+        body = gzip.compress(("\n".join(lines) + "\n").encode(), GZIP_LEVEL)
+        delay = RETRY_MIN_DELAY
+        while True:
+            try:
+                status, retry_after, message = self._post(body)
+            except (OSError, http.client.HTTPException) as e:
+                # Reconnect on the next attempt
+                if self._connection is not None:
+                    self._connection.close()
+                self._connection = None
+                status, retry_after, message = None, None, str(e)
+
+            if status is not None and status < 300:
+                self.points_written += len(lines)
+                self.batches_written += 1
+                self.bytes_sent += len(body)
+                return
+            if status is not None and status < 500 and status != 429:
+                # The request itself is invalid, retrying would not help
+                print(f"InfluxDB rejected {len(lines)} points ({status}): {message}")
+                self.dropped_points += len(lines)
+                return
+            if self._stop_flag.is_set():
+                self.dropped_points += len(lines)
+                return
+
+            print(f"InfluxDB write failed ({status or message}), retrying in {delay:.1f} s.")
+            self.retries += 1
+            self._stop_flag.wait(retry_after or delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def _post(self, body):
+        if self._connection is None:
+            connection_class = (http.client.HTTPSConnection
+                                if self.https else http.client.HTTPConnection)
+            self._connection = connection_class(self.host,
+                                                self.port,
+                                                timeout=DEFAULT_TIMEOUT)
+        self._connection.request("POST", self.path, body, self.headers)
+        response = self._connection.getresponse()
+        message = response.read()
+        retry_after = response.getheader("Retry-After")
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        return response.status, retry_after, message.decode(errors="replace")
@@ -0,0 +1,486 @@
+import os
+import gzip
+import json
+import time
+import argparse
+import threading
+import collections
+import http.server
+import numpy as np
+import paho.mqtt.client as mqtt
+from async_publisher import AsyncMqttPublisher
+from batch_publisher import TIMESTAMP_KEY
+from fake_broker import FakeBroker
+from influx_sink import InfluxLineSink
+
+# Load generator defaults (can be overridden by command-line arguments)
+DEFAULT_IMU_DEVICES = 4  # Simulated IMUs
+DEFAULT_PPG_DEVICES = 1  # Simulated PPG sensors
+DEFAULT_IMU_RATE = 100.0  # Samples per second per IMU
+DEFAULT_PPG_RATE = 100.0  # Samples per second per PPG sensor
+DEFAULT_DURATION = 10.0  # Length of the run in seconds
+DEFAULT_BATCH_SIZE = 0  # Samples per MQTT message, 0 publishes one message per sample
+DEFAULT_DRAIN_TIMEOUT = 5.0  # Maximum time (in seconds) to wait for in-flight messages after the run
+GENERATOR_TICK = 0.01  # Interval (in seconds) at which devices emit their due samples
+PPG_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                            "ppgserver",
+                            "filtered_ppg_signal_with_timestamps.csv")
+
+# Topics, laid out as published by IMUSensorManager with a device ID
+GYROSCOPE_TOPIC = "IMU/{device}/gyroscope"
+ACCELEROMETER_TOPIC = "IMU/{device}/accelerometer"
+PPG_TOPIC = "PPG/{device}/ppg"
+SUBSCRIBE_TOPICS = ["IMU/#", "PPG/#"]
+
+
+def synthetic_imu(count, rng):
+    """
+    Generates raw BMI160 readings: a gyroscope random walk and gravity on the
+    z axis of the accelerometer with noise.
+
+    Returns:
+    np.ndarray: (count, 6) int array with columns gx, gy, gz, ax, ay, az.
+    """
+    gyro = np.clip(np.cumsum(rng.integers(-200, 201, (count, 3)), axis=0),
+                   -32768, 32767)
+    accel = rng.normal(0, 200, (count, 3)) + (0, 0, 16384)
+    return np.hstack((gyro, accel)).astype(np.int64)
+
+
+def synthetic_ppg(count, rate):
+    """
+    Generates a PPG-like pulse wave at 72 beats per minute.
+
+    Returns:
+    np.ndarray: (count, 1) float array.
+    """
+    t = np.arange(count) / rate
+    phase = 2 * np.pi * 1.2 * t
+    return (np.sin(phase) + 0.3 * np.sin(2 * phase)).reshape(-1, 1)
+
+
+def load_ppg(path=PPG_CSV_PATH):
+    """
+    Loads the Filtered_PPG column of the bundled recording.
+
+    Returns:
+    np.ndarray: (N, 1) float array.
+    """
+    return np.loadtxt(path, delimiter=",", skiprows=1,
+                      usecols=2).reshape(-1, 1)
+
+
+class LatencyRecorder:
+    """
+    Matches received messages with their publish time.
+
+    Messages of one topic come from a single client and MQTT keeps their order,
+    so the n-th message received on a topic is the n-th message published on
+    it. Payloads do not need to carry a send time.
+    """
+
+    def __init__(self):
+        self._sent = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.samples_sent = 0
+        self.samples_received = 0
+        self.publish_errors = 0
+
+    def sent(self, topic, samples, payload=None):
+        with self._lock:
+            self._sent[topic].append((time.perf_counter(), samples, payload))
+            self.messages_sent += 1
+            self.samples_sent += samples
+
+    def failed(self, topic, payload=None):
+        """
+        Forgets a message that will never arrive, its samples count as
+        dropped. Without payload it is the last message sent on the topic,
+        otherwise the oldest one with that payload (the same object).
+        """
+        with self._lock:
+            pending = self._sent[topic]
+            if payload is None:
+                pending.pop()
+            else:
+                # Searched from the oldest, only in-flight messages are older
+                index = next((index for index, entry in enumerate(pending)
+                              if entry[2] is payload), None)
+                if index is not None:
+                    del pending[index]
+            self.messages_sent -= 1
+            self.publish_errors += 1
+
+    def received(self, topic):
+        now = time.perf_counter()
+        with self._lock:
+            pending = self._sent.get(topic)
+            if not pending:
+                return
+            sent_at, samples, _ = pending.popleft()
+            self.latencies.append(now - sent_at)
+            self.messages_received += 1
+            self.samples_received += samples
+
+
+class MqttOutput:
+    """
+    Publishes samples over MQTT with one client per simulated device and
+    measures the latency with a subscriber on the same broker.
+
+    Parameters:
+    host (str): MQTT broker address.
+    port (int): MQTT broker port.
+    batch_size (int): Samples per message as JSON array, 0 for one JSON object per sample.
+    qos (int): Quality of service of the published messages.
+    backend (str): "thread" for paho clients with a network thread, "asyncio"
+                   for AsyncMqttPublisher (async_publisher.py).
+    """
+
+    def __init__(self, host, port, batch_size=DEFAULT_BATCH_SIZE, qos=0,
+                 backend="thread"):
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.qos = qos
+        self.backend = backend
+        self.recorder = LatencyRecorder()
+        self._clients = {}
+
+        self._subscribed = threading.Event()
+        self.subscriber = mqtt.Client()
+        self.subscriber.on_connect = lambda client, userdata, flags, rc: [
+            client.subscribe(topic) for topic in SUBSCRIBE_TOPICS
+        ]
+        self.subscriber.on_subscribe = lambda *args: self._subscribed.set()
+        self.subscriber.on_message = lambda client, userdata, message: \
+            self.recorder.received(message.topic)
+        self.subscriber.connect(host, port)
+        self.subscriber.loop_start()
+        if not self._subscribed.wait(5):
+            raise RuntimeError(f"No subscription on {host}:{port}")
+
+    def add_device(self, device_id):
+        if self.backend == "asyncio":
+            client = AsyncMqttPublisher(self.host, self.port,
+                                        default_qos=self.qos).start()
+        else:
+            client = mqtt.Client()
+            client.connect(self.host, self.port)
+            client.loop_start()
+        self._clients[device_id] = client
+
+    def write(self, device_id, topic, fields, values, timestamps):
+        client = self._clients[device_id]
+        rows = values.tolist()
+        times = np.round(timestamps * 1e6).astype(np.int64).tolist()
+        if self.batch_size:
+            topic += "/batch"
+            for start in range(0, len(rows), self.batch_size):
+                payload = json.dumps([
+                    dict(zip(fields, row), **{
+                        TIMESTAMP_KEY: timestamp,
+                        'device': device_id
+                    }) for row, timestamp in zip(
+                        rows[start:start + self.batch_size],
+                        times[start:start + self.batch_size])
+                ])
+                self._publish(client, topic, payload,
+                              len(rows[start:start + self.batch_size]))
+        else:
+            for row in rows:
+                payload = json.dumps(dict(zip(fields, row), device=device_id))
+                self._publish(client, topic, payload, 1)
+
+    def _publish(self, client, topic, payload, samples):
+        # Recorded before publishing, the subscriber can receive it right away
+        self.recorder.sent(topic, samples, payload)
+        result = client.publish(topic, payload, qos=self.qos)
+        if getattr(result, "dropped", None) is not None:
+            # AsyncMqttPublisher queued this message and dropped its oldest
+            # queued one, which may be on another topic
+            topic, payload = result.dropped[:2]
+            self.recorder.failed(topic, payload)
+        elif result.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.recorder.failed(topic)
+
+    def drain(self, timeout=DEFAULT_DRAIN_TIMEOUT):
+        """
+        Waits until all messages arrived or nothing arrived for a second.
+        """
+        deadline = time.monotonic() + timeout
+        last_count, last_change = -1, time.monotonic()
+        while time.monotonic() < deadline:
+            count = self.recorder.messages_received
+            if count >= self.recorder.messages_sent:
+                return
+            if count != last_count:
+                last_count, last_change = count, time.monotonic()
+            elif time.monotonic() - last_change > 1.0:
+                return
+            time.sleep(0.05)
+
+    def close(self):
+        for client in list(self._clients.values()) + [self.subscriber]:
+            if isinstance(client, AsyncMqttPublisher):
+                client.stop()
+                continue
+            client.loop_stop()
+            client.disconnect()
+
+
+class _WriteHandler(http.server.BaseHTTPRequestHandler):
+    # Accepts /api/v2/write requests and records the age of every point
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        now = time.time()
+        lines = body.decode().splitlines()
+        self.server.stand_in.received(
+            [now - int(line.rsplit(" ", 1)[1]) / 1e9 for line in lines if line])
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class InfluxStandIn:
+    """
+    Local HTTP server standing in for the InfluxDB write API. It accepts every
+    write and records the latency of each point: the time between the sample
+    timestamp and the arrival of its batch.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.latencies = []
+        self.points_received = 0
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port),
+                                                       _WriteHandler)
+        self._server.stand_in = self
+        self.url = "http://%s:%d" % self._server.server_address
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+
+    def received(self, latencies):
+        with self._lock:
+            self.latencies.extend(latencies)
+            self.points_received += len(latencies)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class InfluxOutput:
+    """
+    Writes samples to InfluxDB with one InfluxLineSink shared by all devices,
+    as multi_sensor.py does.
+    """
+
+    def __init__(self, url, token, org, bucket, batch_size, flush_interval):
+        self.sink = InfluxLineSink(url, token, org, bucket, batch_size,
+                                   flush_interval)
+        self.samples_sent = 0
+
+    def add_device(self, device_id):
+        pass
+
+    def write(self, device_id, topic, fields, values, timestamps):
+        self.sink.add_block(topic, fields, values, timestamps,
+                            {'device': device_id})
+        self.samples_sent += len(values)
+
+    def close(self):
+        self.sink.close()
+
+
+class SimulatedDevice:
+    """
+    Emits the samples of one device that are due at the configured rate,
+    looping over its source signal.
+
+    Parameters:
+    device_id (str): Device ID, used in topics and as 'device' field.
+    rate (float): Samples per second.
+    topics (list): (topic, fields, first column, last column) per published topic.
+    signal (np.ndarray): (N, columns) source samples, repeated when exhausted.
+    """
+
+    def __init__(self, device_id, rate, topics, signal):
+        self.device_id = device_id
+        self.rate = rate
+        self.topics = topics
+        self.signal = signal
+        self.emitted = 0
+
+    def emit(self, output, start_time, now):
+        due = int((now - start_time) * self.rate) - self.emitted
+        if due <= 0:
+            return 0
+        index = np.arange(self.emitted, self.emitted + due)
+        values = self.signal[index % len(self.signal)]
+        timestamps = start_time + index / self.rate
+        for topic, fields, first, last in self.topics:
+            output.write(self.device_id, topic, fields, values[:, first:last],
+                         timestamps)
+        self.emitted += due
+        return due
+
+
+def create_devices(imu_devices, ppg_devices, imu_rate, ppg_rate, ppg_source):
+    rng = np.random.default_rng(0)
+    devices = []
+    for i in range(imu_devices):
+        device_id = f"imu{i}"
+        devices.append(
+            SimulatedDevice(device_id, imu_rate, [
+                (GYROSCOPE_TOPIC.format(device=device_id),
+                 ('gx', 'gy', 'gz'), 0, 3),
+                (ACCELEROMETER_TOPIC.format(device=device_id),
+                 ('ax', 'ay', 'az'), 3, 6),
+            ], synthetic_imu(int(imu_rate * 60), rng)))
+    if ppg_devices:
+        signal = (load_ppg() if ppg_source == "csv" else synthetic_ppg(
+            int(ppg_rate * 60), ppg_rate))
+    for i in range(ppg_devices):
+        device_id = f"ppg{i}"
+        devices.append(
+            SimulatedDevice(device_id, ppg_rate, [
+                (PPG_TOPIC.format(device=device_id), ('ppg', ), 0, 1)
+            ], signal))
+    return devices
+
+
+def run_devices(devices, output, duration):
+    """
+    Emits the samples of all devices every GENERATOR_TICK for duration seconds,
+    one thread per device.
+
+    Returns:
+    float: Elapsed time in seconds.
+    """
+    start_time = time.time()
+    end_time = start_time + duration
+
+    def run(device):
+        next_tick = time.time()
+        while True:
+            now = min(time.time(), end_time)
+            device.emit(output, start_time, now)
+            if now >= end_time:
+                return
+            next_tick += GENERATOR_TICK
+            time.sleep(max(0.0, next_tick - time.time()))
+
+    threads = [
+        threading.Thread(target=run, args=(device, ), daemon=True)
+        for device in devices
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start_time
+
+
+def percentiles(latencies):
+    if not latencies:
+        return "no samples"
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1e3, (50, 95, 99))
+    return (f"p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms, "
+            f"max {max(latencies) * 1e3:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulates IMU and PPG devices and benchmarks the pipeline.")
+    parser.add_argument("--imu-devices", type=int, default=DEFAULT_IMU_DEVICES)
+    parser.add_argument("--ppg-devices", type=int, default=DEFAULT_PPG_DEVICES)
+    parser.add_argument("--imu-rate", type=float, default=DEFAULT_IMU_RATE,
+                        help="samples per second per IMU")
+    parser.add_argument("--ppg-rate", type=float, default=DEFAULT_PPG_RATE,
+                        help="samples per second per PPG sensor")
+    parser.add_argument("--ppg-source", choices=("csv", "synthetic"),
+                        default="csv",
+                        help="replay the bundled recording or a synthetic pulse")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION,
+                        help="length of the run in seconds")
+    parser.add_argument("--output", choices=("mqtt", "influx"), default="mqtt")
+    parser.add_argument("--broker",
+                        help="host:port of an MQTT broker, by default an "
+                        "in-process fake broker is started")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="samples per MQTT message (0: one per sample), "
+                        "or points per InfluxDB write")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=0)
+    parser.add_argument("--mqtt-backend", choices=("thread", "asyncio"),
+                        default="thread",
+                        help="paho network threads or the asyncio publisher")
+    parser.add_argument("--influx-url",
+                        help="InfluxDB URL, by default a local stand-in "
+                        "server is started")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="maximum age of an InfluxDB batch in seconds")
+    args = parser.parse_args()
+
+    broker = stand_in = None
+    if args.output == "mqtt":
+        if args.broker:
+            host, _, port = args.broker.partition(":")
+            port = int(port or 1883)
+        else:
+            broker = FakeBroker(port=0).start()
+            host, port = broker.host, broker.port
+        output = MqttOutput(host, port, args.batch_size, args.qos,
+                            args.mqtt_backend)
+    else:
+        url = args.influx_url
+        if url is None:
+            stand_in = InfluxStandIn()
+            url = stand_in.url
+        output = InfluxOutput(url, os.getenv("INFLUXDB_TOKEN", ""),
+                              os.getenv("INFLUXDB_ORG", "loadgen"),
+                              os.getenv("INFLUXDB_BUCKET", "loadgen"),
+                              args.batch_size or 5000, args.flush_interval)
+
+    devices = create_devices(args.imu_devices, args.ppg_devices, args.imu_rate,
+                             args.ppg_rate, args.ppg_source)
+    for device in devices:
+        output.add_device(device.device_id)
+    target = sum(device.rate * len(device.topics) for device in devices)
+    print(f"{args.imu_devices} IMU and {args.ppg_devices} PPG devices, "
+          f"{target:.0f} points/s for {args.duration:.0f} s over {args.output}")
+
+    elapsed = run_devices(devices, output, args.duration)
+    if args.output == "mqtt":
+        output.drain()
+        output.close()
+        recorder = output.recorder
+        sent, received = recorder.samples_sent, recorder.samples_received
+        latencies = recorder.latencies
+        errors = recorder.publish_errors
+    else:
+        output.close()
+        sent, received = output.samples_sent, output.sink.points_written
+        latencies = stand_in.latencies if stand_in else []
+        errors = output.sink.retries
+    if broker:
+        broker.stop()
+    if stand_in:
+        stand_in.stop()
+
+    print(f"Sent:      {sent} points, {sent / elapsed:.0f} points/s")
+    print(f"Delivered: {received} points, {received / elapsed:.0f} points/s")
+    print(f"Dropped:   {sent - received} points, {errors} errors or retries")
+    print(f"Latency:   {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
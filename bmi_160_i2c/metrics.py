@@ -0,0 +1,219 @@
+import time
+import bisect
+import threading
+import http.server
+
+# Metrics defaults
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 10e-6, 25e-6, 50e-6, 100e-6, 250e-6,
+                   500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3,
+                   250e-3)  # Histogram bucket bounds in seconds
+DEFAULT_METRICS_PORT = 9108  # Port of the HTTP metrics endpoint
+METRICS_PREFIX = "imu_"  # Prefix of all exported metric names
+STAGES = ("read", "speed", "orientation", "process", "encode", "publish",
+          "cycle")  # Timed pipeline stages, 'cycle' is a whole read_and_publish()
+GAUGE_KEYS = ("ring_buffer_fill", "publish_queue_depth", "odr", "mqtt_queued")  # Stats that are levels, not counters
+SUMMARY_QUANTILES = (0.5, 0.99)  # Quantiles pushed per stage
+
+
+class Histogram:
+    """
+    Duration histogram with fixed buckets. observe_ns() is a bisect and three
+    additions, cheap enough for every sample. Each stage is observed by one
+    thread, so there is no lock.
+
+    Parameters:
+    buckets (tuple): Upper bounds of the buckets in seconds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bounds_ns = [int(bound * 1e9) for bound in buckets]
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum_ns = 0
+
+    def observe_ns(self, duration_ns):
+        self.counts[bisect.bisect_left(self.bounds_ns, duration_ns)] += 1
+        self.count += 1
+        self.sum_ns += duration_ns
+
+    def quantile(self, q, counts=None):
+        """
+        Estimates a quantile in seconds by linear interpolation within its
+        bucket, from the given bucket counts or from all observations.
+        """
+        counts = self.counts if counts is None else counts
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank -
+                                                            cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class PipelineMetrics:
+    """
+    Stage timers and counters of one IMU pipeline.
+
+    Stages are timed with time.perf_counter_ns(): take start = perf_counter_ns()
+    before the stage and call observe(stage, start) after it. The counters are
+    taken from a stats callable, e.g. IMUSensorManager.get_stats.
+
+    Parameters:
+    labels (dict): Labels of all metrics, e.g. {'device': 'imu0'}.
+    stats (callable): Returns a dict of counters and gauges.
+    """
+
+    def __init__(self, labels=None, stats=None):
+        self.labels = labels or {}
+        self.stats = stats
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self._last_counts = {stage: list(histogram.counts)
+                             for stage, histogram in self.stages.items()}
+        self._last_sums = {stage: 0 for stage in STAGES}
+
+    def observe(self, stage, start_ns):
+        """
+        Records the time since start_ns (from time.perf_counter_ns()) for a stage.
+        """
+        self.stages[stage].observe_ns(time.perf_counter_ns() - start_ns)
+
+    def render(self):
+        """
+        Returns the samples of all metrics as (family, type, help, name, labels, value).
+        """
+        samples = []
+        family = METRICS_PREFIX + "stage_duration_seconds"
+        for stage, histogram in self.stages.items():
+            if not histogram.count:
+                continue
+            labels = dict(self.labels, stage=stage)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf", ),
+                                    histogram.counts):
+                cumulative += count
+                samples.append((family, "histogram", "Time spent per pipeline stage",
+                                family + "_bucket", dict(labels, le=str(bound)),
+                                cumulative))
+            samples.append((family, "histogram", "", family + "_sum", labels,
+                            histogram.sum_ns / 1e9))
+            samples.append((family, "histogram", "", family + "_count", labels,
+                            histogram.count))
+
+        for key, value in (self.stats() if self.stats else {}).items():
+            if key in GAUGE_KEYS:
+                name = METRICS_PREFIX + key
+                samples.append((name, "gauge", key.replace("_", " "), name,
+                                self.labels, value))
+            else:
+                name = METRICS_PREFIX + key + "_total"
+                samples.append((name, "counter", key.replace("_", " "), name,
+                                self.labels, value))
+        return samples
+
+    def summary(self):
+        """
+        Returns the stage timings since the previous call and the current
+        counters as flat fields for pushing: <stage>_count, <stage>_mean_us,
+        <stage>_p50_us and <stage>_p99_us.
+        """
+        fields = {}
+        for stage, histogram in self.stages.items():
+            counts = list(histogram.counts)
+            interval = [
+                now - last for now, last in zip(counts, self._last_counts[stage])
+            ]
+            count = sum(interval)
+            sum_ns = histogram.sum_ns - self._last_sums[stage]
+            self._last_counts[stage] = counts
+            self._last_sums[stage] = histogram.sum_ns
+            if not count:
+                continue
+            fields[f"{stage}_count"] = count
+            fields[f"{stage}_mean_us"] = round(sum_ns / count / 1e3, 1)
+            for q in SUMMARY_QUANTILES:
+                fields[f"{stage}_p{int(q * 100)}_us"] = round(
+                    histogram.quantile(q, interval) * 1e6, 1)
+        if self.stats:
+            fields.update(self.stats())
+        return fields
+
+
+def format_metrics(metrics_list):
+    """
+    Formats the metrics of several pipelines in the Prometheus text format,
+    with one HELP and TYPE line per metric family.
+    """
+    families = {}
+    for metrics in metrics_list:
+        for family, kind, help_text, name, labels, value in metrics.render():
+            if family not in families:
+                families[family] = (kind, help_text, [])
+            families[family][2].append((name, labels, value))
+
+    lines = []
+    for family, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for name, labels, value in samples:
+            label_text = ",".join(f'{key}="{value}"'
+                                  for key, value in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else
+                         f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = format_metrics(self.server.metrics_list).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """
+    Serves the metrics of one or more pipelines on http://<host>:<port>/metrics
+    from a background thread, in the Prometheus text format.
+
+    Parameters:
+    metrics_list (list): PipelineMetrics objects to export.
+    port (int): Port to listen on.
+    host (str): Address to listen on.
+    """
+
+    def __init__(self, metrics_list, port=DEFAULT_METRICS_PORT, host=""):
+        self._server = http.server.ThreadingHTTPServer((host, port),
+                                                       _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.metrics_list = metrics_list
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
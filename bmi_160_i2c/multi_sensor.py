@@ -0,0 +1,194 @@
+import time
+import queue
+import threading
+from IMUProcessor import (METRICS_PORT, MQTT_BROKER_IP, MQTT_PORT,
+                          PROCESSING_TIMEOUT, PUBLISH_QUEUE_SIZE, USE_FIFO,
+                          IMUSensorManager, close_mqtt_client,
+                          create_influx_sink, create_mqtt_client)
+from metrics import MetricsServer
+
+# Sensors driven by this process. Each I2C bus can carry two BMI160s (0x68 and 0x69)
+SENSORS = [
+    {"device_id": "imu0", "bus_id": 1, "address": 0x68},
+    {"device_id": "imu1", "bus_id": 1, "address": 0x69},
+]
+
+
+class MultiIMUManager:
+    """
+    Drives several BMI160 sensors, possibly on several I2C buses, from one process.
+
+    Every sensor gets its own IMUSensorManager with a device ID, so its samples are
+    published on IMU/<device_id>/... with a 'device' field. Reads on one bus are
+    serialized anyway, so each bus has one acquisition thread that reads its
+    sensors round-robin, rotating the first sensor every cycle so none of them is
+    always served last. Different buses are read concurrently. One processing
+    thread and one publishing thread serve all sensors over a shared MQTT client.
+
+    Parameters:
+    sensors (list): Dicts with the 'device_id', 'bus_id' and 'address' of every sensor.
+    mqtt_broker (str): IP address of the MQTT broker.
+    mqtt_port (int): Port of the MQTT broker.
+    use_fifo (bool): Drain the sensor FIFOs instead of polling single samples.
+    """
+
+    def __init__(self, sensors, mqtt_broker, mqtt_port, use_fifo=USE_FIFO):
+        self.use_fifo = use_fifo
+        self.mqtt_client, self.spool_publisher = create_mqtt_client(
+            mqtt_broker, mqtt_port)
+        self.influx_sink = create_influx_sink()
+
+        self.managers = []
+        self.buses = {}
+        for sensor in sensors:
+            manager = IMUSensorManager(sensor["address"],
+                                       mqtt_broker,
+                                       mqtt_port,
+                                       use_fifo,
+                                       bus_id=sensor["bus_id"],
+                                       device_id=sensor["device_id"],
+                                       mqtt_client=self.mqtt_client,
+                                       spool_publisher=self.spool_publisher,
+                                       influx_sink=self.influx_sink)
+            self.managers.append(manager)
+            self.buses.setdefault(sensor["bus_id"], []).append(manager)
+
+        # One metrics endpoint for all sensors, labelled by device
+        self.metrics_server = None
+        metrics_list = [
+            manager.metrics for manager in self.managers
+            if manager.metrics is not None
+        ]
+        if metrics_list and METRICS_PORT:
+            self.metrics_server = MetricsServer(metrics_list, METRICS_PORT)
+
+        self.publish_queue = queue.Queue(maxsize=PUBLISH_QUEUE_SIZE)
+        self.data_available = threading.Event()
+        self.stop_flag = threading.Event()
+        self.acquisition_done = threading.Event()
+        self.threads = []
+
+    def start(self):
+        """
+        Starts one acquisition thread per bus, the processing and the publishing thread.
+        """
+        self.stop_flag.clear()
+        self.acquisition_done.clear()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        acquisition_threads = [
+            threading.Thread(target=self._bus_worker,
+                             args=(managers, ),
+                             daemon=True) for managers in self.buses.values()
+        ]
+        self.threads = acquisition_threads + [
+            threading.Thread(target=self._processing_worker, daemon=True),
+            threading.Thread(target=self._publishing_worker, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stops all threads after publishing everything acquired so far and
+        closes the shared MQTT client and InfluxDB sink.
+        """
+        self.stop_flag.set()
+        if self.threads:
+            *acquisition, processing, publishing = self.threads
+            for thread in acquisition:
+                thread.join()
+            self.acquisition_done.set()
+            self.data_available.set()
+            processing.join()
+            self.publish_queue.put(None)  # Wake up and stop the publisher
+            publishing.join()
+            self.threads = []
+
+        for manager in self.managers:
+            manager.stop()  # Publish pending batch windows
+        close_mqtt_client(self.mqtt_client, self.spool_publisher)
+        if self.influx_sink is not None:
+            self.influx_sink.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+    def get_stats(self):
+        """
+        Returns the pipeline counters of every sensor by device ID.
+        """
+        return {
+            manager.device_id: manager.get_stats()
+            for manager in self.managers
+        }
+
+    def _bus_worker(self, managers):
+        # Every sensor keeps its own schedule, idle sensors are read less often
+        next_reads = [time.monotonic()] * len(managers)
+        first = 0
+        while not self.stop_flag.is_set():
+            now = time.monotonic()
+            for i in range(len(managers)):
+                index = (first + i) % len(managers)
+                if next_reads[index] > now:
+                    continue
+                manager = managers[index]
+                block = manager.acquire()
+                if block is not None:
+                    manager.ring_buffer.write(*block)
+
+                # Keep a fixed schedule instead of sleeping a fixed time after each read
+                next_reads[index] += manager.poll_interval
+                if next_reads[index] <= now:
+                    manager.loop_overruns += 1
+                    next_reads[index] = now
+            first = (first + 1) % len(managers)
+            self.data_available.set()
+
+            delay = min(next_reads) - time.monotonic()
+            if delay > 0:
+                self.stop_flag.wait(delay)
+
+    def _processing_worker(self):
+        while not self.acquisition_done.is_set() or any(
+                len(manager.ring_buffer) for manager in self.managers):
+            self.data_available.wait(PROCESSING_TIMEOUT)
+            self.data_available.clear()
+
+            for manager in self.managers:
+                samples, timestamps, wall_times = manager.ring_buffer.read(
+                    timeout=0)
+                if not len(samples):
+                    continue
+
+                results = manager.process_block(samples, timestamps)
+                try:
+                    self.publish_queue.put_nowait(
+                        (manager, samples, results, wall_times))
+                except queue.Full:
+                    manager.publish_drops += len(samples)
+
+    def _publishing_worker(self):
+        while True:
+            block = self.publish_queue.get()
+            if block is None:
+                break
+            manager, samples, results, wall_times = block
+            manager.publish_batch(samples, results, wall_times)
+
+
+if __name__ == "__main__":
+    # Create one manager for all configured sensors
+    multi_manager = MultiIMUManager(SENSORS, MQTT_BROKER_IP, MQTT_PORT)
+
+    print(f"Starting {len(SENSORS)} IMU Sensors...")
+
+    try:
+        multi_manager.start()
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        multi_manager.stop()
+        print("IMU Sensors stopped.")  # Stop on keyboard interrupt
+        for device_id, stats in multi_manager.get_stats().items():
+            print(f"{device_id}: {stats}")
@@ -0,0 +1,254 @@
+import os
+import json
+import mmap
+import time
+import struct
+import numpy as np
+from bmi160 import MOTION_DATA_KEYS
+
+# Recording file layout
+RECORDING_MAGIC = b"IMRC"
+RECORDING_VERSION = 1
+RECORDING_SUFFIX = ".imr"
+# magic, version, samples per chunk, bytes per chunk, metadata length; followed
+# by the metadata as JSON, padded to HEADER_SIZE
+FILE_HEADER = struct.Struct("<4sIIII")
+HEADER_SIZE = mmap.ALLOCATIONGRANULARITY  # Chunks start at offsets that can be mapped
+# sample count, first and last sample time, wall-clock minus sample time; padded
+# to CHUNK_HEADER_SIZE, followed by the columns
+CHUNK_HEADER = struct.Struct("<Q3d")
+CHUNK_HEADER_SIZE = 64
+TIME_DTYPE = np.dtype("<f8")  # Sample times in seconds
+SAMPLE_DTYPE = np.dtype("<i2")  # Raw gyroscope and accelerometer counts
+
+# Defaults
+DEFAULT_CHUNK_SAMPLES = 4096  # Samples per chunk, 41 seconds at 100 Hz
+
+
+def chunk_size(chunk_samples):
+    """
+    Returns the bytes of a chunk of chunk_samples samples, a multiple of
+    HEADER_SIZE so every chunk can be mapped on its own.
+    """
+    size = (CHUNK_HEADER_SIZE + chunk_samples *
+            (TIME_DTYPE.itemsize + len(MOTION_DATA_KEYS) * SAMPLE_DTYPE.itemsize))
+    return -(-size // HEADER_SIZE) * HEADER_SIZE
+
+
+def _chunk_columns(buffer, chunk_samples, offset=0):
+    # Views of the time column and the sample columns of a chunk
+    position = offset + CHUNK_HEADER_SIZE
+    times = np.ndarray((chunk_samples,), TIME_DTYPE, buffer, position)
+    position += chunk_samples * TIME_DTYPE.itemsize
+    columns = []
+    for _ in MOTION_DATA_KEYS:
+        columns.append(np.ndarray((chunk_samples,), SAMPLE_DTYPE, buffer,
+                                  position))
+        position += chunk_samples * SAMPLE_DTYPE.itemsize
+    return times, columns
+
+
+class SessionRecorder:
+    """
+    Records raw samples to a columnar file, for re-processing them later with
+    other parameters (see reprocess.py).
+
+    The file is a sequence of fixed-size chunks of chunk_samples samples. Each
+    chunk holds its sample count, the times of its first and last sample and
+    the offset of wall-clock time, then one column of sample times (float64)
+    and one column per axis (int16), 20 bytes per sample. Only the chunk being
+    filled is memory-mapped; samples are copied into its columns and the
+    header is updated after every append, so a recording stays readable up to
+    the last appended block if the process dies.
+
+    Parameters:
+    path (str): Path of the recording, an existing file is overwritten.
+    metadata (dict): JSON-serializable settings stored in the file header.
+    chunk_samples (int): Samples per chunk.
+    """
+
+    def __init__(self,
+                 path: str,
+                 metadata=None,
+                 chunk_samples: int = DEFAULT_CHUNK_SAMPLES):
+        self.path = path
+        self.chunk_samples = chunk_samples
+        self.chunk_bytes = chunk_size(chunk_samples)
+        self.samples = 0
+        self.chunks = 0
+
+        header = json.dumps(metadata or {}).encode()
+        if FILE_HEADER.size + len(header) > HEADER_SIZE:
+            raise ValueError("Recording metadata is too large")
+        self._file = open(path, "w+b")
+        self._file.write(FILE_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION,
+                                          chunk_samples, self.chunk_bytes,
+                                          len(header)) + header)
+        self._file.truncate(HEADER_SIZE)
+        self._map = None
+        self._count = 0  # Samples in the current chunk
+        self._first_time = 0.0
+        self._wall_offset = 0.0
+
+    def append(self, samples, timestamps, wall_times=None):
+        """
+        Appends a block of samples.
+
+        Parameters:
+        samples (np.ndarray): (N, 6) array with columns gx, gy, gz, ax, ay, az.
+        timestamps (np.ndarray): (N,) array of sample times in seconds.
+        wall_times (np.ndarray): (N,) unix times of the samples, the offset of
+                                 the first block of a chunk is kept for it.
+        """
+        samples = np.asarray(samples)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        done = 0
+        while done < len(samples):
+            if self._map is None or self._count == self.chunk_samples:
+                offset = 0.0
+                if wall_times is not None:
+                    offset = wall_times[done] - timestamps[done]
+                self._new_chunk(offset)
+            count = min(len(samples) - done, self.chunk_samples - self._count)
+            end = self._count + count
+            self._times[self._count:end] = timestamps[done:done + count]
+            for i, column in enumerate(self._columns):
+                column[self._count:end] = samples[done:done + count, i]
+            if not self._count:
+                self._first_time = timestamps[done]
+            self._count = end
+            done += count
+            CHUNK_HEADER.pack_into(self._map, 0, self._count,
+                                   self._first_time, self._times[end - 1],
+                                   self._wall_offset)
+        self.samples += len(samples)
+
+    def close(self):
+        """
+        Writes the current chunk to disk and closes the file.
+        """
+        self._close_chunk()
+        self._file.close()
+
+    def _new_chunk(self, wall_offset):
+        self._close_chunk()
+        position = HEADER_SIZE + self.chunks * self.chunk_bytes
+        self._file.truncate(position + self.chunk_bytes)
+        self._map = mmap.mmap(self._file.fileno(),
+                              self.chunk_bytes,
+                              offset=position)
+        self._times, self._columns = _chunk_columns(self._map,
+                                                    self.chunk_samples)
+        self._count = 0
+        self._wall_offset = wall_offset
+        self.chunks += 1
+
+    def _close_chunk(self):
+        if self._map is None:
+            return
+        # The column views have to be released before the map can be closed
+        self._times = self._columns = None
+        self._map.flush()
+        self._map.close()
+        self._map = None
+
+
+class Recording:
+    """
+    Read-only, memory-mapped view of a file written by SessionRecorder.
+
+    The headers of all chunks form the time index: the chunks of a time range
+    are found with a binary search, and only their columns are read.
+
+    Parameters:
+    path (str): Path of the recording.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.chunk_samples, self.chunk_bytes, length = \
+            FILE_HEADER.unpack_from(self._map)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path} is not a recording")
+        self.metadata = json.loads(
+            bytes(self._map[FILE_HEADER.size:FILE_HEADER.size + length]))
+
+        # Chunk headers as strided arrays, skipping chunks without samples
+        chunks = (len(self._map) - HEADER_SIZE) // self.chunk_bytes
+        headers = np.ndarray((chunks,),
+                             np.dtype([("count", "<u8"), ("first", "<f8"),
+                                       ("last", "<f8"), ("wall", "<f8")]),
+                             self._map, HEADER_SIZE, (self.chunk_bytes,))
+        self._chunks = np.flatnonzero(headers["count"])
+        self.counts = headers["count"][self._chunks].astype(np.int64)
+        self.first_times = headers["first"][self._chunks].copy()
+        self.last_times = headers["last"][self._chunks].copy()
+        self.wall_offsets = headers["wall"][self._chunks].copy()
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    @property
+    def start_time(self):
+        return self.first_times[0] if len(self.counts) else None
+
+    @property
+    def stop_time(self):
+        return self.last_times[-1] if len(self.counts) else None
+
+    def chunks(self, start=None, stop=None):
+        """
+        Yields the samples of [start, stop) chunk by chunk, in sample time.
+
+        Yields:
+        tuple: (samples, timestamps, wall_times) with an (N, 6) int16 array
+               and (N,) float64 arrays.
+        """
+        first = 0
+        last = len(self.counts)
+        if start is not None:
+            first = int(np.searchsorted(self.last_times, start, side="left"))
+        if stop is not None:
+            last = int(np.searchsorted(self.first_times, stop, side="left"))
+        for index in range(first, last):
+            samples, timestamps = self._read_chunk(index)
+            # Only the first and last chunk of the range are cut
+            begin = 0 if start is None else np.searchsorted(timestamps, start)
+            end = (len(timestamps) if stop is None else np.searchsorted(
+                timestamps, stop))
+            samples, timestamps = samples[begin:end], timestamps[begin:end]
+            if len(timestamps):
+                yield samples, timestamps, timestamps + self.wall_offsets[index]
+
+    def read(self, start=None, stop=None):
+        """
+        Returns the samples of [start, stop) at once, see chunks().
+        """
+        blocks = list(self.chunks(start, stop))
+        if not blocks:
+            return (np.empty((0, len(MOTION_DATA_KEYS)), dtype=np.int16),
+                    np.empty(0), np.empty(0))
+        return tuple(np.concatenate(parts) for parts in zip(*blocks))
+
+    def close(self):
+        self._map.close()
+
+    def _read_chunk(self, index):
+        # Copies of the columns, the map can be closed while they are in use
+        count = int(self.counts[index])
+        offset = HEADER_SIZE + int(self._chunks[index]) * self.chunk_bytes
+        times, columns = _chunk_columns(self._map, self.chunk_samples, offset)
+        samples = np.column_stack([column[:count] for column in columns])
+        return samples, times[:count].copy()
+
+
+def recording_path(directory, device_id=None, start_time=None):
+    """
+    Returns the path of a new recording: <directory>/imu[_<device_id>]_<start
+    time>.imr.
+    """
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(start_time))
+    name = "imu" if device_id is None else f"imu_{device_id}"
+    return os.path.join(directory, f"{name}_{stamp}{RECORDING_SUFFIX}")
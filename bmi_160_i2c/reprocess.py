@@ -0,0 +1,185 @@
+import time
+import argparse
+import itertools
+import numpy as np
+import IMUProcessor
+from IMUProcessor import DEFAULT_BMI160_ADDRESS, IMUSensorManager
+from bench_imu import CountingClient
+from bmi160_sim import SimulatedDriver
+from recorder import Recording
+
+# Per-sample results written with --csv, besides the time and the parameters
+RESULT_FIELDS = ('speed_ms', 'speed_kmph', 'forward', 'backward', 'left',
+                 'right', 'upside_down')
+# Tunable parameters: IMUSensorManager attribute (and option) and default
+PARAMETERS = (
+    ("noise_threshold", IMUProcessor.NOISE_THRESHOLD),
+    ("decay_factor", IMUProcessor.DECAY_FACTOR),
+    ("stationary_reset_threshold", IMUProcessor.STATIONARY_RESET_THRESHOLD),
+)
+
+
+def create_manager(orientation_mode, parameters):
+    """
+    Creates a manager without sensor, broker or InfluxDB: samples come from a
+    recording and are only passed to process_batch(). Recording and the
+    adaptive rate are disabled, whatever IMUProcessor.py configures.
+    """
+    settings = {
+        'ORIENTATION_MODE': orientation_mode,
+        'RECORD_ENABLED': False,
+        'ADAPTIVE_RATE': False,
+        'METRICS_ENABLED': False,
+    }
+    previous = {name: getattr(IMUProcessor, name) for name in settings}
+    for name, value in settings.items():
+        setattr(IMUProcessor, name, value)
+    try:
+        manager = IMUSensorManager(DEFAULT_BMI160_ADDRESS,
+                                   None,
+                                   None,
+                                   use_fifo=True,
+                                   mqtt_client=CountingClient(),
+                                   influx_sink=None,
+                                   driver=SimulatedDriver(
+                                       np.zeros((1, 6), dtype=np.int16)))
+    finally:
+        for name, value in previous.items():
+            setattr(IMUProcessor, name, value)
+    for name, value in parameters.items():
+        setattr(manager, name, value)
+    return manager
+
+
+def reprocess(recording, manager, start=None, stop=None, output=None,
+              prefix=()):
+    """
+    Runs process_batch() over the samples of [start, stop) of a recording,
+    one chunk at a time.
+
+    Parameters:
+    recording (Recording): The recording.
+    manager (IMUSensorManager): Manager with the parameters to try, see create_manager().
+    start (float): Sample time to start at, None for the start of the recording.
+    stop (float): Sample time to stop at, None for the end of the recording.
+    output (file): File for per-sample results as CSV rows, None to skip them.
+    prefix (tuple): Values written before the time in every CSV row.
+
+    Returns:
+    dict: Number of samples, seconds of sample time, mean and maximum speed in
+          km/h and the share of samples with a speed above zero.
+    """
+    stats = {'samples': 0, 'seconds': 0.0, 'speed_sum': 0.0,
+             'max_speed_kmph': 0.0, 'moving': 0}
+    for samples, timestamps, wall_times in recording.chunks(start, stop):
+        if manager.last_time is None:
+            # The first sample gets the interval of the following ones
+            interval = (np.median(np.diff(timestamps[:100]))
+                        if len(timestamps) > 1 else
+                        1.0 / recording.metadata.get('odr', IMUProcessor.FIFO_ODR))
+            manager.last_time = timestamps[0] - interval
+            first_time = manager.last_time
+        results = manager.process_batch(samples, timestamps)
+
+        speed = results['speed_kmph']
+        stats['samples'] += len(speed)
+        stats['speed_sum'] += float(speed.sum())
+        stats['max_speed_kmph'] = max(stats['max_speed_kmph'], float(speed.max()))
+        stats['moving'] += int(np.count_nonzero(speed))
+        if output is not None:
+            columns = [np.full(len(speed), value) for value in prefix]
+            columns.append(wall_times)
+            columns.extend(results[key] for key in RESULT_FIELDS)
+            np.savetxt(output, np.column_stack(columns), delimiter=",",
+                       fmt=["%g"] * len(prefix) + ["%.6f"] +
+                       ["%g"] * len(RESULT_FIELDS))
+
+    if stats['samples']:
+        stats['seconds'] = float(manager.last_time - first_time)
+    speed_sum = stats.pop('speed_sum')
+    stats['mean_speed_kmph'] = speed_sum / stats['samples'] if stats['samples'] else 0.0
+    stats['moving_share'] = stats['moving'] / stats['samples'] if stats['samples'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-runs the speed and orientation computation of "
+        "IMUProcessor.py over recordings, for every combination of the given "
+        "parameter values.")
+    parser.add_argument("recordings", nargs="+",
+                        help=".imr files written with RECORD_ENABLED")
+    for name, _ in PARAMETERS:
+        parser.add_argument("--" + name.replace("_", "-"), type=float,
+                            nargs="+",
+                            help="values to try, by default the value the "
+                            "recording was made with")
+    parser.add_argument("--orientation-mode", choices=("accel", "fusion"),
+                        help="by default the mode of the recording")
+    parser.add_argument("--start", type=float,
+                        help="seconds after the start of each recording")
+    parser.add_argument("--stop", type=float,
+                        help="seconds after the start of each recording")
+    parser.add_argument("--csv",
+                        help="file for the per-sample results of all runs")
+    args = parser.parse_args()
+
+    recordings = [Recording(path) for path in args.recordings]
+    for recording in recordings:
+        duration = ((recording.stop_time - recording.start_time)
+                    if len(recording) else 0.0)
+        print(f"{recording.path}: {len(recording)} samples, {duration:.1f} s, "
+              f"{len(recording.counts)} chunks")
+
+    # Parameter values to try, the first recording provides the defaults
+    metadata = recordings[0].metadata
+    values = [getattr(args, name) or [metadata.get(name, default)]
+              for name, default in PARAMETERS]
+    orientation_mode = (args.orientation_mode
+                        or metadata.get('orientation_mode', "accel"))
+
+    output = None
+    if args.csv:
+        output = open(args.csv, "w")
+        output.write(",".join(("run",) + tuple(name for name, _ in PARAMETERS) +
+                              ("time",) + RESULT_FIELDS) + "\n")
+
+    print(f"{'noise':>8}{'decay':>8}{'reset':>8}{'samples':>10}"
+          f"{'mean km/h':>11}{'max km/h':>10}{'moving':>8}{'x real-time':>13}")
+    for run, combination in enumerate(itertools.product(*values)):
+        parameters = dict(zip((name for name, _ in PARAMETERS), combination))
+        totals = {'samples': 0, 'seconds': 0.0, 'max_speed_kmph': 0.0,
+                  'moving': 0}
+        speed_sum = 0.0
+        cpu_start = time.process_time()
+        for recording in recordings:
+            start = stop = None
+            if args.start is not None and len(recording):
+                start = recording.start_time + args.start
+            if args.stop is not None and len(recording):
+                stop = recording.start_time + args.stop
+            manager = create_manager(orientation_mode, parameters)
+            stats = reprocess(recording, manager, start, stop, output,
+                              (run,) + combination)
+            for key in ('samples', 'seconds', 'moving'):
+                totals[key] += stats[key]
+            totals['max_speed_kmph'] = max(totals['max_speed_kmph'],
+                                           stats['max_speed_kmph'])
+            speed_sum += stats['mean_speed_kmph'] * stats['samples']
+        cpu_time = time.process_time() - cpu_start
+
+        samples = max(totals['samples'], 1)
+        speed_up = totals['seconds'] / cpu_time if cpu_time else float("inf")
+        print(f"{combination[0]:>8g}{combination[1]:>8g}{combination[2]:>8g}"
+              f"{totals['samples']:>10}{speed_sum / samples:>11.2f}"
+              f"{totals['max_speed_kmph']:>10.2f}"
+              f"{totals['moving'] / samples:>8.0%}{speed_up:>13.0f}")
+
+    if output is not None:
+        output.close()
+    for recording in recordings:
+        recording.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import threading
+import numpy as np
+
+DEFAULT_CAPACITY = 4096  # Number of samples held by the ring buffer
+MOTION_CHANNELS = 6  # gx, gy, gz, ax, ay, az
+
+
+class SampleRingBuffer:
+    """
+    Fixed-size ring buffer of IMU samples backed by preallocated NumPy arrays.
+
+    Every sample carries two timestamps: the sample time used for processing
+    (sensor time in FIFO mode) and the wall-clock time used for publishing.
+    One writer and one reader may use the buffer from different threads. If the
+    writer laps the reader, the oldest unread samples are overwritten and
+    counted in `overruns`.
+
+    Parameters:
+    capacity (int): Maximum number of unread samples.
+    channels (int): Number of int16 values per sample.
+    """
+
+    def __init__(self,
+                 capacity: int = DEFAULT_CAPACITY,
+                 channels: int = MOTION_CHANNELS):
+        self.capacity = capacity
+        self.samples = np.zeros((capacity, channels), dtype=np.int16)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.wall_times = np.zeros(capacity, dtype=np.float64)
+
+        # Total number of samples written and read, positions are taken modulo capacity
+        self._written = 0
+        self._read = 0
+        self.overruns = 0
+
+        self._lock = threading.Lock()
+        self._data_available = threading.Condition(self._lock)
+
+    def __len__(self):
+        with self._lock:
+            return self._written - self._read
+
+    def write(self, samples, timestamps, wall_times):
+        """
+        Appends a block of samples, overwriting the oldest unread samples if full.
+
+        Parameters:
+        samples (np.ndarray): (N, channels) array of samples.
+        timestamps (np.ndarray): (N,) array of sample times in seconds.
+        wall_times (np.ndarray): (N,) array of unix times in seconds.
+        """
+        count = len(samples)
+        if count == 0:
+            return
+        # Only the newest samples fit if the block is larger than the buffer
+        skipped = max(0, count - self.capacity)
+
+        with self._lock:
+            self._copy_in(self._written + skipped, samples[skipped:],
+                          timestamps[skipped:], wall_times[skipped:])
+            self._written += count
+            unread = self._written - self._read
+            if unread > self.capacity:
+                self.overruns += unread - self.capacity
+                self._read = self._written - self.capacity
+            self._data_available.notify()
+
+    def read(self, max_samples=None, timeout=None):
+        """
+        Removes and returns the oldest unread samples, waiting up to timeout
+        seconds for data if the buffer is empty.
+
+        Returns:
+        tuple: (samples, timestamps, wall_times) copies, empty if no data arrived.
+        """
+        with self._lock:
+            if self._written == self._read:
+                self._data_available.wait(timeout)
+
+            count = self._written - self._read
+            if max_samples is not None:
+                count = min(count, max_samples)
+            block = self._copy_out(self._read, count)
+            self._read += count
+            return block
+
+    def _copy_in(self, start, samples, timestamps, wall_times):
+        # Write in up to two slices around the end of the arrays
+        position = start % self.capacity
+        first = min(len(samples), self.capacity - position)
+        for target, source in ((self.samples, samples),
+                               (self.timestamps, timestamps),
+                               (self.wall_times, wall_times)):
+            target[position:position + first] = source[:first]
+            target[:len(source) - first] = source[first:]
+
+    def _copy_out(self, start, count):
+        indices = (start + np.arange(count)) % self.capacity
+        return (self.samples[indices], self.timestamps[indices],
+                self.wall_times[indices])
@@ -0,0 +1,307 @@
+import os
+import json
+import mmap
+import struct
+import threading
+import time
+import paho.mqtt.client as mqtt
+from batch_publisher import BATCH_TOPIC_SUFFIX, TIMESTAMP_KEY
+
+# Spool file layout
+SPOOL_MAGIC = b"IMSP"
+SPOOL_VERSION = 1
+# magic, version, data capacity, head, tail, record count
+SPOOL_HEADER = struct.Struct("<4sIQQQQ")
+# record size, timestamp (unix time in microseconds), topic length
+RECORD_HEADER = struct.Struct("<IqH")
+WRAP_MARKER = 0  # Record size 0: the next record starts at the beginning of the data area
+
+# Defaults
+DEFAULT_SPOOL_SIZE = 64 * 1024 * 1024  # Bytes reserved for spooled messages
+DEFAULT_REPLAY_BATCH = 500  # Spooled messages replayed per publish call
+
+
+class MessageSpool:
+    """
+    Disk-backed, memory-mapped append-only ring of MQTT messages.
+
+    Messages are appended at the tail and consumed from the head. When the spool
+    is full the oldest messages are evicted to make room and counted in `evicted`.
+    Head and tail are kept in the file header, so spooled messages survive a
+    restart of the process.
+
+    Parameters:
+    path (str): Path of the spool file, created if it does not exist.
+    size (int): Bytes reserved for messages, used when the file is created.
+    """
+
+    def __init__(self, path: str, size: int = DEFAULT_SPOOL_SIZE):
+        self.path = path
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+        exists = os.path.exists(path) and os.path.getsize(
+            path) > SPOOL_HEADER.size
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            self._file.truncate(SPOOL_HEADER.size + size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+        magic, version, capacity, head, tail, count = SPOOL_HEADER.unpack_from(
+            self._map)
+        if not exists or magic != SPOOL_MAGIC or version != SPOOL_VERSION:
+            if exists:
+                print(f"Spool file {path} is invalid, starting empty.")
+            capacity = len(self._map) - SPOOL_HEADER.size
+            head = tail = count = 0
+        self.capacity = capacity
+        # Absolute byte positions, the position in the data area is taken modulo capacity
+        self._head = head
+        self._tail = tail
+        self._count = count
+        self._write_header()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, topic, payload, timestamp):
+        """
+        Appends one message, evicting the oldest messages if the spool is full.
+
+        Parameters:
+        topic (str): MQTT topic of the message.
+        payload (bytes or str): Message payload.
+        timestamp (float): Unix time of the message in seconds.
+
+        Returns:
+        bool: False if the message is larger than the spool and was dropped.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        topic = topic.encode()
+        size = RECORD_HEADER.size + len(topic) + len(payload)
+        if size > self.capacity:
+            self.evicted += 1
+            return False
+
+        with self._lock:
+            # Records are never split at the end of the data area
+            offset = self._tail % self.capacity
+            padding = self.capacity - offset if offset + size > self.capacity else 0
+            while self.capacity - (self._tail - self._head) < size + padding:
+                if self._head == self._tail:
+                    # Empty, continue at the beginning of the data area
+                    self._head = self._tail = self._tail + padding
+                    offset = padding = 0
+                    break
+                self._evict_oldest()
+
+            if padding:
+                if padding >= 4:
+                    struct.pack_into("<I", self._map, SPOOL_HEADER.size + offset,
+                                     WRAP_MARKER)
+                self._tail += padding
+                offset = 0
+
+            position = SPOOL_HEADER.size + offset
+            RECORD_HEADER.pack_into(self._map, position, size,
+                                    int(timestamp * 1e6), len(topic))
+            position += RECORD_HEADER.size
+            self._map[position:position + len(topic)] = topic
+            position += len(topic)
+            self._map[position:position + len(payload)] = payload
+
+            self._tail += size
+            self._count += 1
+            self._write_header()
+        return True
+
+    def read_batch(self, max_records):
+        """
+        Returns up to max_records of the oldest messages without removing them.
+
+        Returns:
+        tuple: (records, positions) where records is a list of (topic, payload,
+               timestamp) with the timestamp as unix time in seconds, and
+               positions holds the end position of every record, passed to
+               commit() once the records up to it have been handled.
+        """
+        with self._lock:
+            records = []
+            positions = []
+            position = self._head
+            while position < self._tail and len(records) < max_records:
+                position, record = self._read_record(position)
+                records.append(record)
+                positions.append(position)
+            return records, positions
+
+    def commit(self, position):
+        """
+        Removes all messages before a position returned by read_batch().
+        Messages evicted in the meantime are not removed twice.
+        """
+        with self._lock:
+            while self._head < min(position, self._tail):
+                self._head, _ = self._read_record(self._head)
+                self._count -= 1
+            self._write_header()
+
+    def flush(self):
+        """
+        Writes the spool to disk.
+        """
+        self._map.flush()
+
+    def close(self):
+        self.flush()
+        self._map.close()
+        self._file.close()
+
+    def _evict_oldest(self):
+        self._head, _ = self._read_record(self._head)
+        self._count -= 1
+        self.evicted += 1
+
+    def _read_record(self, position):
+        # Skip the unused space at the end of the data area
+        offset = position % self.capacity
+        if self.capacity - offset < RECORD_HEADER.size or struct.unpack_from(
+                "<I", self._map, SPOOL_HEADER.size + offset)[0] == WRAP_MARKER:
+            position += self.capacity - offset
+            offset = 0
+
+        start = SPOOL_HEADER.size + offset
+        size, timestamp, topic_length = RECORD_HEADER.unpack_from(
+            self._map, start)
+        topic_start = start + RECORD_HEADER.size
+        topic = self._map[topic_start:topic_start + topic_length].decode()
+        payload = self._map[topic_start + topic_length:start + size]
+        return position + size, (topic, payload, timestamp / 1e6)
+
+    def _write_header(self):
+        SPOOL_HEADER.pack_into(self._map, 0, SPOOL_MAGIC, SPOOL_VERSION,
+                               self.capacity, self._head, self._tail,
+                               self._count)
+
+
+class StoreAndForwardPublisher:
+    """
+    Publishes through an MQTT client while the broker is reachable and spools
+    messages to a MessageSpool while it is not. Once the connection is back,
+    spooled messages are replayed in bulk with their original timestamps.
+
+    Per-sample JSON messages carry no timestamp, so they are replayed as batched
+    JSON arrays on <topic>/batch (see batch_publisher.py). Other messages are
+    replayed unchanged. Messages are published in the order of their oldest
+    record. If the connection is lost during a replay, the records of the
+    messages published so far are committed up to the first unsent one, and
+    the later records already sent are skipped by the next replay, so no
+    message is published twice.
+
+    The client must run its network loop (loop_start()), the publisher tracks the
+    connection state through the client's connect callbacks.
+
+    Parameters:
+    mqtt_client (mqtt.Client): MQTT client used for publishing.
+    spool (MessageSpool): Spool for messages published while offline.
+    replay_batch (int): Maximum number of spooled messages replayed per publish call.
+    """
+
+    def __init__(self,
+                 mqtt_client,
+                 spool: MessageSpool,
+                 replay_batch: int = DEFAULT_REPLAY_BATCH):
+        self.mqtt_client = mqtt_client
+        self.spool = spool
+        self.replay_batch = replay_batch
+        self.connected = False
+        self.spooled = 0
+        self.replayed = 0
+        # End positions of records published ahead of the committed ones
+        self._sent_ahead = set()
+
+        self.mqtt_client.on_connect = self._on_connect
+        self.mqtt_client.on_disconnect = self._on_disconnect
+
+    def publish(self, topic, payload=None, timestamp=None):
+        """
+        Publishes a message, or spools it if the broker is unreachable.
+        The message time defaults to the current wall-clock time.
+        """
+        if self.connected and len(self.spool):
+            self.replay()
+
+        if self.connected:
+            result = self.mqtt_client.publish(topic, payload=payload)
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                return
+
+        if timestamp is None:
+            timestamp = time.time()
+        self.spool.append(topic, payload, timestamp)
+        self.spooled += 1
+
+    def replay(self):
+        """
+        Publishes the oldest batch of spooled messages.
+        """
+        records, positions = self.spool.read_batch(self.replay_batch)
+
+        # Merge per-sample JSON objects into timestamped arrays per topic.
+        # Messages are [topic, payload, record indices], ordered by their
+        # first record.
+        batches = {}
+        messages = []
+        for index, (topic, payload, timestamp) in enumerate(records):
+            if positions[index] in self._sent_ahead:
+                continue
+            if payload[:1] == b"{":
+                sample = {TIMESTAMP_KEY: int(timestamp * 1e6)}
+                sample.update(json.loads(payload))
+                batch_topic = topic + BATCH_TOPIC_SUFFIX
+                if batch_topic not in batches:
+                    batches[batch_topic] = [batch_topic, [], []]
+                    messages.append(batches[batch_topic])
+                batches[batch_topic][1].append(sample)
+                batches[batch_topic][2].append(index)
+            else:
+                messages.append([topic, payload, [index]])
+        for message in batches.values():
+            message[1] = json.dumps(message[1])
+
+        sent = []
+        for topic, payload, indices in messages:
+            result = self.mqtt_client.publish(topic, payload=payload)
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                # Connection lost again: commit the records before the first
+                # unsent one, remember the later ones that were sent
+                first_unsent = indices[0]
+                self._sent_ahead.update(positions[index] for index in sent
+                                        if index > first_unsent)
+                if first_unsent:
+                    self._commit(positions[first_unsent - 1])
+                self.replayed += len(sent)
+                return
+            sent.extend(indices)
+
+        if positions:
+            self._commit(positions[-1])
+        self.replayed += len(sent)
+        if not len(self.spool):
+            self.spool.flush()
+
+    def _commit(self, position):
+        self.spool.commit(position)
+        self._sent_ahead = {
+            sent for sent in self._sent_ahead if sent > position
+        }
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.connected = rc == 0
+        if self.connected:
+            print("Connected to MQTT broker.")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        print(f"Disconnected from MQTT broker ({rc}), spooling messages.")
@@ -20,6 +20,7 @@ def main():
     # Initialize MQTT client
     mqtt_client = mqtt.Client()
     mqtt_client.connect(MQTT_BROKER_IP, MQTT_PORT, 60)
+    mqtt_client.loop_start()  # Network thread for keepalives and reconnects
 
     # Read motion data every SLEEP_TIME seconds
     while True:
@@ -0,0 +1,109 @@
+import gzip
+import threading
+import http.server
+import numpy as np
+import pytest
+from influx_sink import InfluxLineSink
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in for the InfluxDB write API: answers the first `failures`
+    requests with 503 and Retry-After, and keeps the lines of the others.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        server.requests.append((self.path, dict(self.headers), body))
+        if len(server.requests) <= server.failures:
+            self.send_response(503)
+            self.send_header("Retry-After", "0.1")
+        else:
+            server.lines.extend(gzip.decompress(body).decode().splitlines())
+            self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.requests = []
+    server.lines = []
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_sink(server):
+    return InfluxLineSink(f"http://127.0.0.1:{server.server_port}", "token",
+                          "org", "bucket", flush_interval=0.1)
+
+
+def test_gzip_body(server):
+    sink = create_sink(server)
+    sink.add_block("IMU/gyroscope", ("gx", "gy", "gz"),
+                   np.array([[1, 2, 3], [4, 5, 6]], dtype=np.int16),
+                   np.array([1.5, 2.5]), {"device": "imu0"})
+    sink.close()
+
+    path, headers, body = server.requests[0]
+    assert path == "/api/v2/write?org=org&bucket=bucket&precision=ns"
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Authorization"] == "Token token"
+    assert gzip.decompress(body).decode().splitlines() == [
+        "mqtt_consumer,device=imu0,topic=IMU/gyroscope gx=1,gy=2,gz=3 1500000000",
+        "mqtt_consumer,device=imu0,topic=IMU/gyroscope gx=4,gy=5,gz=6 2500000000",
+    ]
+    assert sink.get_stats()['points_written'] == 2
+
+
+def test_retry_after_503(server):
+    server.failures = 1
+    sink = create_sink(server)
+    sink.add("IMU/speed", {"speed_ms": 0.5}, 3.0)
+    sink.close()
+
+    assert len(server.requests) == 2
+    assert server.lines == [
+        "mqtt_consumer,topic=IMU/speed speed_ms=0.5 3000000000"
+    ]
+    stats = sink.get_stats()
+    assert stats['retries'] == 1
+    assert stats['points_written'] == 1
+    assert stats['dropped_points'] == 0
+
+
+def test_tag_escaping(server):
+    sink = create_sink(server)
+    sink.add("IMU/a b,c=d", {"device": "imu 1,x=y", "ax": 1.0}, 1.0)
+    sink.close()
+
+    assert server.lines == [
+        r"mqtt_consumer,device=imu\ 1\,x\=y,topic=IMU/a\ b\,c\=d ax=1.0 1000000000"
+    ]
+
+
+def test_non_finite_values_skipped(server):
+    sink = create_sink(server)
+    sink.add("IMU/speed", {"speed_ms": float("nan"), "speed_kmph": 1.0}, 1.0)
+    sink.add("IMU/speed", {"speed_ms": float("inf")}, 2.0)
+    sink.add_block("IMU/accelerometer", ("ax", "ay"),
+                   np.array([[1.0, np.nan], [np.inf, -np.inf], [2.0, 3.0]]),
+                   np.array([3.0, 4.0, 5.0]))
+    sink.close()
+
+    assert server.lines == [
+        "mqtt_consumer,topic=IMU/speed speed_kmph=1.0 1000000000",
+        "mqtt_consumer,topic=IMU/accelerometer ax=1.0 3000000000",
+        "mqtt_consumer,topic=IMU/accelerometer ax=2.0,ay=3.0 5000000000",
+    ]
+    assert sink.get_stats()['skipped_values'] == 5
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from recorder import Recording, SessionRecorder
+
+CHUNK_SAMPLES = 16
+ODR = 100.0
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "session.imr")
+
+
+def record(path, blocks, wall_offset=1.7e9):
+    # Appends blocks of the given sizes, the samples count up from 0
+    recorder = SessionRecorder(path, {'odr': ODR}, CHUNK_SAMPLES)
+    total = 0
+    for size in blocks:
+        index = np.arange(total, total + size)
+        samples = np.column_stack([index + axis for axis in range(6)])
+        timestamps = index / ODR
+        recorder.append(samples.astype(np.int16), timestamps,
+                        timestamps + wall_offset)
+        total += size
+    recorder.close()
+    return total
+
+
+def test_round_trip_across_chunks(path):
+    # Blocks cross the chunk boundaries at 16, 32 and 48 samples
+    total = record(path, [5, 20, 1, 30, 3])
+    recording = Recording(path)
+
+    assert len(recording) == total == 59
+    assert recording.metadata == {'odr': ODR}
+    assert recording.counts.tolist() == [16, 16, 16, 11]
+    samples, timestamps, wall_times = recording.read()
+    index = np.arange(total)
+    np.testing.assert_array_equal(samples[:, 0], index)
+    np.testing.assert_array_equal(samples[:, 5], index + 5)
+    np.testing.assert_allclose(timestamps, index / ODR)
+    np.testing.assert_allclose(wall_times, index / ODR + 1.7e9)
+    assert [len(chunk[1]) for chunk in recording.chunks()] == [16, 16, 16, 11]
+    recording.close()
+
+
+def test_time_range(path):
+    record(path, [59])
+    recording = Recording(path)
+
+    # [0.10, 0.40) spans the first three chunks, cut in the first and last
+    samples, timestamps, _ = recording.read(0.10, 0.40)
+    np.testing.assert_array_equal(samples[:, 0], np.arange(10, 40))
+    assert len(list(recording.chunks(0.10, 0.40))) == 3
+
+    # Exactly one chunk, and ranges before and after the recording
+    samples, _, _ = recording.read(0.16, 0.32)
+    np.testing.assert_array_equal(samples[:, 0], np.arange(16, 32))
+    assert len(recording.read(stop=0.0)[0]) == 0
+    assert len(recording.read(start=1.0)[0]) == 0
+    np.testing.assert_array_equal(recording.read(start=0.55)[0][:, 0],
+                                  np.arange(55, 59))
+    recording.close()
+
+
+def test_empty_recording(path):
+    record(path, [])
+    recording = Recording(path)
+
+    assert len(recording) == 0
+    assert recording.start_time is None and recording.stop_time is None
+    assert list(recording.chunks()) == []
+    samples, timestamps, wall_times = recording.read()
+    assert samples.shape == (0, 6)
+    assert len(timestamps) == len(wall_times) == 0
+    recording.close()
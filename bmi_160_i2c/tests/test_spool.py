@@ -0,0 +1,132 @@
+import json
+import collections
+import paho.mqtt.client as mqtt
+import pytest
+from spool import RECORD_HEADER, MessageSpool, StoreAndForwardPublisher
+
+PublishResult = collections.namedtuple("PublishResult", "rc")
+
+
+class FlakyClient:
+    """
+    Stand-in for mqtt.Client: publish() succeeds `budget` times, then fails
+    as without a connection.
+    """
+
+    def __init__(self):
+        self.budget = 0
+        self.sent = []
+
+    def publish(self, topic, payload=None):
+        if self.budget <= 0:
+            return PublishResult(mqtt.MQTT_ERR_NO_CONN)
+        self.budget -= 1
+        self.sent.append((topic, payload))
+        return PublishResult(mqtt.MQTT_ERR_SUCCESS)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "spool.bin")
+
+
+def message(index):
+    return "IMU/speed", f'{{"i": {index:4d}}}'
+
+
+def record_size(index):
+    topic, payload = message(index)
+    return RECORD_HEADER.size + len(topic) + len(payload)
+
+
+def test_wrap_and_eviction(path):
+    # Room for 10 records, with unused space at the end of the data area
+    spool = MessageSpool(path, 10 * record_size(0) + 7)
+    for index in range(25):
+        assert spool.append(*message(index), 1000.0 + index)
+
+    assert spool.evicted == 15
+    assert len(spool) == 10
+    records, positions = spool.read_batch(100)
+    assert [json.loads(payload)["i"] for _, payload, _ in records] == list(
+        range(15, 25))
+    assert [timestamp for _, _, timestamp in records] == [
+        1000.0 + index for index in range(15, 25)
+    ]
+    assert positions == sorted(positions)
+
+    # Records that would never fit are dropped
+    assert not spool.append("IMU/speed", "x" * spool.capacity, 0.0)
+    spool.commit(positions[4])
+    assert len(spool) == 5
+    spool.close()
+
+
+def test_reopen_after_crash(path):
+    spool = MessageSpool(path, 4096)
+    for index in range(6):
+        spool.append(*message(index), 1000.0 + index)
+    _, positions = spool.read_batch(2)
+    spool.commit(positions[-1])
+    # No close(): the header is written with every change, as the kernel
+    # writes the mapped pages of a killed process
+
+    reopened = MessageSpool(path)
+    assert len(reopened) == 4
+    records, _ = reopened.read_batch(100)
+    assert [json.loads(payload)["i"] for _, payload, _ in records] == [
+        2, 3, 4, 5
+    ]
+    reopened.append(*message(6), 1006.0)
+    reopened.close()
+    spool.close()
+    assert len(MessageSpool(path)) == 5
+
+
+def test_invalid_file_starts_empty(path):
+    with open(path, "wb") as file:
+        file.write(b"not a spool" * 100)
+    spool = MessageSpool(path)
+    assert len(spool) == 0
+    spool.close()
+
+
+def test_interrupted_replay(path):
+    spool = MessageSpool(path, 1 << 16)
+    client = FlakyClient()
+    publisher = StoreAndForwardPublisher(client, spool, replay_batch=100)
+    expected = collections.Counter()
+    for index in range(30):
+        for topic in ("IMU/gyroscope", "IMU/accelerometer"):
+            payload = json.dumps({"i": index})
+            spool.append(topic, payload, 1000.0 + index)
+            expected[(topic, index)] += 1
+        if index % 10 == 0:
+            spool.append("IMU/burst", f"[{index}]", 1000.0 + index)
+            expected[("IMU/burst", index)] += 1
+
+    # The gyroscope batch (records 0, 2, 4, ...) is sent, the accelerometer
+    # batch is not: only record 0 is committed
+    client.budget = 1
+    publisher.replay()
+    assert len(spool) == 62
+    assert publisher.replayed == 30
+
+    # Connection still down: nothing changes
+    publisher.replay()
+    assert len(spool) == 62
+
+    while len(spool):
+        client.budget = 2
+        publisher.replay()
+
+    received = collections.Counter()
+    for topic, payload in client.sent:
+        for sample in json.loads(payload):
+            if topic == "IMU/burst":
+                received[(topic, sample)] += 1
+            else:
+                received[(topic[:-len("/batch")], sample["i"])] += 1
+    assert received == expected
+    assert publisher.replayed == 63
+    spool.close()
@@ -0,0 +1,160 @@
+import numpy as np
+from batch_publisher import TIMESTAMP_KEY
+from fusion import GYRO_SENSITIVITY
+from ring_buffer import SampleRingBuffer
+
+# Trigger defaults
+DEFAULT_PRE_TRIGGER_SAMPLES = 200  # Samples published before the first triggering sample
+DEFAULT_POST_TRIGGER_SAMPLES = 200  # Samples published after the last triggering sample
+DEFAULT_MAX_BURST_SAMPLES = 2000  # Longer bursts are split into several messages
+DEFAULT_MAGNITUDE_THRESHOLD = 5.0  # Acceleration beyond gravity (in m/s²) that triggers a burst
+DEFAULT_ANGULAR_RATE_THRESHOLD = 200.0  # Angular rate (in °/s) that triggers a burst
+TRIGGER_KEY = "trigger"  # 1 for samples that crossed a threshold, 0 otherwise
+SAMPLE_FIELDS = ("gx", "gy", "gz", "ax", "ay", "az")  # Columns of a sample
+
+
+class EventTrigger:
+    """
+    Captures full-rate bursts of raw samples around motion anomalies.
+
+    The last pre_samples samples are kept in a ring buffer. When a sample
+    crosses the magnitude or angular-rate threshold, the buffered samples, the
+    triggering samples and the post_samples samples after the last trigger are
+    published as one burst: a list of sample records (dicts, sent as a JSON
+    array) with their 'timestamp' (unix time in microseconds), gx..az and
+    'trigger'. A trigger during the post-trigger samples extends the burst.
+
+    Parameters:
+    publish (callable): Called as publish(topic, records, timestamp) to send a burst.
+    topic (str): MQTT topic of the bursts.
+    pre_samples (int): Samples kept before the first triggering sample.
+    post_samples (int): Samples captured after the last triggering sample.
+    magnitude_threshold (float): Instantaneous acceleration (i_vel, m/s²) threshold.
+    angular_rate_threshold (float): Angular rate (°/s) threshold.
+    max_burst_samples (int): Maximum number of samples per published message.
+    extra_fields (dict): Constant fields added to every sample, e.g. the device ID.
+    """
+
+    def __init__(self,
+                 publish,
+                 topic,
+                 pre_samples: int = DEFAULT_PRE_TRIGGER_SAMPLES,
+                 post_samples: int = DEFAULT_POST_TRIGGER_SAMPLES,
+                 magnitude_threshold: float = DEFAULT_MAGNITUDE_THRESHOLD,
+                 angular_rate_threshold: float = DEFAULT_ANGULAR_RATE_THRESHOLD,
+                 max_burst_samples: int = DEFAULT_MAX_BURST_SAMPLES,
+                 extra_fields: dict = None):
+        self.publish = publish
+        self.topic = topic
+        self.post_samples = post_samples
+        self.magnitude_threshold = magnitude_threshold
+        self.angular_rate_threshold = angular_rate_threshold
+        self.max_burst_samples = max_burst_samples
+        self.extra_fields = extra_fields or {}
+        self.pre_trigger = SampleRingBuffer(max(pre_samples, 1))
+        self.pre_samples = pre_samples
+
+        # Burst being captured: blocks of (samples, timestamps, triggered)
+        self._burst = []
+        self._burst_length = 0
+        self._remaining = 0  # Samples still to capture, 0 while idle
+
+        self.bursts = 0
+        self.burst_samples = 0
+
+    def add(self, samples, timestamps, i_vel):
+        """
+        Checks a block of samples for triggers and captures it.
+
+        Parameters:
+        samples (np.ndarray): (N, 6) array with columns gx, gy, gz, ax, ay, az.
+        timestamps (np.ndarray): (N,) array of unix times in seconds.
+        i_vel (np.ndarray): (N,) instantaneous acceleration beyond gravity in m/s².
+        """
+        count = len(samples)
+        gyro = np.asarray(samples[:, 0:3], dtype=np.float64)
+        angular_rate = np.sqrt(np.einsum("ij,ij->i", gyro,
+                                         gyro)) / GYRO_SENSITIVITY
+        triggered = ((np.asarray(i_vel) > self.magnitude_threshold)
+                     | (angular_rate > self.angular_rate_threshold))
+        hits = np.flatnonzero(triggered)
+
+        start = 0
+        while start < count:
+            if not self._remaining:
+                later = hits[hits >= start]
+                if not len(later):
+                    self._keep_pre_trigger(samples[start:], timestamps[start:])
+                    return
+                # Start a burst with the buffered samples before the trigger
+                first = later[0]
+                self._keep_pre_trigger(samples[start:first],
+                                       timestamps[start:first])
+                pre_samples, pre_timestamps, _ = self.pre_trigger.read(timeout=0)
+                self._append(pre_samples, pre_timestamps,
+                             np.zeros(len(pre_samples), dtype=bool))
+                self._remaining = 1
+                start = first
+
+            # Every trigger within the capture window extends it
+            end = start + self._remaining
+            later = hits[hits >= start]
+            if len(later):
+                prior_end = np.maximum(
+                    end,
+                    np.concatenate(([end], later[:-1] + self.post_samples + 1)))
+                breaks = np.flatnonzero(later >= prior_end)
+                chained = later[:breaks[0]] if len(breaks) else later
+                if len(chained):
+                    end = max(end, int(chained[-1]) + self.post_samples + 1)
+
+            stop = min(end, count)
+            self._append(samples[start:stop], timestamps[start:stop],
+                         triggered[start:stop])
+            self._remaining = end - stop
+            if not self._remaining:
+                self._publish_burst()
+            start = stop
+
+    def flush(self):
+        """
+        Publishes a burst still being captured.
+        """
+        self._publish_burst()
+        self._remaining = 0
+
+    def _keep_pre_trigger(self, samples, timestamps):
+        if self.pre_samples and len(samples):
+            # The ring buffer keeps one timestamp per sample twice, both unix times
+            self.pre_trigger.write(samples, timestamps, timestamps)
+
+    def _append(self, samples, timestamps, triggered):
+        if not len(samples):
+            return
+        self._burst.append((samples, timestamps, triggered))
+        self._burst_length += len(samples)
+        if self._burst_length >= self.max_burst_samples:
+            self._publish_burst()
+
+    def _publish_burst(self):
+        if not self._burst:
+            return
+        samples = np.concatenate([block[0] for block in self._burst])
+        timestamps = np.concatenate([block[1] for block in self._burst])
+        triggered = np.concatenate([block[2] for block in self._burst])
+        self._burst = []
+        self._burst_length = 0
+
+        times = np.round(np.asarray(timestamps) * 1e6).astype(np.int64)
+        burst = []
+        for timestamp, sample, flag in zip(times.tolist(), samples.tolist(),
+                                           triggered.astype(int).tolist()):
+            entry = {TIMESTAMP_KEY: timestamp}
+            entry.update(zip(SAMPLE_FIELDS, sample))
+            entry[TRIGGER_KEY] = flag
+            entry.update(self.extra_fields)
+            burst.append(entry)
+
+        self.publish(self.topic, burst, timestamps[0])
+        self.bursts += 1
+        self.burst_samples += len(burst)
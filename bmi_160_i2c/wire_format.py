@@ -0,0 +1,137 @@
+"""
+Compact binary wire format for batches of IMU samples.
+
+Layout (all values little-endian):
+
+    header   magic b"IM", version, flags, layout, channels, count (uint16),
+             base timestamp (int64, unix time in microseconds)
+    offsets  count x uint32, microseconds since the base (earliest) timestamp
+    values   count x channels x int16, row-major
+
+With FLAG_DELTA, offsets and values after the first row hold the difference to the
+previous row, wrapping around modulo 2**32 and 2**16. With FLAG_ZLIB, everything
+after the header is zlib-compressed. Only the standard library is used, so the
+decoder can run next to Telegraf without NumPy.
+"""
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b"IM"
+VERSION = 1
+HEADER = struct.Struct("<2sBBBBHq")
+
+# Flags
+FLAG_DELTA = 0x01  # Rows are stored as differences to the previous row
+FLAG_ZLIB = 0x02  # Offsets and values are zlib-compressed
+
+# Known channel layouts, the layout id is part of the header
+LAYOUT_GYROSCOPE = 0
+LAYOUT_ACCELEROMETER = 1
+LAYOUT_MOTION = 2
+LAYOUT_FIELDS = {
+    LAYOUT_GYROSCOPE: ('gx', 'gy', 'gz'),
+    LAYOUT_ACCELEROMETER: ('ax', 'ay', 'az'),
+    LAYOUT_MOTION: ('gx', 'gy', 'gz', 'ax', 'ay', 'az'),
+}
+
+MAX_SAMPLES = 0xFFFF  # Count is stored as uint16
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _to_little_endian(values):
+    if not LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def encode(timestamps, rows, layout, flags=0):
+    """
+    Encodes a batch of samples.
+
+    Parameters:
+    timestamps (list): Unix time of every sample in microseconds (int).
+    rows (list): One sequence of int16 values per sample, matching the layout.
+    layout (int): Channel layout id, one of the keys of LAYOUT_FIELDS.
+    flags (int): Combination of FLAG_DELTA and FLAG_ZLIB.
+
+    Returns:
+    bytes: Encoded message.
+
+    Raises:
+    ValueError: If the batch is empty, too large or does not match the layout.
+    """
+    count = len(timestamps)
+    channels = len(LAYOUT_FIELDS[layout])
+    if not 0 < count <= MAX_SAMPLES or len(rows) != count:
+        raise ValueError(f"Invalid batch of {count} samples")
+
+    base = min(timestamps)
+    offsets = array('I', [timestamp - base for timestamp in timestamps])
+    values = array('h')
+    for row in rows:
+        if len(row) != channels:
+            raise ValueError(
+                f"Expected {channels} values per sample, got {len(row)}")
+        values.extend(row)
+
+    if flags & FLAG_DELTA:
+        for i in range(count - 1, 0, -1):
+            offsets[i] = (offsets[i] - offsets[i - 1]) % 0x100000000
+        for i in range(len(values) - 1, channels - 1, -1):
+            delta = values[i] - values[i - channels]
+            values[i] = (delta + 0x8000) % 0x10000 - 0x8000
+
+    body = _to_little_endian(offsets).tobytes() + _to_little_endian(
+        values).tobytes()
+    if flags & FLAG_ZLIB:
+        body = zlib.compress(body)
+
+    return HEADER.pack(MAGIC, VERSION, flags, layout, channels, count,
+                       base) + body
+
+
+def decode(payload):
+    """
+    Decodes a message produced by encode().
+
+    Returns:
+    tuple: (fields, timestamps, rows) where fields are the channel names of the
+           layout, timestamps the unix times in microseconds and rows one tuple
+           of values per sample.
+
+    Raises:
+    ValueError: If the payload is not a valid message.
+    """
+    if len(payload) < HEADER.size:
+        raise ValueError("Payload shorter than header")
+    magic, version, flags, layout, channels, count, base = HEADER.unpack_from(
+        payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported message {magic!r} version {version}")
+    if layout not in LAYOUT_FIELDS or len(LAYOUT_FIELDS[layout]) != channels:
+        raise ValueError(f"Unknown layout {layout} with {channels} channels")
+
+    body = payload[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    if len(body) != count * (4 + 2 * channels):
+        raise ValueError("Payload size does not match sample count")
+
+    offsets = _to_little_endian(array('I', body[:count * 4]))
+    values = _to_little_endian(array('h', body[count * 4:]))
+
+    if flags & FLAG_DELTA:
+        for i in range(1, count):
+            offsets[i] = (offsets[i] + offsets[i - 1]) % 0x100000000
+        for i in range(channels, len(values)):
+            value = values[i] + values[i - channels]
+            values[i] = (value + 0x8000) % 0x10000 - 0x8000
+
+    timestamps = [base + offset for offset in offsets]
+    rows = [
+        tuple(values[i:i + channels])
+        for i in range(0, len(values), channels)
+    ]
+    return LAYOUT_FIELDS[layout], timestamps, rows
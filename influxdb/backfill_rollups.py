@@ -0,0 +1,157 @@
+import os
+import string
+import argparse
+from datetime import datetime, timedelta, timezone
+from influxdb_client import (BucketRetentionRules, InfluxDBClient,
+                             TaskCreateRequest)
+
+# InfluxDB configuration (can be overridden by command-line arguments)
+INFLUXDB_URL = os.getenv("INFLUXDB_URL", "http://localhost:8086")
+INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN", "TOKEN")
+INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "ORG")
+INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "BUCKET")
+
+# Rollup levels, as created by init/rollups.sh: window to retention in days
+ROLLUP_WINDOWS = {"1s": 30, "1m": 365}
+ROLLUP_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "rollup.flux")
+ROLLUP_EVERY = "1m"  # Interval of the rollup tasks
+ROLLUP_OFFSET = "10s"  # Delay of each task run, for points that arrive late
+DEFAULT_BACKFILL_DAYS = 7  # Retention of the main bucket
+DEFAULT_CHUNK_HOURS = 1  # Time range rolled up per query
+
+
+def render_rollup(bucket, org, window, start, stop):
+    """
+    Fills in the rollup.flux template.
+
+    Parameters:
+    bucket (str): Main bucket, the rollup bucket is <bucket>_<window>.
+    org (str): Organization of both buckets.
+    window (str): Aggregation window, one of the keys of ROLLUP_WINDOWS.
+    start (str): Flux expression of the start of the range.
+    stop (str): Flux expression of the stop of the range.
+
+    Returns:
+    str: The Flux script.
+    """
+    with open(ROLLUP_TEMPLATE) as f:
+        template = string.Template(f.read())
+    return template.substitute(source=bucket,
+                               destination=f"{bucket}_{window}",
+                               org=org,
+                               window=window,
+                               start=start,
+                               stop=stop)
+
+
+def ensure_rollups(client, bucket, org):
+    """
+    Creates the rollup buckets and tasks that do not exist yet, for InfluxDB
+    volumes that were set up before init/rollups.sh was added.
+    """
+    buckets_api = client.buckets_api()
+    tasks_api = client.tasks_api()
+    for window, days in ROLLUP_WINDOWS.items():
+        destination = f"{bucket}_{window}"
+        if buckets_api.find_bucket_by_name(destination) is None:
+            rules = BucketRetentionRules(type="expire",
+                                         every_seconds=days * 86400)
+            buckets_api.create_bucket(bucket_name=destination,
+                                      retention_rules=rules,
+                                      org=org)
+            print(f"Created bucket {destination}")
+
+        name = f"rollup_{window}"
+        if not tasks_api.find_tasks(name=name):
+            flux = (f'option task = {{name: "{name}", every: {ROLLUP_EVERY}, '
+                    f'offset: {ROLLUP_OFFSET}}}\n\n' +
+                    render_rollup(bucket, org, window, "-task.every", "now()"))
+            tasks_api.create_task(
+                task_create_request=TaskCreateRequest(org=org,
+                                                      flux=flux,
+                                                      status="active"))
+            print(f"Created task {name}")
+
+
+def backfill(client, bucket, org, window, start, stop, chunk):
+    """
+    Rolls up the data of [start, stop) chunk by chunk. Rollup points are
+    identified by series and time, so ranges that were already rolled up are
+    overwritten with the same values.
+
+    Returns:
+    int: Number of rollup points written.
+    """
+    query_api = client.query_api()
+    written = 0
+    chunk_start = start
+    while chunk_start < stop:
+        chunk_stop = min(chunk_start + chunk, stop)
+        flux = render_rollup(bucket, org, window,
+                             chunk_start.isoformat().replace("+00:00", "Z"),
+                             chunk_stop.isoformat().replace("+00:00", "Z"))
+        try:
+            tables = query_api.query(flux, org=org)
+        except Exception as e:
+            print(f"Error rolling up {chunk_start} to {chunk_stop}: {e}")
+            return written
+        points = sum(record.get_value() for table in tables
+                     for record in table.records)
+        written += points
+        print(f"{window}: {chunk_start:%Y-%m-%d %H:%M} to "
+              f"{chunk_stop:%Y-%m-%d %H:%M}, {points} points")
+        chunk_start = chunk_stop
+    return written
+
+
+def parse_time(text):
+    value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rolls existing data up into the rollup buckets.")
+    parser.add_argument("--url", default=INFLUXDB_URL)
+    parser.add_argument("--token", default=INFLUXDB_TOKEN)
+    parser.add_argument("--org", default=INFLUXDB_ORG)
+    parser.add_argument("--bucket", default=INFLUXDB_BUCKET,
+                        help="main bucket, rollups go to <bucket>_1s and "
+                        "<bucket>_1m")
+    parser.add_argument("--start", type=parse_time,
+                        help="start of the range (ISO 8601, UTC by default), "
+                        f"by default {DEFAULT_BACKFILL_DAYS} days ago")
+    parser.add_argument("--stop", type=parse_time,
+                        help="end of the range, by default now")
+    parser.add_argument("--window", choices=list(ROLLUP_WINDOWS),
+                        action="append",
+                        help="rollup level to backfill, by default all")
+    parser.add_argument("--chunk-hours", type=float,
+                        default=DEFAULT_CHUNK_HOURS,
+                        help="time range rolled up per query")
+    parser.add_argument("--skip-setup", action="store_true",
+                        help="do not create missing rollup buckets and tasks")
+    args = parser.parse_args()
+
+    # Whole minutes, so no window of either level is split between chunks
+    stop = (args.stop or datetime.now(timezone.utc)).replace(second=0,
+                                                             microsecond=0)
+    start = (args.start or stop - timedelta(days=DEFAULT_BACKFILL_DAYS)).replace(
+        second=0, microsecond=0)
+    chunk = timedelta(minutes=max(1, round(args.chunk_hours * 60)))
+
+    with InfluxDBClient(url=args.url, token=args.token, org=args.org) as client:
+        if not args.skip_setup:
+            ensure_rollups(client, args.bucket, args.org)
+        for window in args.window or list(ROLLUP_WINDOWS):
+            written = backfill(client, args.bucket, args.org, window, start,
+                               stop, chunk)
+            print(f"{window}: {written} rollup points written to "
+                  f"{args.bucket}_{window}")
+
+
+if __name__ == "__main__":
+    main()
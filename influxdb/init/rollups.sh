@@ -0,0 +1,34 @@
+#!/bin/bash
+# Runs once, after the initial setup of InfluxDB: creates the rollup buckets
+# and the tasks that fill them from the main bucket every ROLLUP_EVERY.
+set -e
+
+ROLLUP_TEMPLATE=/etc/rollups/rollup.flux
+ROLLUP_EVERY=1m  # Interval of the rollup tasks, each rolls up the preceding interval
+ROLLUP_OFFSET=10s  # Delay of each run, for points that arrive late
+
+create_rollup() {
+    local window=$1 retention=$2
+    local destination="${DOCKER_INFLUXDB_INIT_BUCKET}_${window}"
+
+    influx bucket create \
+        --org "${DOCKER_INFLUXDB_INIT_ORG}" \
+        --name "${destination}" \
+        --retention "${retention}"
+
+    {
+        echo "option task = {name: \"rollup_${window}\", every: ${ROLLUP_EVERY}, offset: ${ROLLUP_OFFSET}}"
+        echo
+        sed -e "s|\${source}|${DOCKER_INFLUXDB_INIT_BUCKET}|g" \
+            -e "s|\${destination}|${destination}|g" \
+            -e "s|\${org}|${DOCKER_INFLUXDB_INIT_ORG}|g" \
+            -e "s|\${window}|${window}|g" \
+            -e "s|\${start}|-task.every|g" \
+            -e "s|\${stop}|now()|g" \
+            "${ROLLUP_TEMPLATE}"
+    } > "/tmp/rollup_${window}.flux"
+    influx task create --org "${DOCKER_INFLUXDB_INIT_ORG}" --file "/tmp/rollup_${window}.flux"
+}
+
+create_rollup 1s 30d
+create_rollup 1m 365d
@@ -0,0 +1,2 @@
+# pytest configuration, the tests are in tests/ and import the modules of this
+# directory, which pytest puts on sys.path with this file
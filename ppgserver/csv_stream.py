@@ -0,0 +1,251 @@
+import io
+import os
+import json
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+# Streaming defaults
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # Bytes of CSV text parsed per chunk
+DEFAULT_CACHE_ROWS = 100000  # Rows per chunk when reading from the cache
+CACHE_SUFFIX = ".cache"  # Cache directory created next to the CSV file
+CACHE_META_FILE = "meta.json"  # Written last, a cache without it is incomplete
+CACHE_VERSION = 1
+INTEGER_COLUMNS_ATTR = "integer_columns"  # DataFrame.attrs key of the integer columns read as float64
+
+# Serializes moving finished cache files into place, sources may share a cache
+_cache_lock = threading.Lock()
+
+
+def _held_back_start(text, lines, eof):
+    """
+    Returns the position of the last `lines` complete lines of text, followed by
+    the incomplete last line unless the end of the file has been reached.
+    """
+    end = len(text) if eof else text.rfind(b"\n") + 1
+    for _ in range(lines):
+        if end == 0:
+            break
+        end = text.rfind(b"\n", 0, end - 1) + 1
+    return end
+
+
+def iter_csv_chunks(path,
+                    skiprows=0,
+                    skipfooter=0,
+                    usecols=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parses a CSV file in chunks with the C engine of pandas.
+
+    The file is read in blocks of raw text. The last `skipfooter` lines of every
+    block are held back until the next block shows they are not the footer, so
+    the footer is dropped without reading the whole file first. Blank lines count
+    as footer lines, as with pd.read_csv(..., engine='python', skipfooter=...).
+    Column types are taken from the first chunk, so all chunks share them.
+    Integer columns are read as float64, so a missing value in a later chunk
+    becomes NaN as with pd.read_csv() of the whole file; their names are kept
+    in chunk.attrs['integer_columns'].
+
+    Parameters:
+    path (str): Path of the CSV file.
+    skiprows (int): Number of lines before the column names.
+    skipfooter (int): Number of lines to drop at the end of the file.
+    usecols (list): Columns to parse, missing columns are ignored. None parses all.
+    chunk_size (int): Bytes of text parsed per chunk.
+
+    Yields:
+    pd.DataFrame: The next chunk of rows.
+    """
+    with open(path, "rb") as file:
+        for _ in range(skiprows):
+            file.readline()
+        header = file.readline()
+        names = list(pd.read_csv(io.BytesIO(header)).columns)
+        if usecols is not None:
+            usecols = [column for column in names if column in usecols]
+
+        dtype = None
+        integer_columns = None
+        pending = b""
+        while True:
+            block = file.read(chunk_size)
+            eof = not block
+            text = pending + block
+            if eof and text and not text.endswith(b"\n"):
+                text += b"\n"
+            cut = _held_back_start(text, skipfooter, eof)
+            text, pending = text[:cut], text[cut:]
+
+            if text.strip():
+                chunk = pd.read_csv(io.BytesIO(header + text),
+                                    usecols=usecols,
+                                    dtype=dtype)
+                if dtype is None:
+                    integer_columns = [
+                        column for column, column_dtype in chunk.dtypes.items()
+                        if column_dtype.kind in "iu"
+                    ]
+                    dtype = {
+                        column: np.dtype(np.float64)
+                        if column in integer_columns else column_dtype
+                        for column, column_dtype in chunk.dtypes.items()
+                    }
+                    chunk = chunk.astype(dtype)
+                chunk.attrs[INTEGER_COLUMNS_ATTR] = integer_columns
+                yield chunk
+            if eof:
+                return
+
+
+class CSVSource:
+    """
+    Re-iterable source of DataFrame chunks read from a CSV file.
+
+    Every iteration streams the file again with iter_csv_chunks(), so memory use
+    does not depend on the file size. With cache=True the parsed columns are also
+    written to a columnar binary cache (one raw array per column and a meta.json)
+    next to the file. Later iterations, and later runs, memory-map the cache
+    instead of parsing the CSV. The cache is rebuilt when the size or modification
+    time of the CSV file changes.
+
+    Several threads may iterate one source (or sources of the same file) at the
+    same time. Each one that builds the cache writes its own temporary files and
+    moves them into place under a lock once the whole file was read.
+
+    Parameters:
+    path (str): Path of the CSV file.
+    skiprows (int): Number of lines before the column names.
+    skipfooter (int): Number of lines to drop at the end of the file.
+    usecols (list): Columns to read, missing columns are ignored. None reads all.
+    cache (bool): Keep a columnar binary cache of the parsed file.
+    cache_dir (str): Cache directory, defaults to the CSV path with a '.cache' suffix.
+    chunk_size (int): Bytes of text parsed per chunk.
+    """
+
+    def __init__(self,
+                 path,
+                 skiprows=0,
+                 skipfooter=0,
+                 usecols=None,
+                 cache=False,
+                 cache_dir=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.skiprows = skiprows
+        self.skipfooter = skipfooter
+        self.usecols = usecols
+        self.cache = cache
+        self.cache_dir = cache_dir or path + CACHE_SUFFIX
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        if not self.cache:
+            return self._iter_csv()
+        meta = self._load_meta()
+        if meta is not None:
+            return self._iter_cache(meta)
+        return self._iter_csv_and_cache()
+
+    def _iter_csv(self):
+        return iter_csv_chunks(self.path, self.skiprows, self.skipfooter,
+                               self.usecols, self.chunk_size)
+
+    def _source_meta(self):
+        stat = os.stat(self.path)
+        return {
+            "version": CACHE_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "skiprows": self.skiprows,
+            "skipfooter": self.skipfooter,
+            "usecols": self.usecols,
+        }
+
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.cache_dir, CACHE_META_FILE)) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        source = self._source_meta()
+        if any(meta.get(key) != value for key, value in source.items()):
+            print(f"Cache of {self.path} is outdated, parsing the CSV file.")
+            return None
+        return meta
+
+    def _column_path(self, index):
+        return os.path.join(self.cache_dir, f"column{index}.bin")
+
+    def _iter_cache(self, meta):
+        rows = meta["rows"]
+        columns = [
+            np.memmap(self._column_path(index),
+                      dtype=np.dtype(dtype),
+                      mode="r",
+                      shape=(rows, )) if rows else np.empty(0, dtype)
+            for index, dtype in enumerate(meta["dtypes"])
+        ]
+        for start in range(0, rows, DEFAULT_CACHE_ROWS):
+            chunk = pd.DataFrame({
+                name: column[start:start + DEFAULT_CACHE_ROWS]
+                for name, column in zip(meta["columns"], columns)
+            })
+            if INTEGER_COLUMNS_ATTR in meta:
+                chunk.attrs[INTEGER_COLUMNS_ATTR] = meta[INTEGER_COLUMNS_ATTR]
+            yield chunk
+
+    def _temporary_file(self, mode):
+        # Unique per writer, so concurrent builds do not write the same file
+        handle, path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(handle)
+        return open(path, mode)
+
+    def _iter_csv_and_cache(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = self._source_meta()
+        files = None
+        complete = False
+        rows = 0
+        try:
+            for chunk in self._iter_csv():
+                if files is None:
+                    meta["columns"] = list(chunk.columns)
+                    meta["dtypes"] = [dtype.str for dtype in chunk.dtypes]
+                    meta[INTEGER_COLUMNS_ATTR] = chunk.attrs.get(
+                        INTEGER_COLUMNS_ATTR, [])
+                    files = []
+                    if all(dtype.kind in "biuf" for dtype in chunk.dtypes):
+                        files = [
+                            self._temporary_file("wb")
+                            for _ in range(len(chunk.columns))
+                        ]
+                    else:
+                        print(f"{self.path} has non-numeric columns, "
+                              "not caching it.")
+                for file, column in zip(files, chunk.columns):
+                    file.write(chunk[column].to_numpy().tobytes())
+                rows += len(chunk)
+                yield chunk
+            complete = True
+        finally:
+            for file in files or []:
+                file.close()
+            if not complete:
+                for file in files or []:
+                    os.remove(file.name)
+
+        # Only reached if the whole file was read
+        if files:
+            meta["rows"] = rows
+            with self._temporary_file("w") as file:
+                json.dump(meta, file)
+            meta_path = os.path.join(self.cache_dir, CACHE_META_FILE)
+            with _cache_lock:
+                # Columns first, a cache is only valid once its meta.json exists
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                for index, column_file in enumerate(files):
+                    os.replace(column_file.name, self._column_path(index))
+                os.replace(file.name, meta_path)
@@ -0,0 +1,183 @@
+import time
+import queue
+import threading
+from influxdb_client import WritePrecision
+from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.rest import ApiException
+from urllib3.exceptions import HTTPError
+
+# Writer defaults
+DEFAULT_BATCH_SIZE = 5000  # Points per write request
+DEFAULT_FLUSH_INTERVAL = 0.1  # Maximum time (in seconds) a point waits before it is written
+DEFAULT_MAX_QUEUED_BLOCKS = 64  # Blocks of records queued before write() blocks
+# Retries of a failed batch, as the defaults of the client's WriteOptions batching
+MAX_RETRIES = 5  # Retries before the points of a batch count as failed
+RETRY_MIN_DELAY = 5.0  # Initial delay (in seconds) before retrying a failed write
+RETRY_MAX_DELAY = 125.0  # Maximum delay (in seconds) between retries
+
+
+class BatchedInfluxWriter:
+    """
+    Single InfluxDB writer shared by several producer threads.
+
+    Producers hand over blocks of line protocol records with write(), which
+    only puts them on a thread-safe queue. One writer thread collects the
+    records and writes a batch as soon as it holds batch_size points or its
+    oldest point has waited flush_interval seconds, so the latency is bounded
+    by flush_interval instead of arriving in bursts. The queue is bounded:
+    when the database falls behind, write() blocks the producers.
+
+    Writes that fail with a connection error, 429 or 5xx are retried up to
+    MAX_RETRIES times with exponential backoff (or after the Retry-After of
+    the response), so a short restart of InfluxDB loses no points. Only then,
+    or on any other error, the points of the batch count as failed.
+
+    Parameters:
+    client (InfluxDBClient): Client of the InfluxDB instance.
+    bucket (str): Bucket the points are written to.
+    org (str): Organization of the bucket.
+    batch_size (int): Maximum number of points per write request.
+    flush_interval (float): Maximum time a point is held back, in seconds.
+    write_precision (WritePrecision): Precision of the record timestamps.
+    max_queued_blocks (int): Blocks of records queued before write() blocks.
+    """
+
+    def __init__(self,
+                 client,
+                 bucket,
+                 org,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 write_precision=WritePrecision.NS,
+                 max_queued_blocks: int = DEFAULT_MAX_QUEUED_BLOCKS):
+        self.write_api = client.write_api(write_options=SYNCHRONOUS)
+        self.bucket = bucket
+        self.org = org
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_precision = write_precision
+
+        self._queue = queue.Queue(maxsize=max_queued_blocks)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Counters
+        self.points_queued = 0
+        self.points_written = 0
+        self.points_failed = 0
+        self.retries = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, records):
+        """
+        Queues a list of line protocol records for writing.
+        Blocks while the queue is full.
+        """
+        if not records:
+            return
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchedInfluxWriter is closed")
+            self.points_queued += len(records)
+        self._queue.put(records)
+
+    def close(self):
+        """
+        Writes all queued points and stops the writer thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)  # Wake up and stop the writer thread
+        self._thread.join()
+        self.write_api.close()
+
+    def get_stats(self):
+        """
+        Returns the point counters of the writer.
+        """
+        return {
+            'points_queued': self.points_queued,
+            'points_written': self.points_written,
+            'points_failed': self.points_failed,
+            'retries': self.retries,
+            'points_pending': self.points_queued - self.points_written -
+            self.points_failed,
+        }
+
+    def _run(self):
+        pending = []
+        deadline = None  # Time by which the oldest pending point must be written
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                records = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                records = []
+
+            if records is None:
+                # Closing: write everything that is left
+                while pending:
+                    self._write(pending[:self.batch_size])
+                    del pending[:self.batch_size]
+                return
+
+            if records and not pending:
+                deadline = time.monotonic() + self.flush_interval
+            pending.extend(records)
+            while len(pending) >= self.batch_size:
+                self._write(pending[:self.batch_size])
+                del pending[:self.batch_size]
+            if pending and time.monotonic() >= deadline:
+                self._write(pending)
+                pending = []
+            if not pending:
+                deadline = None
+
+    def _write(self, batch):
+        delay = RETRY_MIN_DELAY
+        for attempt in range(MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                self.write_api.write(bucket=self.bucket,
+                                     org=self.org,
+                                     record=batch,
+                                     write_precision=self.write_precision)
+                self.points_written += len(batch)
+                return
+            except ApiException as e:
+                error = e
+                if e.status is not None and e.status < 500 and e.status != 429:
+                    # The request itself is invalid, retrying would not help
+                    break
+                retry_after = _retry_after(e)
+            except (OSError, HTTPError) as e:
+                error = e
+            except Exception as e:
+                error = e
+                break
+
+            if attempt == MAX_RETRIES:
+                break
+            print(f"Failed to write {len(batch)} points to InfluxDB ({error}), "
+                  f"retrying in {retry_after or delay:.1f} s.")
+            self.retries += 1
+            time.sleep(retry_after or delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+        self.points_failed += len(batch)
+        print(f"Failed to write {len(batch)} points to InfluxDB: {error}")
+
+
+def _retry_after(error):
+    # Seconds from the Retry-After header of a failed write, if any
+    value = (error.headers or {}).get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,232 @@
+import collections
+import numpy as np
+import pandas as pd
+from scipy.signal import butter, lfilter, sosfilt, sosfilt_zi
+
+# DSP defaults
+DEFAULT_SAMPLE_RATE = 100.0  # Samples per second of the raw PPG channels
+DEFAULT_LOW_CUTOFF = 0.5  # Lower edge (in Hz) of the pass band, removes baseline wander
+DEFAULT_HIGH_CUTOFF = 4.0  # Upper edge (in Hz) of the pass band, 240 bpm
+DEFAULT_FILTER_ORDER = 2  # Butterworth order of each band edge
+DEFAULT_HR_WINDOW = 8.0  # Seconds of beats the heart rate is computed from
+DEFAULT_OUTPUT_INTERVAL = 1.0  # Seconds between heart rate and quality outputs
+MIN_BEAT_INTERVAL = 0.3  # Shortest beat interval (in seconds), 200 bpm
+MAX_BEAT_INTERVAL = 1.5  # Longest beat interval (in seconds), 40 bpm
+PEAK_THRESHOLD = 0.5  # A peak must exceed this fraction of the running RMS of its channel
+RMS_TIME_CONSTANT = 2.0  # Time constant (in seconds) of the running RMS
+FILTERED_SUFFIX = "_filtered"  # Column suffixes of the outputs of PPGSource
+HEART_RATE_SUFFIX = "_heart_rate"
+QUALITY_SUFFIX = "_quality"
+
+
+class PPGProcessor:
+    """
+    Streaming band-pass filter, beat detector and heart-rate estimator for
+    several PPG channels at once.
+
+    process() takes consecutive blocks of raw samples of any length. The
+    Butterworth band-pass runs as second-order sections whose state is kept
+    between blocks, so the output equals filtering the whole recording in one
+    go. All channels are filtered together along the sample axis.
+
+    Beats are local maxima of the filtered signal above PEAK_THRESHOLD times the
+    running RMS of their channel; of two maxima closer than MIN_BEAT_INTERVAL
+    the higher one is kept. The last two filtered samples are carried over, so
+    maxima at block boundaries are found too.
+
+    Every output_interval seconds the heart rate (60 / median of the plausible
+    beat intervals) and a signal quality between 0 and 1 are computed per
+    channel from the beats of the last window seconds. The quality is the share of plausible
+    beat intervals (MIN_BEAT_INTERVAL to MAX_BEAT_INTERVAL) times their
+    regularity (1 - coefficient of variation). With fewer than three beats the
+    heart rate is NaN and the quality 0.
+
+    Parameters:
+    channels (int): Number of channels (columns of a block).
+    sample_rate (float): Samples per second.
+    low_cutoff (float): Lower edge of the pass band in Hz.
+    high_cutoff (float): Upper edge of the pass band in Hz.
+    order (int): Butterworth filter order of each band edge.
+    window (float): Seconds of beats used for the heart rate and quality.
+    output_interval (float): Seconds between outputs.
+    """
+
+    def __init__(self,
+                 channels: int,
+                 sample_rate: float = DEFAULT_SAMPLE_RATE,
+                 low_cutoff: float = DEFAULT_LOW_CUTOFF,
+                 high_cutoff: float = DEFAULT_HIGH_CUTOFF,
+                 order: int = DEFAULT_FILTER_ORDER,
+                 window: float = DEFAULT_HR_WINDOW,
+                 output_interval: float = DEFAULT_OUTPUT_INTERVAL):
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.sos = butter(order, [low_cutoff, high_cutoff],
+                          btype="bandpass",
+                          fs=sample_rate,
+                          output="sos")
+        self.window_samples = int(round(window * sample_rate))
+        self.output_samples = int(round(output_interval * sample_rate))
+        self.refractory_samples = int(round(MIN_BEAT_INTERVAL * sample_rate))
+
+        self._zi = None  # Filter state, (sections, 2, channels)
+        self._tail = None  # Last two filtered samples and their running RMS
+        self._rms_decay = np.exp(-1.0 / (RMS_TIME_CONSTANT * sample_rate))
+        self._rms_zi = None  # State of the running mean square, (1, channels)
+        self._samples = 0  # Samples processed so far
+        self._next_output = self.output_samples  # Sample index of the next output
+        self._peaks = [collections.deque() for _ in range(channels)]  # (index, value)
+        self.beats = 0
+
+    def process(self, block):
+        """
+        Filters a block of raw samples and detects the beats in it.
+
+        Parameters:
+        block (np.ndarray): (N, channels) array of raw samples.
+
+        Returns:
+        tuple: (filtered, rows, heart_rate, quality) where filtered is the (N,
+               channels) band-passed block, rows the (M,) positions in the block
+               at which outputs are due and heart_rate (in bpm) and quality the
+               (M, channels) outputs at these rows.
+        """
+        block = np.asarray(block, dtype=np.float64).reshape(-1, self.channels)
+        count = len(block)
+        if not count:
+            empty = np.empty((0, self.channels))
+            return empty, np.empty(0, dtype=np.int64), empty, empty
+
+        if self._zi is None:
+            # Start in the steady state of the first sample, without a step response
+            self._zi = sosfilt_zi(self.sos)[:, :, None] * block[0]
+        filtered, self._zi = sosfilt(self.sos, block, axis=0, zi=self._zi)
+
+        self._detect_peaks(filtered, self._running_rms(filtered))
+        start = self._samples
+        self._samples += count
+
+        # Outputs due within this block
+        due = np.arange(self._next_output, self._samples, self.output_samples)
+        if len(due):
+            self._next_output = int(due[-1]) + self.output_samples
+        heart_rate, quality = self._beat_statistics(due)
+
+        # Beats older than the window of the next output are not needed anymore
+        oldest = self._next_output - self.window_samples
+        for peaks in self._peaks:
+            while peaks and peaks[0][0] <= oldest:
+                peaks.popleft()
+        return filtered, due - start, heart_rate, quality
+
+    def _running_rms(self, filtered):
+        # Exponential moving mean square of every sample, as a first-order IIR filter
+        squares = filtered * filtered
+        if self._rms_zi is None:
+            self._rms_zi = self._rms_decay * squares[:1]
+        mean_square, self._rms_zi = lfilter([1 - self._rms_decay],
+                                            [1, -self._rms_decay],
+                                            squares,
+                                            axis=0,
+                                            zi=self._rms_zi)
+        return np.sqrt(mean_square)
+
+    def _detect_peaks(self, filtered, rms):
+        # Local maxima of all channels at once, the tail covers block boundaries
+        if self._tail is None:
+            extended, extended_rms = filtered, rms
+        else:
+            extended = np.vstack((self._tail[0], filtered))
+            extended_rms = np.vstack((self._tail[1], rms))
+        offset = self._samples - (len(extended) - len(filtered))
+        self._tail = (extended[-2:], extended_rms[-2:])
+        middle = extended[1:-1]
+        candidates = ((middle > extended[:-2]) & (middle >= extended[2:])
+                      & (middle > PEAK_THRESHOLD * extended_rms[1:-1]))
+        channels, rows = np.nonzero(candidates.T)
+
+        # Few candidates per second and channel: enforce the refractory period in order
+        values = middle[rows, channels].tolist()
+        for channel, row, value in zip(channels.tolist(), rows.tolist(), values):
+            peaks = self._peaks[channel]
+            index = offset + 1 + row
+            if peaks and index - peaks[-1][0] < self.refractory_samples:
+                if value > peaks[-1][1]:
+                    peaks[-1] = (index, value)
+                continue
+            peaks.append((index, value))
+            self.beats += 1
+
+    def _beat_statistics(self, due):
+        heart_rate = np.full((len(due), self.channels), np.nan)
+        quality = np.zeros((len(due), self.channels))
+        if not len(due):
+            return heart_rate, quality
+
+        for channel, peaks in enumerate(self._peaks):
+            if len(peaks) < 3:
+                continue
+            indices = np.fromiter((index for index, _ in peaks),
+                                  dtype=np.int64,
+                                  count=len(peaks))
+            # Beats in the window (output - window, output] of every output
+            last = np.searchsorted(indices, due, side="right")
+            first = np.searchsorted(indices, due - self.window_samples,
+                                    side="right")
+            intervals = np.diff(indices) / self.sample_rate
+            for i, (begin, end) in enumerate(zip(first.tolist(),
+                                                 last.tolist())):
+                if end - begin < 3:
+                    continue
+                window = intervals[begin:end - 1]
+                plausible = window[(window >= MIN_BEAT_INTERVAL)
+                                   & (window <= MAX_BEAT_INTERVAL)]
+                if not len(plausible):
+                    continue
+                heart_rate[i, channel] = 60.0 / np.median(plausible)
+                regularity = 1.0 - min(
+                    1.0, np.std(plausible) / np.mean(plausible))
+                quality[i, channel] = len(plausible) / len(window) * regularity
+        return heart_rate, np.round(quality, 3)
+
+
+class PPGSource:
+    """
+    Re-iterable source of processed chunks, computed from a source of raw
+    chunks (see csv_stream.CSVSource) by a new PPGProcessor on every pass.
+
+    Every chunk has the columns <channel>_filtered for all rows, and
+    <channel>_heart_rate and <channel>_quality, which are NaN except in the rows
+    where an output is due. ReplayEngine skips the NaN values.
+
+    Parameters:
+    source (iterable): Source of DataFrame chunks with the raw channels.
+    channels (list): Names of the raw PPG columns to process.
+    sample_rate (float): Samples per second of the raw channels.
+    """
+
+    def __init__(self,
+                 source,
+                 channels,
+                 sample_rate: float = DEFAULT_SAMPLE_RATE,
+                 **processor_options):
+        self.source = source
+        self.channels = list(channels)
+        self.sample_rate = sample_rate
+        self.processor_options = processor_options
+
+    def __iter__(self):
+        processor = PPGProcessor(len(self.channels), self.sample_rate,
+                                 **self.processor_options)
+        for chunk in self.source:
+            filtered, rows, heart_rate, quality = processor.process(
+                chunk[self.channels].to_numpy(dtype=np.float64))
+            columns = {}
+            for i, channel in enumerate(self.channels):
+                columns[channel + FILTERED_SUFFIX] = filtered[:, i]
+                for suffix, values in ((HEART_RATE_SUFFIX, heart_rate),
+                                       (QUALITY_SUFFIX, quality)):
+                    column = np.full(len(chunk), np.nan)
+                    column[rows] = values[:, i]
+                    columns[channel + suffix] = column
+            yield pd.DataFrame(columns, index=chunk.index)
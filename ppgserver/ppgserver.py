@@ -3,9 +3,12 @@ from flask_cors import CORS
 import time
 import os
 import threading
-import pandas as pd
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import WriteOptions
+from influxdb_client import InfluxDBClient
+from csv_stream import CSVSource
+from influx_writer import BatchedInfluxWriter
+from ppg_dsp import (FILTERED_SUFFIX, HEART_RATE_SUFFIX, QUALITY_SUFFIX,
+                     PPGSource)
+from replay import TIMESTAMP_COLUMN, ReplayEngine
 
 # Flask application setup
 app = Flask(__name__)
@@ -16,13 +19,46 @@ app.config['SECRET_KEY'] = 'secret!'
 PPG_DATA_FILE = 'ppg_data.csv'
 FILTERED_PPG_DATA_FILE = 'filtered_ppg_signal_with_timestamps.csv'
 
-# Read CSV data into DataFrames
-df = pd.read_csv(PPG_DATA_FILE, skiprows=14, engine='python', skipfooter=5)
-df_filtered = pd.read_csv(FILTERED_PPG_DATA_FILE, engine='python')
-
-# Global variables to track current index positions in DataFrames
-current_index_influx = 0
-current_index_influx_filtered = 0
+# Replay configuration
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "1.0"))  # 1 = real time, above 1 or 0 (as fast as possible) backfills the past
+REPLAY_PASSES = int(os.getenv("REPLAY_PASSES", "0"))  # 0 = loop until stopped (one pass when faster than real time)
+REPLAY_BATCH_SIZE = int(os.getenv("REPLAY_BATCH_SIZE", "5000"))  # Maximum points per write call
+SAMPLE_PERIOD = 0.01  # Seconds between rows of ppg_data.csv
+
+# Columns of the DataFrames mapped to the (tag key, tag value) of their series
+PPG_COLUMNS = {
+    "LEDC1_PD1": ("sensor", "ledc1_pd1"),
+    "LEDC1_PD2": ("sensor", "ledc1_pd2"),
+    "LEDC2_PD1": ("sensor", "ledc2_pd1"),
+    "LEDC2_PD2": ("sensor", "ledc2_pd2"),
+    "ACCX": ("sensor", "accx"),
+    "ACCY": ("sensor", "accy"),
+    "ACCZ": ("sensor", "accz"),
+}
+FILTERED_PPG_COLUMNS = {"Filtered_PPG": ("sensor_filtered", "filtered_ppg")}
+
+# Streaming DSP: filter the raw channels and extract heart rate instead of replaying the filtered file
+PPG_DSP = os.getenv("PPG_DSP", "false").lower() == "true"
+DSP_CHANNELS = ["LEDC1_PD1", "LEDC1_PD2", "LEDC2_PD1", "LEDC2_PD2"]  # Raw PPG channels to process
+DSP_PRIMARY_CHANNEL = "LEDC1_PD1"  # Written as the 'filtered_ppg' series of the dashboard
+DSP_COLUMNS = {}
+for channel in DSP_CHANNELS:
+    name = "filtered_ppg" if channel == DSP_PRIMARY_CHANNEL else channel.lower()
+    DSP_COLUMNS[channel + FILTERED_SUFFIX] = ("sensor_filtered", name)
+    DSP_COLUMNS[channel + HEART_RATE_SUFFIX] = ("heart_rate", channel.lower())
+    DSP_COLUMNS[channel + QUALITY_SUFFIX] = ("signal_quality", channel.lower())
+
+# Stream the CSV files in chunks, optionally through a columnar binary cache
+CSV_CACHE = os.getenv("CSV_CACHE", "false").lower() == "true"
+ppg_source = CSVSource(PPG_DATA_FILE,
+                       skiprows=14,
+                       skipfooter=5,
+                       usecols=list(PPG_COLUMNS),
+                       cache=CSV_CACHE)
+filtered_ppg_source = CSVSource(FILTERED_PPG_DATA_FILE,
+                                usecols=list(FILTERED_PPG_COLUMNS) +
+                                [TIMESTAMP_COLUMN],
+                                cache=CSV_CACHE)
 
 # InfluxDB configuration
 INFLUXDB_URL = os.getenv("INFLUXDB_URL", "http://localhost:8086")
@@ -30,82 +66,62 @@ INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN", "TOKEN")
 INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "ORG")
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "BUCKET")
 
-# Create InfluxDB client
-client = InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
-
-write_options = WriteOptions(batch_size=1000, flush_interval=10000)
-write_api = client.write_api(write_options=write_options)
+# Write batching: a batch is written at INFLUX_BATCH_SIZE points or after INFLUX_FLUSH_INTERVAL_MS
+INFLUX_BATCH_SIZE = int(os.getenv("INFLUX_BATCH_SIZE", "5000"))
+INFLUX_FLUSH_INTERVAL_MS = int(os.getenv("INFLUX_FLUSH_INTERVAL_MS", "100"))
 
-# Write precision in nanoseconds (for higher resolution timing)
-WRITE_PRECISION = WritePrecision.NS
+# Create InfluxDB client and one writer shared by both sender threads
+client = InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
+writer = BatchedInfluxWriter(client,
+                             INFLUXDB_BUCKET,
+                             INFLUXDB_ORG,
+                             batch_size=INFLUX_BATCH_SIZE,
+                             flush_interval=INFLUX_FLUSH_INTERVAL_MS / 1000)
 
 stop_flag = threading.Event()
 
 def send_metrics_to_influxdb():
     """
     Sends sensor metrics from the 'ppg_data.csv' file to InfluxDB.
-    This function loops through the CSV rows, creating points for each metric and sending them in batches.
+    The rows are replayed in batches at REPLAY_SPEED, looping over the file until stopped
+    (or REPLAY_PASSES times).
     """
-    global current_index_influx
-
-    while not stop_flag.is_set():
-        try:
-            # Get the current row of data from the DataFrame
-            row = df.iloc[current_index_influx]
-
-            # Create data points for each metric and assign appropriate tags and fields
-            points = [
-                Point("device1").tag("sensor", "ledc1_pd1").field("value", row["LEDC1_PD1"]).time(int(time.time_ns()), WRITE_PRECISION),
-                Point("device1").tag("sensor", "ledc1_pd2").field("value", row["LEDC1_PD2"]).time(int(time.time_ns()), WRITE_PRECISION),
-                Point("device1").tag("sensor", "ledc2_pd1").field("value", row["LEDC2_PD1"]).time(int(time.time_ns()), WRITE_PRECISION),
-                Point("device1").tag("sensor", "ledc2_pd2").field("value", row["LEDC2_PD2"]).time(int(time.time_ns()), WRITE_PRECISION),
-                Point("device1").tag("sensor", "accx").field("value", row["ACCX"]).time(int(time.time_ns()), WRITE_PRECISION),
-                Point("device1").tag("sensor", "accy").field("value", row["ACCY"]).time(int(time.time_ns()), WRITE_PRECISION),
-                Point("device1").tag("sensor", "accz").field("value", row["ACCZ"]).time(int(time.time_ns()), WRITE_PRECISION)
-            ]
-
-            # Write data to InfluxDB
-            write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=points)
-
-            # Update the index to point to the next row
-            current_index_influx += 1
-            if current_index_influx >= len(df):
-                current_index_influx = 0
-
-            # Wait for 10ms before sending the next batch of data
-            time.sleep(0.01)
-        except Exception as e:
-            print(f"Exception in send_metrics_to_influxdb: {e}")
-            break
+    try:
+        engine = ReplayEngine(ppg_source,
+                              PPG_COLUMNS,
+                              "device1",
+                              speed=REPLAY_SPEED,
+                              passes=REPLAY_PASSES,
+                              batch_size=REPLAY_BATCH_SIZE,
+                              sample_period=SAMPLE_PERIOD)
+        engine.run(writer, stop_flag)
+    except Exception as e:
+        print(f"Exception in send_metrics_to_influxdb: {e}")
 
 def send_metrics_filtered_to_influxdb():
     """
     Sends filtered PPG metrics from the 'filtered_ppg_signal_with_timestamps.csv' file to InfluxDB.
-    This function loops through the CSV rows, creating points for the filtered metrics and sending them in batches.
+    The rows are replayed in batches at REPLAY_SPEED, keeping the spacing of their timestamps.
+    With PPG_DSP the raw channels of 'ppg_data.csv' are filtered while streaming
+    instead, and their heart rate and signal quality are written once per second.
     """
-    global current_index_influx_filtered
-
-    while not stop_flag.is_set():
-        try:
-            # Get the current row of data from the filtered DataFrame
-            row = df_filtered.iloc[current_index_influx_filtered]
-
-            # Create data point for the filtered PPG signal
-            point = Point("device1").tag("sensor_filtered", "filtered_ppg").field("value", row["Filtered_PPG"]).time(int(time.time_ns()), WRITE_PRECISION)
-
-            # Write data to InfluxDB
-            write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=[point])
-
-            # Update the index to point to the next row
-            current_index_influx_filtered += 1
-            if current_index_influx_filtered >= len(df_filtered):
-                current_index_influx_filtered = 0
-
-            # Wait for 10ms before sending the next data point
-            time.sleep(0.01)
-        except Exception as e:
-            print(f"Exception in send_metrics_filtered_to_influxdb: {e}")
-            break
+    try:
+        if PPG_DSP:
+            source = PPGSource(ppg_source, DSP_CHANNELS, 1 / SAMPLE_PERIOD)
+            columns = DSP_COLUMNS
+        else:
+            source = filtered_ppg_source
+            columns = FILTERED_PPG_COLUMNS
+        engine = ReplayEngine(source,
+                              columns,
+                              "device1",
+                              speed=REPLAY_SPEED,
+                              passes=REPLAY_PASSES,
+                              batch_size=REPLAY_BATCH_SIZE,
+                              sample_period=SAMPLE_PERIOD)
+        engine.run(writer, stop_flag)
+    except Exception as e:
+        print(f"Exception in send_metrics_filtered_to_influxdb: {e}")
 
 # Main
 if __name__ == '__main__':
@@ -126,7 +142,7 @@ if __name__ == '__main__':
         thread1.join()
         thread2.join()
     finally:
-        # Ensure the client is properly closed
-        write_api.__del__()
+        # Write the queued points before closing the client
+        writer.close()
         client.close()
-        print("Closed InfluxDB client")
+        print(f"Closed InfluxDB client: {writer.get_stats()}")
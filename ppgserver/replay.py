@@ -0,0 +1,212 @@
+import time
+import numpy as np
+import pandas as pd
+from csv_stream import INTEGER_COLUMNS_ATTR
+
+# Replay defaults
+DEFAULT_SPEED = 1.0  # Replay speed multiplier, 0 replays as fast as possible
+DEFAULT_PASSES = 0  # Passes over the data, 0 loops until stopped (one pass for fast replays)
+DEFAULT_BATCH_SIZE = 5000  # Maximum number of points per write call
+DEFAULT_SAMPLE_PERIOD = 0.01  # Seconds between rows of data without timestamps
+REPLAY_TICK = 0.1  # Seconds between writes when pacing the replay
+TIMESTAMP_COLUMN = "timestamp"  # Unix time in milliseconds, if present in the data
+
+
+class ReplayEngine:
+    """
+    Replays recorded sensor data into InfluxDB from precomputed line protocol.
+
+    The records of a block of rows are built with vectorized operations on its
+    DataFrame, only the timestamps are added at write time. The relative timing
+    of the rows is kept: it is taken from the 'timestamp' column (unix
+    milliseconds) when present, otherwise rows are sample_period apart.
+
+    At real time or slower the replay starts at the current time and loops
+    until stopped (or for the given number of passes), every pass continuing
+    where the previous one ended. A replay faster than real time (speed above
+    1 or 0) is a backfill: its passes are stamped so that the last one ends at
+    the time the replay started, so no point lies in the future, and it stops
+    after its passes (one if passes is 0). The duration of streamed data is
+    measured with an extra pass over the source before the backfill.
+
+    The data is either a DataFrame, whose records are built once, or a
+    re-iterable source of DataFrame chunks (see csv_stream.CSVSource) that is
+    streamed again on every pass, so memory use does not depend on its size.
+
+    Parameters:
+    source (pd.DataFrame or iterable): Recorded data, or a source of chunks of it.
+    columns (dict): Column name mapped to the (tag key, tag value) of its series.
+    measurement (str): Measurement name of the points.
+    speed (float): Replay speed multiplier (1 = real time, 10 = ten times faster,
+                   0 = as fast as possible).
+    passes (int): Number of passes over the data, 0 loops until stopped at
+                  real time or slower and makes one pass otherwise.
+    batch_size (int): Maximum number of points per write call.
+    sample_period (float): Seconds between rows if the data has no timestamps.
+    """
+
+    def __init__(self,
+                 source,
+                 columns,
+                 measurement,
+                 speed: float = DEFAULT_SPEED,
+                 passes: int = DEFAULT_PASSES,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 sample_period: float = DEFAULT_SAMPLE_PERIOD):
+        self.source = source
+        self.columns = columns
+        self.measurement = measurement
+        self.speed = speed
+        self.passes = passes
+        self.batch_size = batch_size
+        self.sample_period_ns = int(sample_period * 1e9)
+        self.duration = 0
+        self.points_written = 0
+
+        self._blocks = None
+        if isinstance(source, pd.DataFrame):
+            self._blocks = list(self._iter_blocks([source]))
+
+    def run(self, writer, stop_flag):
+        """
+        Hands the records to writer.write() in batches until stop_flag is set.
+
+        Parameters:
+        writer (BatchedInfluxWriter): Writer of line protocol records with
+                                      nanosecond timestamps.
+        stop_flag (threading.Event): Stops the replay when set.
+        """
+        if self.speed == 0 or self.speed > 1:
+            # Backfill, the passes end now
+            passes = self.passes or 1
+            if self._blocks is None:
+                for _ in self._iter_row_times(self.source):
+                    pass
+            base = time.time_ns() - passes * self.duration
+            for _ in range(passes):
+                if stop_flag.is_set() or not self._replay_once(
+                        writer, stop_flag, base):
+                    return
+                base += self.duration
+            return
+
+        base = time.time_ns()
+        completed = 0
+        while not stop_flag.is_set():
+            if not self._replay_once(writer, stop_flag, base):
+                return
+            completed += 1
+            if completed == self.passes:
+                return
+            # Passes must not overlap
+            base = max(base + self.duration, time.time_ns())
+
+    def _iter_blocks(self, chunks):
+        # Yields the (records, record_times) of every chunk of one pass
+        for chunk, row_times in self._iter_row_times(chunks):
+            yield self._build_records(chunk, row_times)
+
+    def _iter_row_times(self, chunks):
+        # Yields every chunk of one pass with the relative time of its rows,
+        # and sets the duration of a pass
+        origin = None
+        rows = 0
+        for chunk in chunks:
+            if not len(chunk):
+                continue
+
+            # Relative time of every row in nanoseconds
+            if TIMESTAMP_COLUMN in chunk:
+                timestamps = chunk[TIMESTAMP_COLUMN].to_numpy(dtype=np.float64)
+                if origin is None:
+                    origin = timestamps[0]
+                row_times = np.round((timestamps - origin) * 1e6).astype(np.int64)
+            else:
+                row_times = (rows + np.arange(len(chunk),
+                                              dtype=np.int64)) * self.sample_period_ns
+            rows += len(chunk)
+            # A loop restarts one sample period after the last row
+            self.duration = int(row_times[-1]) + self.sample_period_ns
+
+            yield chunk, row_times
+
+    def _build_records(self, chunk, row_times):
+        # A row is written with the type all its values share, as Point did
+        # for rows taken with df.iloc. Integer columns of CSV files are read
+        # as float64 (csv_stream.py) and keep their integer type here, so
+        # a missing value does not change the field type midway.
+        integer_columns = chunk.attrs.get(INTEGER_COLUMNS_ATTR)
+        if integer_columns is None:
+            is_integer = pd.api.types.is_integer_dtype(
+                np.result_type(*chunk[list(self.columns)].dtypes))
+        else:
+            is_integer = all(column in integer_columns
+                             for column in self.columns)
+
+        bodies = []
+        valid = []
+        for column, (tag_key, tag_value) in self.columns.items():
+            values = chunk[column]
+            if is_integer:
+                # Missing values are dropped with the invalid records below
+                text = values.fillna(0).astype(np.int64).astype(str) + "i "
+            else:
+                text = values.astype(np.float64).astype(str)
+                # Whole numbers are written without the trailing ".0"
+                text = text.str.replace(r"\.0$", "", regex=True) + " "
+            bodies.append((f"{self.measurement},{tag_key}={tag_value} value=" +
+                           text).to_numpy(dtype=object))
+            valid.append(np.isfinite(values.to_numpy(dtype=np.float64)))
+
+        # Row-major order: all series of a row share its timestamp
+        mask = np.column_stack(valid).ravel()
+        records = np.column_stack(bodies).ravel()[mask]
+        record_times = np.repeat(row_times, len(self.columns))[mask]
+        return records, record_times
+
+    def _replay_once(self, writer, stop_flag, base):
+        # Returns False if the data is empty
+        start = time.monotonic()
+        blocks = self._blocks if self._blocks is not None else self._iter_blocks(
+            self.source)
+        has_rows = False
+        for records, record_times in blocks:
+            has_rows = True
+            self._write_block(records, record_times, writer, stop_flag, base,
+                              start)
+            if stop_flag.is_set():
+                return True
+
+        # Wait for the end of the loop so the next pass does not overlap
+        if self.speed > 0:
+            remaining = self.duration / 1e9 / self.speed - (time.monotonic() -
+                                                             start)
+            if remaining > 0:
+                stop_flag.wait(remaining)
+        return has_rows
+
+    def _write_block(self, records, record_times, writer, stop_flag, base,
+                     start):
+        index = 0
+        while index < len(records) and not stop_flag.is_set():
+            end = min(index + self.batch_size, len(records))
+            if self.speed > 0:
+                # Only write records that are due at the replay speed
+                elapsed_ns = (time.monotonic() - start) * self.speed * 1e9
+                end = index + int(
+                    np.searchsorted(record_times[index:end], elapsed_ns,
+                                    side="right"))
+
+            if end > index:
+                times = (record_times[index:end] + base).tolist()
+                batch = [
+                    record + str(timestamp)
+                    for record, timestamp in zip(records[index:end], times)
+                ]
+                writer.write(batch)
+                self.points_written += len(batch)
+
+            # Collect a tick worth of records unless the replay is falling behind
+            if self.speed > 0 and end - index < self.batch_size:
+                stop_flag.wait(REPLAY_TICK)
+            index = end
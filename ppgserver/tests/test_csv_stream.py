@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from csv_stream import CSVSource, iter_csv_chunks
+from replay import ReplayEngine
+
+
+def write_csv(path, rows, header_lines=0, footer_lines=0):
+    lines = [f"# header {i}" for i in range(header_lines)]
+    lines.append("a,b")
+    lines.extend(rows)
+    lines.extend(f"footer {i}," for i in range(footer_lines))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1000, 1 << 20])
+def test_header_and_footer_holdback(tmp_path, chunk_size):
+    rows = [f"{i},{i * 0.5}" for i in range(200)]
+    path = write_csv(tmp_path / "data.csv", rows, 3, 5)
+
+    chunks = list(iter_csv_chunks(path, skiprows=3, skipfooter=5,
+                                  chunk_size=chunk_size))
+    expected = pd.read_csv(path, skiprows=3, skipfooter=5, engine="python")
+    result = pd.concat(chunks, ignore_index=True)
+    np.testing.assert_array_equal(result.to_numpy(), expected.to_numpy())
+    assert list(result.columns) == ["a", "b"]
+
+
+def test_late_missing_value(tmp_path):
+    # The first chunk holds integers only, a later one a missing value
+    rows = [f"{i},{i}" for i in range(20000)] + ["5,"]
+    path = write_csv(tmp_path / "data.csv", rows)
+
+    chunks = list(iter_csv_chunks(path, chunk_size=64 * 1024))
+    assert len(chunks) > 1
+    result = pd.concat(chunks, ignore_index=True)
+    assert len(result) == 20001
+    assert result["b"].dtype == np.float64
+    assert np.isnan(result["b"].iloc[-1])
+    assert result["b"].iloc[-2] == 19999
+    assert chunks[0].attrs["integer_columns"] == ["a", "b"]
+
+
+def test_late_missing_value_cached_and_replayed(tmp_path):
+    rows = [f"{i},{i}" for i in range(20000)] + ["5,"]
+    path = write_csv(tmp_path / "data.csv", rows)
+    source = CSVSource(path, cache=True, chunk_size=64 * 1024)
+    engine = ReplayEngine(source, {"b": ("sensor", "b")}, "ppg")
+
+    for _ in range(2):  # Parsed and cached, then read from the cache
+        records = np.concatenate([
+            block[0] for block in engine._iter_blocks(source)
+        ])
+        # Integers keep their type, the missing value is not written
+        assert len(records) == 20000
+        assert records[-1] == "ppg,sensor=b value=19999i "
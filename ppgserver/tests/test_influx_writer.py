@@ -0,0 +1,83 @@
+import gzip
+import threading
+import http.server
+import pytest
+from influxdb_client import InfluxDBClient
+import influx_writer
+from influx_writer import BatchedInfluxWriter
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in for the InfluxDB write API: answers with the next status of
+    server.statuses (204 once they are used up) and keeps the accepted lines.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        server = self.server
+        status = server.statuses.pop(0) if server.statuses else 204
+        server.requests += 1
+        self.send_response(status)
+        if status == 204:
+            server.lines.extend(body.decode().splitlines())
+        elif status in (429, 503):
+            self.send_header("Retry-After", "0.1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.statuses = []
+    server.requests = 0
+    server.lines = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def write_records(url, records, flush_interval=0.05):
+    client = InfluxDBClient(url=url, token="token", org="org")
+    writer = BatchedInfluxWriter(client, "bucket", "org",
+                                 flush_interval=flush_interval)
+    writer.write(records)
+    writer.close()
+    client.close()
+    return writer.get_stats()
+
+
+RECORDS = ["ppg,sensor=a value=1i 1", "ppg,sensor=a value=2i 2"]
+
+
+def test_retry_after_429_and_503(server):
+    server.statuses = [503, 429]
+    stats = write_records(f"http://127.0.0.1:{server.server_port}", RECORDS)
+    assert server.lines == RECORDS
+    assert server.requests == 3
+    assert stats['retries'] == 2
+    assert stats['points_written'] == 2 and stats['points_failed'] == 0
+
+
+def test_invalid_request_not_retried(server):
+    server.statuses = [400]
+    stats = write_records(f"http://127.0.0.1:{server.server_port}", RECORDS)
+    assert server.requests == 1
+    assert stats['points_failed'] == 2 and stats['retries'] == 0
+
+
+def test_connection_errors_bounded(monkeypatch):
+    monkeypatch.setattr(influx_writer, "RETRY_MIN_DELAY", 0.01)
+    # Nothing listens on the port
+    stats = write_records("http://127.0.0.1:9", RECORDS)
+    assert stats['retries'] == influx_writer.MAX_RETRIES
+    assert stats['points_failed'] == 2 and stats['points_written'] == 0
@@ -0,0 +1,24 @@
+import collections
+import numpy as np
+from ppg_dsp import PPGProcessor
+
+
+def test_missed_beat_is_not_averaged_in():
+    processor = PPGProcessor(1)
+    # Beat intervals 0.8 s and 4.0 s, the second one spans missed beats
+    processor._peaks[0] = collections.deque([(0, 1.0), (80, 1.0), (480, 1.0)])
+    heart_rate, quality = processor._beat_statistics(np.array([500]))
+    assert heart_rate[0, 0] == 75.0
+    assert quality[0, 0] == 0.5
+
+
+def test_heart_rate_of_a_pulse_wave():
+    # 1.2 Hz pulse wave, 72 bpm, processed in blocks of odd sizes
+    t = np.arange(3000) / 100.0
+    signal = np.sin(2 * np.pi * 1.2 * t) + 0.3 * np.sin(2 * np.pi * 2.4 * t)
+    processor = PPGProcessor(1)
+    rates = []
+    for start in range(0, len(signal), 137):
+        _, _, heart_rate, quality = processor.process(signal[start:start + 137])
+        rates.extend(heart_rate[:, 0].tolist())
+    assert abs(rates[-1] - 72.0) < 1.0
@@ -11,5 +11,10 @@ if [ "$INCLUDE_PPGSERVER" = "true" ]; then
     COMPOSE_FILES="$COMPOSE_FILES -f ppgserver/docker-compose.ppgserver.yml"
 fi
 
+# Conditionally build Telegraf with the binary IMU decoder if INCLUDE_BINARY_DECODER is true
+if [ "$INCLUDE_BINARY_DECODER" = "true" ]; then
+    COMPOSE_FILES="$COMPOSE_FILES -f telegraf/docker-compose.binary.yml"
+fi
+
 # Run docker-compose with the selected files and remove orphan containers
 docker-compose -f $COMPOSE_FILES up -d --build --remove-orphans
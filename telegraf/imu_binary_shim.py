@@ -0,0 +1,66 @@
+import os
+import sys
+import paho.mqtt.client as mqtt
+from wire_format import decode
+
+# MQTT settings, the broker runs on the Raspberry Pi
+MQTT_BROKER_IP = os.getenv("HOST_IP", "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
+MQTT_KEEPALIVE_INTERVAL = 60
+SUBSCRIBE_TOPIC = "IMU/#"
+BINARY_TOPIC_SUFFIX = "/bin"  # Binary windows are published on <topic>/bin
+
+# Same measurement as the JSON mqtt_consumer inputs, so dashboards work unchanged
+MEASUREMENT = "mqtt_consumer"
+
+
+def escape_tag(value):
+    """
+    Escapes a tag value for InfluxDB line protocol.
+    """
+    return value.replace(",", r"\,").replace("=", r"\=").replace(" ", r"\ ")
+
+
+def to_line_protocol(topic, payload):
+    """
+    Decodes a binary IMU message into one line protocol record per sample.
+    Values are written as floats to match the fields written by the JSON parser.
+    """
+    fields, timestamps, rows = decode(payload)
+    series = f"{MEASUREMENT},topic={escape_tag(topic)}"
+    # Multi-sensor topics carry the device ID, e.g. IMU/imu0/gyroscope/bin
+    parts = topic.split("/")
+    if len(parts) == 4:
+        series += f",device={escape_tag(parts[1])}"
+    series += " "
+    return [
+        series + ",".join(f"{field}={value}"
+                          for field, value in zip(fields, row)) +
+        f" {timestamp * 1000}" for timestamp, row in zip(timestamps, rows)
+    ]
+
+
+def on_message(client, userdata, msg):
+    if not msg.topic.endswith(BINARY_TOPIC_SUFFIX):
+        return
+    try:
+        lines = to_line_protocol(msg.topic, msg.payload)
+    except ValueError as e:
+        print(f"Dropping invalid message on {msg.topic}: {e}", file=sys.stderr)
+        return
+    # Telegraf's execd input reads line protocol from stdout
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def on_connect(client, userdata, flags, rc):
+    # (Re)subscribe on every connect
+    client.subscribe(SUBSCRIBE_TOPIC)
+
+
+if __name__ == "__main__":
+    mqtt_client = mqtt.Client()
+    mqtt_client.on_connect = on_connect
+    mqtt_client.on_message = on_message
+    mqtt_client.connect(MQTT_BROKER_IP, MQTT_PORT, MQTT_KEEPALIVE_INTERVAL)
+    mqtt_client.loop_forever()